@@ -0,0 +1,108 @@
+# clock_sync.py
+# Measures how closely two devices start a note at the same moment after
+# ClockSync has estimated their clocks.
+#
+# Starts two fake devices on localhost. Each one answers GET /time like the
+# firmware, from its own tick counter (the conductor's clock plus a random
+# offset, wrapping at 2**30), and delays every request and reply by a random
+# 0 to --max-delay ms. Each trial syncs a fresh ClockSync, asks both devices
+# to start at the same conductor time and works out, from each device's true
+# offset, how late or early it would actually start. Prints one JSON object
+# with the median and worst inter-device start skew and the largest bound
+# the estimator reported.
+#
+# Usage: PYTHONPATH=src python benchmarks/clock_sync.py [--trials 20] [--samples 8]
+
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import conductor
+
+
+class _FakeDevice:
+    """Answers GET /time from a tick counter offset from the conductor's clock."""
+
+    def __init__(self, rng, max_delay_ms):
+        self.offset_ms = rng.randrange(conductor.TICKS_PERIOD)
+        device = self
+
+        def delay():
+            time.sleep(rng.uniform(0, max_delay_ms) / 1000)
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                delay()  # The request on its way in
+                rx = device.ticks_ms()
+                body = json.dumps({"ticks_ms": rx, "now_ms": device.ticks_ms()}).encode()
+                delay()  # The reply on its way out
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.http = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.http.serve_forever, daemon=True).start()
+
+    def ticks_ms(self):
+        return int(conductor.local_ms() + self.offset_ms) % conductor.TICKS_PERIOD
+
+    def lateness_ms(self, ticks, at_local_ms):
+        """How much later than at_local_ms this device's clock reads ticks."""
+        due = int(round(at_local_ms + self.offset_ms)) % conductor.TICKS_PERIOD
+        return conductor.ticks_diff(ticks, due)
+
+    @property
+    def address(self):
+        return f"127.0.0.1:{self.http.server_port}"
+
+    def close(self):
+        self.http.shutdown()
+
+
+def run(devices, trials, samples):
+    ips = [d.address for d in devices]
+    skews = []
+    bounds = []
+    for _ in range(trials):
+        sync = conductor.ClockSync(samples=samples)
+        sync.sync(ips)
+        at = conductor.local_ms() + 500
+        starts = [d.lateness_ms(sync.device_ticks(d.address, at), at) for d in devices]
+        skews.append(max(starts) - min(starts))
+        bounds.append(sync.skew_bound_ms(ips))
+    return {
+        "devices": len(devices),
+        "trials": trials,
+        "samples": samples,
+        "skew_ms_median": round(statistics.median(skews), 1),
+        "skew_ms_max": round(max(skews), 1),
+        "bound_ms_max": round(max(bounds), 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Start skew after clock sync")
+    parser.add_argument("--trials", type=int, default=20)
+    parser.add_argument("--samples", type=int, default=8, help="probes per device")
+    parser.add_argument("--max-delay", type=float, default=15.0, help="one-way, in ms")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    conductor.dispatcher.timeout = 1.0
+    fleet = [_FakeDevice(rng, args.max_delay) for _ in range(2)]
+    print(json.dumps(run(fleet, args.trials, args.samples)))
+    for d in fleet:
+        d.close()
+    conductor.dispatcher.close()
@@ -0,0 +1,135 @@
+# firmware_alloc.py
+# Measures the memory churn of the firmware's HTTP response path.
+#
+# Feeds a stream of kept-alive requests (/health, /sensor, /status, /time,
+# /tone) straight into main.py's handle_request on CPython, with the hardware
+# stubbed out, and reports per request:
+#   - the peak memory allocated while handling it (tracemalloc), which on
+#     CPython, where garbage is freed at once, is the request's churn
+#   - the number of writer.write calls
+# and the same for the response path alone (route() and send_response()),
+# which leaves out the request parsing and asyncio's own allocations.
+# CPython allocates differently from MicroPython, so compare the numbers
+# between versions of main.py, not with the Pico. On the Pico itself, GET
+# /mem reports the gc.mem_free deltas and collections of real requests.
+#
+# Usage: PYTHONPATH=src python benchmarks/firmware_alloc.py [--requests 2000]
+
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+
+from http_keepalive import _stub_micropython
+
+REQUESTS = (
+    b"GET /health HTTP/1.1\r\n\r\n",
+    b"GET /sensor HTTP/1.1\r\n\r\n",
+    b"GET /status HTTP/1.1\r\n\r\n",
+    b"GET /time HTTP/1.1\r\n\r\n",
+    b'POST /tone HTTP/1.1\r\nContent-Length: 27\r\n\r\n{"freq": 440, "ms": 100000}',
+)
+
+
+class _CountingWriter:
+    """Counts writes and records the peak memory of each response at drain()."""
+
+    def __init__(self):
+        self.writes = 0
+        self.peaks = []
+        self._base = 0
+
+    def write(self, data):
+        self.writes += 1
+
+    async def drain(self):
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            self.peaks.append(peak - self._base)
+            await asyncio.sleep(0)  # Let cancelled player tasks finish
+            tracemalloc.reset_peak()
+            self._base = tracemalloc.get_traced_memory()[0]
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+
+def bench(requests):
+    import main
+
+    main.print = lambda *args, **kwargs: None
+    main.MAX_KEEPALIVE_REQUESTS = requests + 1
+
+    async def run():
+        reader = asyncio.StreamReader()
+        for i in range(requests):
+            reader.feed_data(REQUESTS[i % len(REQUESTS)])
+        reader.feed_eof()
+        writer = _CountingWriter()
+        # Warm up, so one-time allocations don't count
+        await main.handle_request(_single(REQUESTS), _CountingWriter())
+
+        tracemalloc.start()
+        writer._base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        await main.handle_request(reader, writer)
+        elapsed = time.perf_counter() - start
+        tracemalloc.stop()
+        main.stop_playback()
+        peaks = sorted(writer.peaks)
+        return {
+            "requests": requests,
+            "writes_per_response": round(writer.writes / requests, 2),
+            "bytes_per_request_mean": round(sum(peaks) / len(peaks)),
+            "bytes_per_request_max": peaks[-1],
+            "us_per_request": round(elapsed / requests * 1e6, 1),
+        }
+
+    return asyncio.run(run())
+
+
+def bench_response_path(requests):
+    import main
+
+    urls = ("/health", "/sensor", "/status", "/time")
+
+    async def run():
+        writer = _CountingWriter()
+        peaks = []
+        tracemalloc.start()
+        for i in range(requests):
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            status, end, content_type, etag = main.route("GET", urls[i % 4], {}, b"", 0)
+            await main.send_response(writer, status, end, content_type, True, etag)
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+        tracemalloc.stop()
+        return {
+            "response_path_writes_per_response": round(writer.writes / requests, 2),
+            "response_path_bytes_mean": round(sum(peaks) / len(peaks)),
+        }
+
+    return asyncio.run(run())
+
+
+def _single(requests):
+    reader = asyncio.StreamReader()
+    for request in requests:
+        reader.feed_data(request)
+    reader.feed_eof()
+    return reader
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Firmware response path allocations")
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    _stub_micropython()
+    result = bench(args.requests)
+    result.update(bench_response_path(args.requests))
+    print(json.dumps(result))
@@ -0,0 +1,196 @@
+# fleet_bench.py
+# Latency and skew benchmark of the conductor and dashboard against a
+# simulated fleet (see src/simulator.py).
+#
+# For every fleet size it plays notes with play_note_on_all_picos (clock
+# synced, scheduled start) and over UDP, and runs dashboard refreshes. Each
+# scenario prints one JSON line with throughput, p50/p99 dispatch latency
+# and onset skew (spread of the note start times across devices).
+#
+# Usage: PYTHONPATH=src python benchmarks/fleet_bench.py --devices 1 10 100 500
+
+import argparse
+import contextlib
+import io
+import json
+import time
+
+import conductor
+import dashboard
+from simulator import SimulatedFleet
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))], 3)
+
+
+def onset_skews(fleet, notes):
+    """Spread of the i-th onset across devices, for every note i."""
+    skews = []
+    for i in range(notes):
+        starts = [d.onsets[i][0] for d in fleet.devices if len(d.onsets) > i]
+        if len(starts) > 1:
+            skews.append(max(starts) - min(starts))
+    return skews
+
+
+def bench_conductor(fleet, notes, transport, start_in_ms):
+    ips = fleet.addresses
+    conductor.PICO_IPS = ips
+    conductor.clock = conductor.ClockSync()
+    udp = conductor.UdpTransport() if transport == "udp" else None
+    if udp:
+        udp.sync(ips)
+    else:
+        conductor.clock.sync(ips)
+    fleet.reset()
+
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(notes):
+        if udp:
+            report = udp.tone_all(ips, 440, 50, start_in_ms=start_in_ms)
+        else:
+            with contextlib.redirect_stdout(io.StringIO()):
+                report = conductor.play_note_on_all_picos(
+                    440, 50, start_in_ms=start_in_ms
+                )
+        latencies.extend(r.latency_ms for r in report.results if r.ok)
+    elapsed = time.perf_counter() - start
+    # Let scheduled notes and in-flight datagrams land
+    time.sleep(start_in_ms / 1000 + 0.2)
+    if udp:
+        udp.close()
+
+    skews = onset_skews(fleet, notes)
+    return {
+        "scenario": f"conductor-{transport}",
+        "devices": len(ips),
+        "notes": notes,
+        "requests_per_s": round(notes * len(ips) / elapsed, 1),
+        "dispatch_ms_p50": percentile(latencies, 0.5),
+        "dispatch_ms_p99": percentile(latencies, 0.99),
+        "onset_skew_ms_p50": percentile(skews, 0.5),
+        "onset_skew_ms_p99": percentile(skews, 0.99),
+        "clock_skew_bound_ms": round(conductor.clock.skew_bound_ms(ips), 3),
+    }
+
+
+def bench_dashboard(fleet, refreshes):
+    ips = fleet.addresses
+    durations = []
+    offline = 0
+    stale = 0
+    poller = dashboard.Poller()
+    for _ in range(refreshes):
+        start = time.perf_counter()
+        statuses = poller.refresh(ips)
+        durations.append((time.perf_counter() - start) * 1000)
+        offline += sum(1 for s in statuses if s["status"] != "ok")
+        stale += sum(1 for s in statuses if s["stale"])
+    poller.close()
+    return {
+        "scenario": "dashboard",
+        "devices": len(ips),
+        "refreshes": refreshes,
+        "refresh_ms_p50": percentile(durations, 0.5),
+        "refresh_ms_p99": percentile(durations, 0.99),
+        "offline_readings": offline,
+        "stale_readings": stale,
+    }
+
+
+def bench_polling(fleet, duration_s, adaptive):
+    """Polls for a while; a quarter of the devices are offline, one in eight
+    has a moving light level and the rest are steady.
+
+    Reports the requests sent and how old the shown readings of the moving
+    devices were, sampled every 50 ms.
+    """
+    ips = fleet.addresses
+    n = len(fleet.devices)
+    for i, device in enumerate(fleet.devices):
+        device.loss = 1.0 if i < n // 4 else 0.0
+        device.light_speed = 2.0 if i % 8 == 7 else 0.0
+    fleet.reset()
+    moving = [ip for i, ip in enumerate(ips) if i % 8 == 7 and i >= n // 4]
+
+    if adaptive:
+        poller = dashboard.Poller(
+            deadline_s=dashboard.SCHEDULE_TICK_S, schedule=dashboard.PollSchedule()
+        )
+        tick_s = dashboard.SCHEDULE_TICK_S
+    else:
+        poller = dashboard.Poller()
+        tick_s = dashboard.REFRESH_INTERVAL_S
+    shown = {}  # ip -> (status shown, when it arrived)
+    ages = []
+    end = time.monotonic() + duration_s
+    next_tick = time.monotonic()
+    while time.monotonic() < end:
+        if time.monotonic() >= next_tick:
+            statuses = poller.refresh(ips)
+            now = time.monotonic()
+            for status in statuses:
+                # A fresh poll result is a new dict; a reused reading is the same one
+                if (
+                    shown.get(status["ip"], (None,))[0] is not status
+                    and not status["stale"]
+                ):
+                    shown[status["ip"]] = (status, now)
+            next_tick = max(next_tick + tick_s, now)
+        now = time.monotonic()
+        ages += [(now - shown[ip][1]) * 1000 for ip in moving if ip in shown]
+        time.sleep(0.05)
+    poller.close()
+    for device in fleet.devices:
+        device.loss = 0.0
+        device.light_speed = 0.2
+    return {
+        "scenario": "adaptive polling" if adaptive else "fixed polling",
+        "devices": n,
+        "seconds": duration_s,
+        "requests": sum(d.requests for d in fleet.devices),
+        "moving_age_ms_p50": percentile(ages, 0.5),
+        "moving_age_ms_p99": percentile(ages, 0.99),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark against a simulated fleet")
+    parser.add_argument("--devices", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--notes", type=int, default=20)
+    parser.add_argument("--refreshes", type=int, default=3)
+    parser.add_argument("--start-in-ms", type=float, default=300)
+    parser.add_argument("--latency-ms", type=float, default=2.0)
+    parser.add_argument("--jitter-ms", type=float, default=1.0)
+    parser.add_argument("--loss", type=float, default=0.0)
+    parser.add_argument("--slow-fraction", type=float, default=0.0)
+    parser.add_argument("--slow-ms", type=float, default=0.0)
+    parser.add_argument("--poll-seconds", type=float, default=30.0)
+    args = parser.parse_args()
+
+    # Simulated devices answer, so give them time to
+    conductor.dispatcher.timeout = 2.0
+    for n in args.devices:
+        with SimulatedFleet(
+            n,
+            args.latency_ms,
+            args.jitter_ms,
+            args.loss,
+            args.slow_fraction,
+            args.slow_ms,
+        ) as fleet:
+            for transport in ("http", "udp"):
+                print(
+                    json.dumps(
+                        bench_conductor(fleet, args.notes, transport, args.start_in_ms)
+                    )
+                )
+            print(json.dumps(bench_dashboard(fleet, args.refreshes)))
+            for adaptive in (False, True):
+                print(json.dumps(bench_polling(fleet, args.poll_seconds, adaptive)))
+    conductor.dispatcher.close()
@@ -0,0 +1,107 @@
+# http_keepalive.py
+# Measures how many requests per second the firmware's HTTP server answers
+# on a single connection, against opening a new connection per request (what
+# every client had to do while the firmware closed after each response).
+#
+# Runs main.py's handle_request on CPython with the hardware stubbed out, so
+# the numbers show the relative cost of the handshake, not the Pico's speed.
+# On a Pico W the difference is larger: a TCP handshake over Wi-Fi takes
+# several milliseconds.
+#
+# Usage: PYTHONPATH=src python benchmarks/http_keepalive.py [--requests 2000]
+
+import argparse
+import asyncio
+import http.client
+import json
+import sys
+import threading
+import time
+import types
+
+
+def _stub_micropython():
+    """Lets main.py import on CPython: fake hardware and MicroPython time helpers."""
+
+    class ADC:
+        def __init__(self, pin):
+            pass
+
+        def read_u16(self):
+            return 30000
+
+    class PWM:
+        def __init__(self, pin):
+            pass
+
+        def freq(self, f):
+            pass
+
+        def duty_u16(self, v):
+            pass
+
+        def deinit(self):
+            pass
+
+    sys.modules["machine"] = types.SimpleNamespace(
+        ADC=ADC, PWM=PWM, Pin=lambda n: n, unique_id=lambda: b"\x00\x01\x02\x03"
+    )
+    sys.modules["network"] = types.SimpleNamespace()
+    time.ticks_ms = lambda: int(time.monotonic() * 1000) % (1 << 30)
+    time.ticks_diff = lambda a, b: ((a - b + (1 << 29)) % (1 << 30)) - (1 << 29)
+    time.ticks_add = lambda a, b: (a + b) % (1 << 30)
+
+
+def start_firmware_server():
+    """Runs the firmware's HTTP server in a background event loop; returns its port."""
+    import main
+
+    main.print = lambda *args, **kwargs: None  # Console output would dominate
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    port = []
+
+    async def serve():
+        server = await asyncio.start_server(main.handle_request, "127.0.0.1", 0)
+        port.append(server.sockets[0].getsockname()[1])
+        ready.set()
+
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    asyncio.run_coroutine_threadsafe(serve(), loop)
+    ready.wait()
+    return port[0]
+
+
+def bench(port, requests, keep_alive):
+    connection = None
+    start = time.perf_counter()
+    for _ in range(requests):
+        if connection is None:
+            connection = http.client.HTTPConnection("127.0.0.1", port)
+        headers = {} if keep_alive else {"Connection": "close"}
+        connection.request("GET", "/health", headers=headers)
+        response = connection.getresponse()
+        response.read()
+        if response.will_close:
+            connection.close()
+            connection = None
+    elapsed = time.perf_counter() - start
+    if connection is not None:
+        connection.close()
+    return {
+        "mode": "keep-alive" if keep_alive else "connection per request",
+        "requests": requests,
+        "requests_per_s": round(requests / elapsed),
+        "ms_per_request": round(elapsed / requests * 1000, 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Firmware HTTP requests per second")
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    _stub_micropython()
+    port = start_firmware_server()
+    for keep_alive in (False, True):
+        print(json.dumps(bench(port, args.requests, keep_alive)))
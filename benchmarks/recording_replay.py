@@ -0,0 +1,103 @@
+# recording_replay.py
+# Compares loading and replaying a recording saved as JSON (the old format)
+# with the binary format light_orchestra.py writes now.
+#
+# For a take of --samples samples (72000 is an hour at 20 Hz) it reports,
+# for each format:
+#   - the file size
+#   - the time and the peak memory (tracemalloc) to load the file and read
+#     every sample the way replay does
+# The JSON file has to be parsed whole before replay can start; the binary
+# one is streamed through replay_records() a block at a time. Runs on
+# CPython with the hardware stubbed out, so compare the two formats with
+# each other rather than with the Pico, where parsing is much slower.
+#
+# Usage: PYTHONPATH=src python benchmarks/recording_replay.py [--samples 72000]
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from http_keepalive import _stub_micropython
+
+
+def make_take(samples):
+    """A recording as the old code kept it: [(ticks_ms, light), ...]."""
+    rng = random.Random(0)
+    ticks = rng.randrange(1 << 30)
+    take = []
+    for _ in range(samples):
+        ticks = (ticks + 50 + rng.randrange(3)) % (1 << 30)
+        take.append((ticks, rng.randrange(1000, 65000)))
+    return take
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return count, elapsed, peak
+
+
+def bench(samples, directory):
+    import light_orchestra
+
+    light_orchestra.print = lambda *args, **kwargs: None
+    json_path = os.path.join(directory, "recording.json")
+    bin_path = os.path.join(directory, "recording.bin")
+    with open(json_path, "w") as f:
+        json.dump(make_take(samples), f)
+    light_orchestra.convert_json_recording(json_path, bin_path)
+
+    def replay_json():
+        # As the old load_recording() and replay loop did
+        with open(json_path) as f:
+            recorded_data = json.load(f)
+        count = 0
+        for i in range(len(recorded_data)):
+            timestamp, light_value = recorded_data[i]
+            count += 1
+        return count
+
+    def replay_binary():
+        light_orchestra.load_recording(bin_path)
+        count = 0
+        for delta_ms, light_value in light_orchestra.replay_records(bin_path):
+            count += 1
+        return count
+
+    results = []
+    for name, fn, path in (
+        ("json", replay_json, json_path),
+        ("binary", replay_binary, bin_path),
+    ):
+        count, elapsed, peak = measure(fn)
+        assert count == samples
+        results.append(
+            {
+                "format": name,
+                "samples": samples,
+                "file_bytes": os.path.getsize(path),
+                "load_and_replay_ms": round(elapsed * 1000, 1),
+                "peak_bytes": peak,
+            }
+        )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recording load and replay cost")
+    parser.add_argument("--samples", type=int, default=72000)
+    args = parser.parse_args()
+
+    _stub_micropython()
+    with tempfile.TemporaryDirectory() as directory:
+        for result in bench(args.samples, directory):
+            print(json.dumps(result))
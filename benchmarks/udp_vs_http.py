@@ -0,0 +1,122 @@
+# udp_vs_http.py
+# Compares sending notes over the HTTP API and the binary UDP protocol.
+#
+# Starts N fake devices on localhost, each with an HTTP server answering
+# /tone and a UDP socket, then plays the same notes both ways. For each note
+# it records how long the conductor call took and when the last device
+# received it. Prints one JSON object per transport and fleet size.
+#
+# Usage: PYTHONPATH=src python benchmarks/udp_vs_http.py [--notes 50] [--devices 1 10 50]
+
+import argparse
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import conductor
+
+
+class _FakeDevice:
+    """Records the arrival time of every note sent to it over HTTP or UDP."""
+
+    def __init__(self):
+        self.arrivals = []
+        device = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                device.arrivals.append(time.perf_counter())
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                self.send_response(202)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+        self.http = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.port = self.http.server_port
+        self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp.bind(("127.0.0.1", self.port))
+        self.last_seq = None
+        threading.Thread(target=self.http.serve_forever, daemon=True).start()
+        threading.Thread(target=self._serve_udp, daemon=True).start()
+
+    def _serve_udp(self):
+        while True:
+            try:
+                data = self.udp.recv(256)
+            except OSError:
+                return
+            seq = conductor.UDP_HEADER.unpack_from(data)[3]
+            if seq != self.last_seq:  # Drop the duplicate copy
+                self.last_seq = seq
+                self.arrivals.append(time.perf_counter())
+
+    @property
+    def address(self):
+        return f"127.0.0.1:{self.port}"
+
+    def close(self):
+        self.http.shutdown()
+        self.udp.close()
+
+
+def _percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def run(transport, devices, notes):
+    ips = [d.address for d in devices]
+    call_ms = []
+    last_arrival_ms = []
+    udp = conductor.UdpTransport()
+    for i in range(notes):
+        for d in devices:
+            d.arrivals.clear()
+        start = time.perf_counter()
+        if transport == "udp":
+            udp.tone_all(ips, 440, 100)
+        else:
+            conductor.dispatcher.post_all(
+                ips, "/tone", {"freq": 440, "ms": 100, "duty": 0.5}
+            )
+        call_ms.append((time.perf_counter() - start) * 1000)
+        # Wait until every device has the note (or give up after 1 s)
+        deadline = time.perf_counter() + 1
+        while not all(d.arrivals for d in devices) and time.perf_counter() < deadline:
+            time.sleep(0.0005)
+        arrivals = [d.arrivals[0] for d in devices if d.arrivals]
+        last_arrival_ms.append((max(arrivals) - start) * 1000)
+    udp.close()
+    return {
+        "transport": transport,
+        "devices": len(devices),
+        "notes": notes,
+        "call_ms_p50": round(_percentile(call_ms, 0.5), 3),
+        "call_ms_p99": round(_percentile(call_ms, 0.99), 3),
+        "last_arrival_ms_p50": round(_percentile(last_arrival_ms, 0.5), 3),
+        "last_arrival_ms_p99": round(_percentile(last_arrival_ms, 0.99), 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare HTTP and UDP note dispatch")
+    parser.add_argument("--notes", type=int, default=50)
+    parser.add_argument("--devices", type=int, nargs="+", default=[1, 10, 50])
+    args = parser.parse_args()
+
+    # The fake devices answer, so wait for replies like a real conductor would
+    conductor.dispatcher.timeout = 1.0
+    for n in args.devices:
+        fleet = [_FakeDevice() for _ in range(n)]
+        for transport in ("http", "udp"):
+            print(json.dumps(run(transport, fleet, args.notes)))
+        for d in fleet:
+            d.close()
+    conductor.dispatcher.close()
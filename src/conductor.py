@@ -2,8 +2,19 @@
 # To be run on a student's computer (not the Pico)
 # Requires the 'requests' library: pip install requests
 
-import requests
+import json
+import socket
+import struct
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+
+import requests
+
+import fleet
+import score
 
 # --- Configuration ---
 # Students should populate this list with the IP address(es of their Picos
@@ -23,7 +34,8 @@ B4 = 494
 C5 = 523
 
 # A simple melody: "Twinkle, Twinkle, Little Star"
-# Format: (note_frequency, duration_in_ms)
+# Format: (note_frequency, duration_in_ms), written at SONG_BPM (400 ms = one beat)
+SONG_BPM = 150
 SONG = [
     (C4, 400),
     (C4, 400),
@@ -44,26 +56,734 @@ SONG = [
 # --- Conductor Logic ---
 
 
-def play_note_on_all_picos(freq, ms):
-    """Sends a /tone POST request to every Pico in the list."""
-    print(f"Playing note: {freq}Hz for {ms}ms on all devices.")
+def sleep_until(deadline, spin_s=0.002):
+    """Sleeps until time.perf_counter() reaches deadline.
 
-    payload = {"freq": freq, "ms": ms, "duty": 0.5}
+    time.sleep can overshoot by a millisecond or more, so the last few ms are
+    spent polling the clock instead.
+    """
+    while True:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return
+        if remaining > spin_s:
+            time.sleep(remaining - spin_s)
+
+
+@dataclass
+class SendResult:
+    """Outcome of sending one request to one device."""
+
+    ip: str
+    ok: bool
+    sent_at: float  # time.perf_counter() when the request left this machine
+    latency_ms: float
+    error: str = ""
+
+
+@dataclass
+class DispatchReport:
+    """Per-device results of a single fan-out, plus latency and skew figures."""
+
+    results: list = field(default_factory=list)
+
+    @property
+    def skew_ms(self):
+        """Spread between the first and the last device being sent the request."""
+        if not self.results:
+            return 0.0
+        starts = [r.sent_at for r in self.results]
+        return (max(starts) - min(starts)) * 1000
+
+    @property
+    def max_latency_ms(self):
+        return max((r.latency_ms for r in self.results), default=0.0)
+
+    @property
+    def failed(self):
+        return [r for r in self.results if not r.ok]
+
+
+class Dispatcher:
+    """Sends the same request to every Pico at the same time.
+
+    Each device gets its own keep-alive ``requests.Session`` so a note only
+    pays for the TCP handshake once, and all devices are contacted in parallel
+    from a thread pool instead of one after the other.
+    """
 
-    for ip in PICO_IPS:
-        url = f"http://{ip}/tone"
+    def __init__(self, max_workers=64, timeout=0.1):
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def session(self, ip):
+        """Returns the persistent session for a device, creating it on first use."""
+        with self._lock:
+            s = self._sessions.get(ip)
+            if s is None:
+                s = self._sessions[ip] = requests.Session()
+            return s
+
+    def _send(self, ip, path, body, start):
+        # Wait for the common start time so every worker fires together
+        sleep_until(start)
+        sent_at = time.perf_counter()
         try:
-            # We use a short timeout because we don't need to wait for a response
-            # This makes the orchestra play more in sync.
-            requests.post(url, json=payload, timeout=0.1)
+            self.session(ip).post(
+                f"http://{ip}{path}",
+                data=body,
+                headers={"Content-Type": "application/json"},
+                timeout=self.timeout,
+            )
         except requests.exceptions.Timeout:
-            # This is expected, we can ignore it
-            pass
-        except requests.exceptions.RequestException as e:
+            # We don't wait for the answer, so a timeout is expected
+            return SendResult(ip, True, sent_at, (time.perf_counter() - sent_at) * 1000)
+        except Exception as e:
             print(f"Error contacting {ip}: {e}")
+            return SendResult(
+                ip,
+                False,
+                sent_at,
+                (time.perf_counter() - sent_at) * 1000,
+                type(e).__name__,
+            )
+        return SendResult(ip, True, sent_at, (time.perf_counter() - sent_at) * 1000)
+
+    def post_all(self, ips, path, payload, lead_ms=2):
+        """POSTs ``payload`` to ``path`` on every device and waits for all sends.
+
+        The payload is serialized once. Workers are released at a shared start
+        time ``lead_ms`` in the future so thread start-up doesn't add skew.
+        """
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        return self.post_each(path, {ip: body for ip in ips}, lead_ms)
+
+    def post_each(self, path, bodies, lead_ms=2):
+        """Like ``post_all`` but with a pre-serialized body per device ({ip: bytes})."""
+        start = time.perf_counter() + lead_ms / 1000
+        futures = [
+            self._pool.submit(self._send, ip, path, body, start)
+            for ip, body in bodies.items()
+        ]
+        return DispatchReport([f.result() for f in futures])
+
+    def map(self, fn, ips):
+        """Runs ``fn(ip)`` for every device in parallel, returns {ip: result}."""
+        futures = {ip: self._pool.submit(fn, ip) for ip in ips}
+        return {ip: f.result() for ip, f in futures.items()}
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+        with self._lock:
+            for s in self._sessions.values():
+                s.close()
+            self._sessions.clear()
+
+
+dispatcher = Dispatcher()
+
+
+# --- Clock Synchronization ---
+# Each Pico counts time with time.ticks_ms(), which starts at boot and wraps
+# around at 2**30. GET /time returns the tick count when the request arrived
+# and when the reply was sent, which is enough for an NTP-style estimate of
+# the offset between our clock and the device's. Repeated syncs also give the
+# drift, so "play at" times stay accurate between syncs.
+
+TICKS_PERIOD = 1 << 30
+DRIFT_MIN_SPAN_MS = 30000
+
+
+def local_ms():
+    """The conductor's monotonic clock, in ms."""
+    return time.perf_counter() * 1000
+
+
+def ticks_diff(a, b):
+    """Signed difference a - b of two device tick values, like time.ticks_diff."""
+    return (a - b + TICKS_PERIOD // 2) % TICKS_PERIOD - TICKS_PERIOD // 2
+
+
+@dataclass
+class ClockEstimate:
+    """Maps conductor time to one device's time.ticks_ms()."""
+
+    offset_ms: float  # device ticks minus local_ms() at ref_ms (unwrapped)
+    drift: float  # change of the offset per local ms
+    ref_ms: float
+    error_ms: float  # half the best round trip: bound on the offset error
+
+    def device_ticks(self, at_local_ms):
+        offset = self.offset_ms + self.drift * (at_local_ms - self.ref_ms)
+        return int(round(at_local_ms + offset)) % TICKS_PERIOD
+
+
+class ClockSync:
+    """Estimates clock offset and drift of each device from GET /time probes."""
+
+    def __init__(self, samples=8, history=16, timeout=0.5, parallel=8):
+        self.samples = samples
+        self.parallel = parallel
+        self.history = history
+        self.timeout = timeout
+        self.estimates = {}
+        self._points = {}  # ip -> [(local_ms, unwrapped offset), ...]
+
+    def _probe(self, ip):
+        """Keeps the sample with the shortest round trip, which has the least error."""
+        best = None
+        for _ in range(self.samples):
+            t0 = local_ms()
+            res = dispatcher.session(ip).get(f"http://{ip}/time", timeout=self.timeout)
+            t3 = local_ms()
+            data = res.json()
+            rx = data["ticks_ms"]
+            tx = data.get("now_ms", rx)
+            delay = (t3 - t0) - ticks_diff(tx, rx)
+            if best is None or delay < best[0]:
+                offset = ((rx - t0) + (tx - t3)) / 2
+                best = (delay, (t0 + t3) / 2, offset)
+        return best
+
+    def add_sample(self, ip, delay, mid, offset):
+        """Records one offset measurement (round-trip delay, local midpoint, offset)."""
+        points = self._points.setdefault(ip, [])
+        if points:
+            # Unwrap against the previous offset so tick wrap-around is invisible
+            prev = points[-1][1]
+            offset = prev + ticks_diff(offset, prev)
+        else:
+            offset %= TICKS_PERIOD
+        points.append((mid, offset))
+        del points[: -self.history]
+
+        drift = 0.0
+        # Offsets are only a few ms apart, so fitting drift over a short span
+        # would mostly fit noise
+        if len(points) >= 2 and points[-1][0] - points[0][0] > DRIFT_MIN_SPAN_MS:
+            # Least-squares slope of offset over time
+            n = len(points)
+            mx = sum(p[0] for p in points) / n
+            my = sum(p[1] for p in points) / n
+            sxx = sum((p[0] - mx) ** 2 for p in points)
+            drift = sum((p[0] - mx) * (p[1] - my) for p in points) / sxx
+            offset = my + drift * (mid - mx)
+        self.estimates[ip] = ClockEstimate(offset, drift, mid, max(delay, 0.0) / 2)
+
+    def sync(self, ips):
+        """Probes every device in parallel and refreshes its estimate."""
+
+        def probe(ip):
+            try:
+                return self._probe(ip)
+            except Exception as e:
+                print(f"Clock sync with {ip} failed: {e}")
+                return None
+
+        # Probing too many devices at once inflates round trips (and so the
+        # error), so only a few run in parallel
+        ips = list(ips)
+        for i in range(0, len(ips), self.parallel):
+            for ip, best in dispatcher.map(probe, ips[i:i + self.parallel]).items():
+                if best is not None:
+                    self.add_sample(ip, *best)
+        return self.estimates
+
+    def device_ticks(self, ip, at_local_ms):
+        """Device tick value for a conductor time, or None if ip isn't synced."""
+        est = self.estimates.get(ip)
+        return None if est is None else est.device_ticks(at_local_ms)
+
+    def skew_bound_ms(self, ips=None):
+        """Worst-case start skew between two synced devices.
+
+        Each device may start up to error_ms early or late, plus 1 ms of tick
+        resolution, so two devices differ by at most the two largest errors.
+        """
+        errors = sorted(
+            (e.error_ms for ip, e in self.estimates.items() if ips is None or ip in ips),
+            reverse=True,
+        )
+        return sum(errors[:2]) + 1 if errors else 0.0
+
+
+clock = ClockSync()
+
+
+def _with_start_time(body, ip, at_local_ms):
+    """Adds "at_ms" in the device's clock to a pre-serialized JSON object."""
+    at = clock.device_ticks(ip, at_local_ms)
+    if at is None:
+        return body
+    return body[:-1] + b',"at_ms":%d}' % at
+
+
+def play_note_on_all_picos(freq, ms, start_in_ms=None):
+    """Sends a /tone POST request to every Pico in the list at the same time.
+
+    With start_in_ms, synced devices are told to start the note on the same
+    tick of their own clock, that many ms from now.
+    """
+    print(f"Playing note: {freq}Hz for {ms}ms on all devices.")
+
+    payload = {"freq": freq, "ms": ms, "duty": 0.5}
+    if start_in_ms is None:
+        return dispatcher.post_all(PICO_IPS, "/tone", payload)
+
+    at = local_ms() + start_in_ms
+    body = json.dumps(payload).encode()
+    return dispatcher.post_each(
+        "/tone", {ip: _with_start_time(body, ip, at) for ip in PICO_IPS}
+    )
+
+
+# --- Batched Commands ---
+# Setting up a performance takes several requests per device (stop, upload a
+# melody, check health...). POST /batch runs a list of them on the device in
+# one request, without anything else running in between.
+BATCH_MAX_OPS = 8  # MAX_BATCH_OPS in main.py
+
+
+@dataclass
+class BatchResult:
+    """Outcome of one device's batched operations.
+
+    ``split`` is set when the operations needed more than one /batch
+    request, so they didn't run as one unit: if a later request failed, the
+    operations in ``results`` had already run.
+    """
+
+    ip: str
+    ok: bool
+    results: list = field(default_factory=list)  # {"status": ..., "body": ...} per op
+    error: str = ""
+    split: bool = False
+
+
+class CommandBatch:
+    """Collects operations per device and sends each device's as POST /batch.
+
+    Operations keep the order they were added in. Each device's run as one
+    unit, unless there are more than BATCH_MAX_OPS of them: those are sent
+    as several batches, one after the other, and the result is marked
+    ``split``. Devices are contacted in parallel.
+    """
+
+    def __init__(self, timeout=1.0):
+        self.timeout = timeout
+        self._ops = {}  # ip -> [op, ...]
+
+    def add(self, ip, method, path, body=None):
+        """Queues one operation for one device."""
+        op = {"method": method, "path": path}
+        if body is not None:
+            op["body"] = body
+        self._ops.setdefault(ip, []).append(op)
+        return self
+
+    def add_all(self, ips, method, path, body=None):
+        """Queues the same operation for every device."""
+        for ip in ips:
+            self.add(ip, method, path, body)
+        return self
+
+    def pending(self):
+        """{ip: number of operations not sent yet}."""
+        return {ip: len(ops) for ip, ops in self._ops.items()}
+
+    def _send(self, ip, ops):
+        results = []
+        split = len(ops) > BATCH_MAX_OPS
+        try:
+            for i in range(0, len(ops), BATCH_MAX_OPS):
+                chunk = ops[i:i + BATCH_MAX_OPS]
+                res = dispatcher.session(ip).post(
+                    f"http://{ip}/batch", json={"ops": chunk}, timeout=self.timeout
+                )
+                res.raise_for_status()
+                results.extend(res.json()["results"])
+        except Exception as e:
+            if results:
+                print(f"Batch to {ip} failed after {len(results)} of {len(ops)} ops: {e}")
+            else:
+                print(f"Batch to {ip} failed: {e}")
+            return BatchResult(ip, False, results, type(e).__name__, split)
+        return BatchResult(ip, True, results, split=split)
+
+    def send(self):
+        """Sends every pending operation; returns {ip: BatchResult}."""
+        ops, self._ops = self._ops, {}
+        return dispatcher.map(lambda ip: self._send(ip, ops[ip]), ops)
+
+
+# --- UDP Transport ---
+# The same commands as the HTTP API, as fixed-size binary datagrams handled
+# by the firmware's udp_server (see main.py for the frame layout). There is
+# no handshake and no reply, so each frame is sent twice by default; the
+# device drops the copy by its sequence number.
+
+UDP_PORT = 5006
+UDP_MAGIC = b"PL"
+UDP_VERSION = 1
+OP_TONE = 1
+OP_MELODY = 2
+OP_STOP = 3
+OP_SYNC = 4
+UDP_HEADER = struct.Struct(">2sBBIi")
+TONE_BODY = struct.Struct(">HHBx")
+MELODY_BODY = struct.Struct(">BBH")
+MELODY_MAX_NOTES = 32
+SYNC_REPLY = struct.Struct(">II")
+
+
+def udp_address(ip):
+    """(host, port) for a device given as "host" or "host:port"."""
+    host, _, port = ip.partition(":")
+    return host, int(port) if port else UDP_PORT
+
+
+class UdpTransport:
+    """Sends tone, melody, stop and sync commands to devices over UDP."""
+
+    def __init__(self, copies=2):
+        self.copies = copies
+        self.seq = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def _header(self, op, at_ms=None):
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        return UDP_HEADER.pack(
+            UDP_MAGIC, UDP_VERSION, op, self.seq, -1 if at_ms is None else at_ms
+        )
+
+    def _send_all(self, ips, frames):
+        """Sends {ip: frame} back to back and reports it like Dispatcher does."""
+        results = []
+        for ip, frame in frames.items():
+            sent_at = time.perf_counter()
+            try:
+                for _ in range(self.copies):
+                    self.sock.sendto(frame, udp_address(ip))
+            except OSError as e:
+                print(f"Error contacting {ip}: {e}")
+                results.append(SendResult(ip, False, sent_at, 0.0, type(e).__name__))
+                continue
+            results.append(
+                SendResult(ip, True, sent_at, (time.perf_counter() - sent_at) * 1000)
+            )
+        return DispatchReport(results)
+
+    def _frames(self, ips, op, body, start_in_ms):
+        """One frame per device, all with the same seq; at_ms differs per device."""
+        at = None if start_in_ms is None else local_ms() + start_in_ms
+        header = self._header(op)
+        frames = {}
+        for ip in ips:
+            device_at = None if at is None else clock.device_ticks(ip, at)
+            if device_at is None:
+                frames[ip] = header + body
+            else:
+                frames[ip] = (
+                    UDP_HEADER.pack(UDP_MAGIC, UDP_VERSION, op, self.seq, device_at)
+                    + body
+                )
+        return frames
+
+    def tone_all(self, ips, freq, ms, duty=0.5, start_in_ms=None):
+        body = TONE_BODY.pack(int(freq), int(ms), int(duty * 255))
+        return self._send_all(ips, self._frames(ips, OP_TONE, body, start_in_ms))
+
+    def melody_all(self, ips, notes, gap_ms=0, append=False, start_in_ms=None):
+        """Sends up to MELODY_MAX_NOTES (freq, ms) notes as one frame."""
+        notes = list(notes)[:MELODY_MAX_NOTES]
+        body = MELODY_BODY.pack(len(notes), 1 if append else 0, gap_ms)
+        body += b"".join(struct.pack(">HH", int(f), int(ms)) for f, ms in notes)
+        body += bytes(4 * (MELODY_MAX_NOTES - len(notes)))
+        return self._send_all(ips, self._frames(ips, OP_MELODY, body, start_in_ms))
+
+    def stop_all(self, ips):
+        return self._send_all(ips, {ip: self._header(OP_STOP) for ip in ips})
+
+    def sync(self, ips, samples=8, timeout=0.2):
+        """Clock sync over UDP; feeds the same estimates as ClockSync.sync."""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.settimeout(timeout)
+        try:
+            for ip in ips:
+                best = None
+                for _ in range(samples):
+                    frame = self._header(OP_SYNC)
+                    t0 = local_ms()
+                    sock.sendto(frame, udp_address(ip))
+                    try:
+                        reply = sock.recv(64)
+                    except socket.timeout:
+                        continue
+                    t3 = local_ms()
+                    if reply[: UDP_HEADER.size] != frame:
+                        continue  # A late reply to an earlier probe
+                    rx, tx = SYNC_REPLY.unpack_from(reply, UDP_HEADER.size)
+                    delay = (t3 - t0) - ticks_diff(tx, rx)
+                    if best is None or delay < best[0]:
+                        best = (delay, (t0 + t3) / 2, ((rx - t0) + (tx - t3)) / 2)
+                if best is not None:
+                    clock.add_sample(ip, *best)
+        finally:
+            sock.close()
+        return clock.estimates
+
+    def close(self):
+        self.sock.close()
+
+
+# --- Score Compiler ---
+# Instead of one /tone request per note, a song is cut into chunks of notes
+# that are uploaded with a single /melody request each. Chunks after the
+# first are sent ahead of time with "append": true so the Pico queues them
+# behind the one it is playing, which lets playback ride out network stalls.
+
+MELODY_CHUNK_NOTES = 32
+MELODY_GAP_MS = 20
+UPLOAD_LEAD_MS = 2000
+
+
+@dataclass
+class MelodyChunk:
+    """A slice of a song, ready to be POSTed to /melody."""
+
+    start_ms: int  # offset of the first note from the start of the song
+    duration_ms: int
+    notes: int
+    body: bytes
+
+
+def compile_melody(song, gap_ms=MELODY_GAP_MS, chunk_notes=MELODY_CHUNK_NOTES):
+    """Splits (freq, ms) notes into pre-serialized /melody chunks.
+
+    ``song`` can be any iterable, e.g. ``score.Voice.as_song()``; it is read
+    one chunk at a time.
+    """
+    chunks = []
+    start_ms = 0
+    notes = iter(song)
+    while True:
+        part = list(islice(notes, chunk_notes))
+        if not part:
+            return chunks
+        payload = {"notes": [{"freq": f, "ms": ms} for f, ms in part], "gap_ms": gap_ms}
+        if chunks:
+            payload["append"] = True
+        duration_ms = sum(ms + gap_ms for _, ms in part)
+        body = json.dumps(payload, separators=(",", ":")).encode()
+        chunks.append(MelodyChunk(start_ms, duration_ms, len(part), body))
+        start_ms += duration_ms
+
+
+def compile_score(parts, gap_ms=MELODY_GAP_MS, chunk_notes=MELODY_CHUNK_NOTES):
+    """Compiles {ip: song} into {ip: [MelodyChunk, ...]}.
+
+    A part is a list of (freq, ms) or a ``score.Voice``. Devices that share
+    the same part share the same compiled chunks.
+    """
+    cache = {}
+    compiled = {}
+    for ip, song in parts.items():
+        key = id(song)
+        if key not in cache:
+            notes = song.as_song() if hasattr(song, "as_song") else song
+            cache[key] = compile_melody(notes, gap_ms, chunk_notes)
+        compiled[ip] = cache[key]
+    return compiled
+
+
+def by_ip(keyed, ips, devices=None):
+    """Re-keys {device ip or id: value} by ip, dropping devices not in ``ips``.
+
+    ``devices`` is a fleet registry ({device_id: {"ip": ...}}) used to look up
+    device ids.
+    """
+    id_to_ip = {device_id: entry["ip"] for device_id, entry in (devices or {}).items()}
+    by_key = {}
+    for key, value in keyed.items():
+        ip = id_to_ip.get(key, key)
+        if ip in ips:
+            by_key[ip] = value
+    return by_key
+
+
+def parts_from_midi(path, ips, mapping=None, ranges=None, devices=None):
+    """Reads a MIDI file and picks a voice for every device: {ip: Voice}.
+
+    With ``ranges`` ({device: (min_freq, max_freq)}) voices go to the devices
+    whose range suits them, devices without a range taking the whole piezo
+    range; otherwise voices are dealt round-robin. ``mapping``
+    ({device: voice name}) overrides either. Devices are keyed by ip or by
+    device id (looked up in ``devices``).
+    """
+    voices = score.load_midi(path)
+    if ranges:
+        known = by_ip(ranges, ips, devices)
+        full = (score.PIEZO_MIN_FREQ, score.PIEZO_MAX_FREQ)
+        capabilities = {ip: tuple(known.get(ip, full)) for ip in ips}
+        assignment = score.assign_by_capability(voices, capabilities)
+    else:
+        assignment = score.assign_round_robin(voices, ips)
+    if mapping:
+        assignment.update(by_ip(mapping, ips, devices))
+    return {ip: voices[name] for ip, name in assignment.items()}
+
+
+def upload_plan(compiled, lead_ms=UPLOAD_LEAD_MS):
+    """Orders chunk uploads by time: a list of (upload_at_ms, {ip: body}) rounds.
+
+    Each chunk is uploaded ``lead_ms`` before it is due to start. When a device
+    has several chunks due in the same round (e.g. at time 0), they go out in
+    consecutive rounds so the Pico receives them in song order.
+    """
+    due = {}
+    for ip, chunks in compiled.items():
+        for chunk in chunks:
+            at = max(0, chunk.start_ms - lead_ms)
+            due.setdefault(at, {}).setdefault(ip, []).append(chunk.body)
+
+    plan = []
+    for at in sorted(due):
+        bodies_by_ip = due[at]
+        for r in range(max(len(bodies) for bodies in bodies_by_ip.values())):
+            plan.append((at, {ip: b[r] for ip, b in bodies_by_ip.items() if r < len(b)}))
+    return plan
+
+
+def play_score(compiled, lead_ms=UPLOAD_LEAD_MS, start_in_ms=None):
+    """Uploads a compiled score, one /melody request per device per chunk.
+
+    With start_in_ms, the first chunk carries a synchronized start time (see
+    ClockSync) so all devices begin the song on the same tick.
+    """
+    reports = []
+    start = time.perf_counter()
+    song_start = None if start_in_ms is None else local_ms() + start_in_ms
+    first = {ip: chunks[0].body for ip, chunks in compiled.items() if chunks}
+    for at, bodies in upload_plan(compiled, lead_ms):
+        if song_start is not None:
+            bodies = {
+                ip: _with_start_time(b, ip, song_start) if b is first[ip] else b
+                for ip, b in bodies.items()
+            }
+        sleep_until(start + at / 1000)
+        reports.append(dispatcher.post_each("/melody", bodies))
+    # Wait for the longest part to finish playing
+    end_ms = max(
+        (c[-1].start_ms + c[-1].duration_ms for c in compiled.values() if c), default=0
+    )
+    end_ms += start_in_ms or 0
+    sleep_until(start + end_ms / 1000)
+    return reports
+
+
+# --- Playback Scheduling ---
+
+
+class DeadlineScheduler:
+    """Plays notes at onsets computed from the start of the song.
+
+    Every onset is an absolute deadline, so time spent sending a note is
+    absorbed instead of pushing back all the notes after it. The position in
+    the song is tracked in beats, which lets the tempo change mid-song
+    without the earlier notes moving. ``jitter_ms`` records how late each
+    onset actually fired.
+    """
+
+    def __init__(self, bpm=SONG_BPM, base_bpm=SONG_BPM):
+        self.base_bpm = base_bpm  # the tempo the note durations are written at
+        self.bpm = bpm
+        self.jitter_ms = []
+        self._anchor_time = None
+        self._anchor_beat = 0.0
+
+    def onset(self, beat):
+        """perf_counter() time at which the given beat of the song starts."""
+        return self._anchor_time + (beat - self._anchor_beat) * 60 / self.bpm
+
+    def set_bpm(self, bpm, beat=None):
+        """Changes tempo from ``beat`` on (default: the start of the song)."""
+        if self._anchor_time is not None and beat is not None:
+            self._anchor_time = self.onset(beat)
+            self._anchor_beat = beat
+        self.bpm = bpm
+
+    def run(self, notes, play, tempo_changes=None, articulation=0.9, start=None):
+        """Calls ``play(freq, ms)`` for each (freq, ms) note at its onset.
+
+        tempo_changes maps a note index to the BPM from that note on. Each
+        note sounds for ``articulation`` of its slot to leave an audible gap.
+        """
+        tempo_changes = tempo_changes or {}
+        self._anchor_time = time.perf_counter() if start is None else start
+        self._anchor_beat = 0.0
+        self.jitter_ms = []
+        beat = 0.0
+        for i, (freq, ms) in enumerate(notes):
+            if i in tempo_changes:
+                self.set_bpm(tempo_changes[i], beat)
+            deadline = self.onset(beat)
+            sleep_until(deadline)
+            self.jitter_ms.append((time.perf_counter() - deadline) * 1000)
+            play(freq, int(ms * self.base_bpm / self.bpm * articulation))
+            beat += ms * self.base_bpm / 60000
+        sleep_until(self.onset(beat))
+        return self.jitter_ms
+
+    def jitter_summary(self):
+        """Mean, median and worst onset lateness in ms."""
+        if not self.jitter_ms:
+            return {"mean": 0.0, "p50": 0.0, "max": 0.0}
+        ordered = sorted(self.jitter_ms)
+        return {
+            "mean": sum(ordered) / len(ordered),
+            "p50": ordered[len(ordered) // 2],
+            "max": ordered[-1],
+        }
+
+
+def build_parser():
+    """The conductor's command line."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pico Light Orchestra conductor")
+    parser.add_argument(
+        "--per-note",
+        action="store_true",
+        help="send one /tone request per note instead of uploading /melody chunks",
+    )
+    parser.add_argument(
+        "--bpm", type=float, default=SONG_BPM, help="tempo (per-note mode)"
+    )
+    parser.add_argument(
+        "--udp",
+        action="store_true",
+        help="send notes as UDP datagrams instead of HTTP requests (per-note mode)",
+    )
+    parser.add_argument("--midi", help="play this MIDI file instead of the built-in song")
+    parser.add_argument(
+        "--mapping", help="JSON file assigning MIDI voices to devices (with --midi)"
+    )
+    parser.add_argument(
+        "--ranges",
+        help="JSON file of each device's [min_freq, max_freq]; voices go to the "
+        "devices whose range suits them (with --midi)",
+    )
+    return parser
 
 
 if __name__ == "__main__":
+    args = build_parser().parse_args()
+
+    # Use the devices found by fleet.py, if any
+    PICO_IPS = fleet.load_ips(default=PICO_IPS)
+
     print("--- Pico Light Orchestra Conductor ---")
     print(f"Found {len(PICO_IPS)} devices in the orchestra.")
     print("Press Ctrl+C to stop.")
@@ -79,12 +799,46 @@ if __name__ == "__main__":
         print("Go!\n")
 
         # Play the song
-        for note, duration in SONG:
-            play_note_on_all_picos(note, duration)
-            # Wait for the note's duration plus a small gap before playing the next one
-            time.sleep(duration / 1000 * 1.1)
+        if args.per_note:
+
+            udp = UdpTransport() if args.udp else None
+
+            def play(note, duration):
+                if udp:
+                    report = udp.tone_all(PICO_IPS, note, duration)
+                else:
+                    report = play_note_on_all_picos(note, duration)
+                print(
+                    f"  skew {report.skew_ms:.1f}ms, "
+                    f"slowest device {report.max_latency_ms:.1f}ms, "
+                    f"{len(report.failed)} failed"
+                )
+
+            scheduler = DeadlineScheduler(bpm=args.bpm)
+            scheduler.run(SONG, play)
+            summary = scheduler.jitter_summary()
+            print(
+                f"Onset jitter: mean {summary['mean']:.1f}ms, "
+                f"p50 {summary['p50']:.1f}ms, max {summary['max']:.1f}ms"
+            )
+        else:
+            clock.sync(PICO_IPS)
+            print(f"Clocks synced, expected skew <= {clock.skew_bound_ms():.1f}ms")
+            if args.midi:
+                mapping = score.load_mapping(args.mapping) if args.mapping else None
+                ranges = score.load_mapping(args.ranges) if args.ranges else None
+                devices = fleet.Registry().load().devices
+                parts = parts_from_midi(args.midi, PICO_IPS, mapping, ranges, devices)
+                for ip, voice in parts.items():
+                    print(f"  {ip} plays {voice.name} ({len(voice)} notes)")
+            else:
+                parts = {ip: SONG for ip in PICO_IPS}
+            reports = play_score(compile_score(parts), start_in_ms=500)
+            print(f"Uploaded {sum(len(r.results) for r in reports)} /melody requests.")
 
         print("\nSong finished!")
 
     except KeyboardInterrupt:
         print("\nConductor stopped by user.")
+    finally:
+        dispatcher.close()
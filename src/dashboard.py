@@ -1,8 +1,18 @@
 # dashboard.py
 # To be run on a student's computer (not the Pico)
 
+import json
+import os
+import random
+import sys
+import threading
 import requests
 import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import fleet
+import metrics
+import timeseries
 
 # --- Configuration ---
 # Students should populate this list with the IP address(es) of their Pico
@@ -11,59 +21,633 @@ PICO_IPS = [
 ]
 
 
-def get_device_status(ip):
-    """Fetches /health and /sensor data from a single device."""
+# Refresh cadence, and how long a refresh may wait for slow devices
+REFRESH_INTERVAL_S = 1.0
+REFRESH_DEADLINE_S = 0.8
+
+
+# Devices known to run firmware without GET /status
+_legacy_devices = set()
+# Last /status answer and its ETag for each device, for conditional requests
+_status_cache = {}
+
+
+def _get_combined_status(http, ip):
+    """Fetches /status, or returns None if the device doesn't have it.
+
+    The ETag of the last answer is sent back, so an unchanged device
+    replies with a bodiless 304 and the cached answer is reused.
+    """
+    cached = _status_cache.get(ip)
+    headers = {"If-None-Match": cached[0]} if cached else {}
+    res = http.get(f"http://{ip}/status", headers=headers, timeout=1)
+    if res.status_code == 404:
+        return None
+    if res.status_code == 304 and cached:
+        return cached[1]
+    res.raise_for_status()
+    data = res.json()
+    if res.headers.get("ETag"):
+        _status_cache[ip] = (res.headers["ETag"], data)
+    return data
+
+
+def get_device_status(ip, session=None):
+    """Fetches /status (or /health and /sensor on older firmware) from a single device."""
+    http = session or requests
     status = {"ip": ip, "device_id": "N/A", "status": "Error", "norm": 0.0}
     try:
+        if ip not in _legacy_devices:
+            combined = _get_combined_status(http, ip)
+            if combined is not None:
+                status.update(combined)
+                return status
+            _legacy_devices.add(ip)
+
         # Get health status
-        health_res = requests.get(f"http://{ip}/health", timeout=1)
+        health_res = http.get(f"http://{ip}/health", timeout=1)
         health_res.raise_for_status()
         health_data = health_res.json()
         status.update(health_data)
         status["status"] = health_data.get("status", "Unknown")
 
         # Get sensor data
-        sensor_res = requests.get(f"http://{ip}/sensor", timeout=1)
+        sensor_res = http.get(f"http://{ip}/sensor", timeout=1)
         sensor_res.raise_for_status()
         sensor_data = sensor_res.json()
         status["norm"] = sensor_data.get("norm", 0.0)
 
     except requests.exceptions.RequestException as e:
         status["status"] = f"Offline ({type(e).__name__})"
+        status["error"] = type(e).__name__
 
     return status
 
 
+# --- Adaptive Polling ---
+# Each device gets its own poll interval. Devices whose light level moves
+# are polled more often, steady ones less often, and devices that don't
+# answer back off exponentially (with jitter, so a fleet that dropped off
+# the Wi-Fi together doesn't come back in lockstep). A global budget caps
+# the polls per second, however many devices are due.
+POLL_MIN_S = 0.25
+POLL_MAX_S = 5.0  # Slowest rate for a steady device
+BACKOFF_BASE_S = 1.0
+BACKOFF_MAX_S = 60.0
+FAST_CHANGE = 0.02  # norm change between polls that counts as "moving"
+STEADY_CHANGE = 0.005
+POLL_BUDGET_PER_S = 100.0
+SCHEDULE_TICK_S = POLL_MIN_S
+
+
+class PollSchedule:
+    """Decides which devices to poll next."""
+
+    def __init__(
+        self,
+        budget_per_s=POLL_BUDGET_PER_S,
+        min_s=POLL_MIN_S,
+        max_s=POLL_MAX_S,
+        rng=None,
+    ):
+        self.budget_per_s = budget_per_s
+        self.min_s = min_s
+        self.max_s = max_s
+        self.rng = rng or random.Random()
+        self.interval = {}
+        self.next_due = {}
+        self.failures = {}
+        self.last_norm = {}
+        self._tokens = budget_per_s
+        self._refilled = None
+
+    def due(self, ips, now):
+        """The devices to poll now: the most overdue first, within the budget."""
+        if self._refilled is not None:
+            elapsed = now - self._refilled
+            self._tokens = min(
+                self.budget_per_s, self._tokens + elapsed * self.budget_per_s
+            )
+        self._refilled = now
+        overdue = sorted((self.next_due.get(ip, now), ip) for ip in ips)
+        chosen = []
+        for due_at, ip in overdue:
+            if due_at > now or self._tokens < 1:
+                break
+            self._tokens -= 1
+            chosen.append(ip)
+        return chosen
+
+    def record(self, ip, status, now):
+        """Sets the device's next poll time from the outcome of a poll."""
+        if status["status"] != "ok":
+            failures = self.failures[ip] = self.failures.get(ip, 0) + 1
+            backoff = min(BACKOFF_BASE_S * 2 ** (failures - 1), BACKOFF_MAX_S)
+            # "Equal jitter": somewhere between half and all of the backoff
+            delay = backoff * self.rng.uniform(0.5, 1.0)
+            self.interval.pop(ip, None)
+        else:
+            self.failures.pop(ip, None)
+            norm = status.get("norm", 0.0)
+            change = abs(norm - self.last_norm.get(ip, norm))
+            self.last_norm[ip] = norm
+            delay = self.interval.get(ip)
+            if delay is None or change >= FAST_CHANGE:
+                # New, just back online or moving: poll at the fastest rate
+                delay = self.min_s
+            elif change <= STEADY_CHANGE:
+                delay = min(delay * 1.5, self.max_s)
+            self.interval[ip] = delay
+        self.next_due[ip] = now + delay
+        return delay
+
+
+class Poller:
+    """Polls all devices at once and never waits past a deadline.
+
+    Each device is queried from a thread pool over its own keep-alive
+    session. A device that hasn't answered when the deadline passes keeps
+    its poll running in the background and is shown with its last known
+    values, marked stale, instead of holding up the whole refresh.
+
+    With a ``schedule`` (see PollSchedule) only the devices it says are
+    due are polled; the others show their last known values. Every
+    completed poll is passed to ``metrics`` (see metrics.FleetMetrics).
+    ``new_readings`` returns each completed poll once, for history.
+    """
+
+    def __init__(
+        self, max_workers=64, deadline_s=REFRESH_DEADLINE_S, schedule=None, metrics=None
+    ):
+        self.deadline_s = deadline_s
+        self.schedule = schedule
+        self.metrics = metrics
+        self.last_known = {}
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+        self._pending = {}  # ip -> poll still running from an earlier refresh
+        self._sessions = {}
+        self._new = {}  # ip -> (time.time(), status) of a poll not yet collected
+
+    def _poll(self, ip):
+        session = self._sessions.get(ip)
+        if session is None:
+            session = self._sessions[ip] = requests.Session()
+        start = time.perf_counter()
+        status = get_device_status(ip, session)
+        status["latency_ms"] = (time.perf_counter() - start) * 1000
+        if self.metrics is not None:
+            self.metrics.observe(status)
+        return time.time(), status
+
+    def refresh(self, ips):
+        """Returns one status per ip, waiting at most deadline_s."""
+        idle = [ip for ip in ips if ip not in self._pending]
+        if self.schedule is not None:
+            idle = self.schedule.due(idle, time.monotonic())
+        for ip in idle:
+            self._pending[ip] = self._pool.submit(self._poll, ip)
+        wait(
+            [self._pending[ip] for ip in ips if ip in self._pending],
+            timeout=self.deadline_s,
+        )
+
+        now = time.monotonic()
+        statuses = []
+        for ip in ips:
+            future = self._pending.get(ip)
+            default = {"ip": ip, "device_id": "N/A", "status": "Waiting", "norm": 0.0}
+            if future is None:
+                # Not due yet: the last reading is still current
+                status = self.last_known.get(ip, dict(default, stale=True))
+            elif future.done():
+                del self._pending[ip]
+                polled_at, status = future.result()
+                status = dict(status, stale=False)
+                self.last_known[ip] = status
+                self._new[ip] = (polled_at, status)
+                if self.schedule is not None:
+                    self.schedule.record(ip, status, now)
+            else:
+                status = dict(self.last_known.get(ip, default), stale=True)
+            statuses.append(status)
+        return statuses
+
+    def new_readings(self):
+        """(time, status) of each device's latest poll completed since the last call.
+
+        Devices that weren't due show their last reading on every refresh;
+        this returns it only once, with the time it was polled.
+        """
+        readings, self._new = self._new, {}
+        return list(readings.values())
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        for session in self._sessions.values():
+            session.close()
+
+
+# --- Event Stream Mode ---
+# Instead of polling, keep one /events stream open per device and let the
+# devices push their light level. Readings older than EVENT_STALE_S are
+# marked stale; dropped streams are reopened with a growing delay.
+EVENT_INTERVAL_MS = 50  # Ask for up to 20 updates per second
+EVENT_STALE_S = 6.0  # Devices send a keep-alive at least every 5 s
+RECONNECT_MIN_S = 0.5
+RECONNECT_MAX_S = 10.0
+
+
+class EventSubscriber:
+    """Holds a long-lived /events stream to every device in background threads."""
+
+    def __init__(self, ips, interval_ms=EVENT_INTERVAL_MS):
+        self.interval_ms = interval_ms
+        self.version = 0  # Goes up with every update, so the UI can skip redraws
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._states = {}
+        self._collected = {}  # ip -> "received" of the last event new_readings returned
+        self._threads = []
+        for ip in ips:
+            self._states[ip] = {
+                "ip": ip,
+                "device_id": "N/A",
+                "status": "Connecting",
+                "norm": 0.0,
+                "received": None,
+            }
+            thread = threading.Thread(target=self._follow, args=(ip,), daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _set(self, ip, **changes):
+        with self._lock:
+            self._states[ip].update(changes)
+            self.version += 1
+
+    def _follow(self, ip):
+        """Reads one device's stream forever, reconnecting when it drops."""
+        backoff = RECONNECT_MIN_S
+        session = requests.Session()
+        while not self._stop.is_set():
+            try:
+                info = get_device_status(ip, session)
+                self._set(ip, device_id=info["device_id"])
+                url = f"http://{ip}/events?interval_ms={self.interval_ms}"
+                with session.get(url, stream=True, timeout=(1, EVENT_STALE_S)) as res:
+                    res.raise_for_status()
+                    self._set(ip, status="ok")
+                    backoff = RECONNECT_MIN_S
+                    for line in res.iter_lines():
+                        if self._stop.is_set():
+                            break
+                        if line.startswith(b"data:"):
+                            event = json.loads(line[5:])
+                            self._set(
+                                ip, norm=event.get("norm", 0.0), received=time.monotonic()
+                            )
+            except (requests.exceptions.RequestException, ValueError) as e:
+                self._set(ip, status=f"Offline ({type(e).__name__})")
+            # Stream ended or failed: wait, then reconnect
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, RECONNECT_MAX_S)
+        session.close()
+
+    def statuses(self):
+        """Current status of every device, in the same format as get_device_status."""
+        now = time.monotonic()
+        with self._lock:
+            result = []
+            for state in self._states.values():
+                status = {k: v for k, v in state.items() if k != "received"}
+                received = state["received"]
+                status["stale"] = received is None or now - received > EVENT_STALE_S
+                result.append(status)
+            return result
+
+    def new_readings(self):
+        """(time, status) of every device with a new event since the last call.
+
+        The time is when the event arrived, so a device whose stream has
+        gone quiet is not recorded again.
+        """
+        offset = time.time() - time.monotonic()
+        readings = []
+        with self._lock:
+            for ip, state in self._states.items():
+                received = state["received"]
+                if received is None or received == self._collected.get(ip):
+                    continue
+                self._collected[ip] = received
+                status = {k: v for k, v in state.items() if k != "received"}
+                readings.append((received + offset, dict(status, stale=False)))
+        return readings
+
+    def close(self):
+        self._stop.set()
+
+
+def _light_bar(light_level):
+    """A simple bar graph for the light level."""
+    bar_length = int(light_level * 10)
+    return "█" * bar_length + "─" * (10 - bar_length)
+
+
+def format_row(status):
+    """One dashboard line for a device."""
+    light_level = status.get("norm", 0.0)
+    # A trailing * marks a device that missed the refresh deadline
+    stale = " *" if status.get("stale") else ""
+    return (
+        f"{status['ip']:<16} {status['device_id']:<25} {status['status'].capitalize():<10} "
+        f"[{_light_bar(light_level)}] {light_level:.2f}{stale}"
+    )
+
+
+HEADER = f"{'IP Address':<16} {'Device ID':<25} {'Status':<10} {'Light Level':<20}"
+
+
 def render_dashboard(statuses):
     """Renders the collected statuses to the console."""
 
     print("--- Pico Orchestra Dashboard --- (Press Ctrl+C to exit)")
     print("-" * 60)
-    print(f"{'IP Address':<16} {'Device ID':<25} {'Status':<10} {'Light Level':<20}")
+    print(HEADER)
     print("-" * 60)
 
     for status in statuses:
-        # Create a simple bar graph for the light level
-        light_level = status.get("norm", 0.0)
-        bar_length = int(light_level * 10)
-        bar = "█" * bar_length + "─" * (10 - bar_length)
-
-        print(
-            f"{status['ip']:<16} {status['device_id']:<25} {status['status'].capitalize():<10} "
-            f"[{bar}] {light_level:.2f}"
-        )
+        print(format_row(status))
 
     print("-" * 60)
 
 
+# --- Incremental Terminal View ---
+# For large fleets the dashboard draws into a fixed screen instead of
+# scrolling: every line is placed with an ANSI cursor move, and only lines
+# that differ from what is already on screen are rewritten. Only the visible
+# page is formatted, so the cost of a redraw doesn't grow with the fleet.
+
+
+def _ip_key(ip):
+    # Compare addresses part by part, so 10.0.0.9 comes before 10.0.0.10
+    return [part.zfill(5) for part in ip.replace(":", ".").split(".")]
+
+
+SORT_KEYS = {
+    "ip": lambda s: _ip_key(s["ip"]),
+    "id": lambda s: s["device_id"],
+    "status": lambda s: (s["status"] != "ok", s["status"], _ip_key(s["ip"])),
+    "light": lambda s: (-s.get("norm", 0.0), _ip_key(s["ip"])),
+}
+FILTERS = ("all", "offline", "dark", "bright")
+DARK_BELOW = 0.2
+BRIGHT_ABOVE = 0.8
+
+
+def _matches(status, filter_name):
+    if filter_name == "offline":
+        return status["status"] != "ok"
+    if filter_name == "dark":
+        return status["status"] == "ok" and status.get("norm", 0.0) < DARK_BELOW
+    if filter_name == "bright":
+        return status["status"] == "ok" and status.get("norm", 0.0) > BRIGHT_ABOVE
+    return True
+
+
+class TerminalView:
+    """Draws the dashboard in place, rewriting only the lines that changed.
+
+    ``sort``, ``filter`` and ``page`` can be changed between draws (see
+    ``handle_key``). The screen size is read from the terminal unless
+    ``size`` is given as (columns, lines).
+    """
+
+    # Lines above and below the device rows
+    HEADER_LINES = 4
+    FOOTER_LINES = 2
+
+    def __init__(self, out=None, size=None, sort="ip", filter="all"):
+        self.out = out or sys.stdout
+        self.size = size
+        self.sort = sort
+        self.filter = filter
+        self.page = 0
+        self._screen = []  # Lines currently on screen
+        self._screen_size = None
+
+    def _terminal_size(self):
+        if self.size:
+            return self.size
+        columns, lines = os.get_terminal_size(self.out.fileno())
+        return columns, lines
+
+    def page_size(self):
+        _, lines = self._terminal_size()
+        return max(1, lines - self.HEADER_LINES - self.FOOTER_LINES)
+
+    def layout(self, statuses):
+        """Returns every line of the screen for the current sort, filter and page."""
+        shown = [s for s in statuses if _matches(s, self.filter)]
+        shown.sort(key=SORT_KEYS[self.sort])
+        per_page = self.page_size()
+        pages = max(1, -(-len(shown) // per_page))
+        self.page = min(self.page, pages - 1)
+        first = self.page * per_page
+        last = first + per_page
+        offline = sum(1 for s in statuses if s["status"] != "ok")
+
+        lines = [
+            "--- Pico Orchestra Dashboard --- (Press Ctrl+C to exit)",
+            f"{len(statuses)} devices, {offline} offline | sort: {self.sort} | "
+            f"filter: {self.filter} | page {self.page + 1}/{pages}",
+            HEADER,
+            "-" * 60,
+        ]
+        lines += [format_row(s) for s in shown[first:last]]
+        lines += [""] * (per_page - (len(lines) - self.HEADER_LINES))
+        lines += ["-" * 60, "[n]ext/[p]rev page  [s]ort  [f]ilter  [q]uit"]
+        return lines
+
+    def draw(self, statuses):
+        """Updates the screen; returns the number of lines rewritten."""
+        columns, _ = size = self._terminal_size()
+        lines = [line[:columns] for line in self.layout(statuses)]
+        parts = []
+        if size != self._screen_size:
+            # First draw or resized terminal: start from a blank screen
+            parts.append("\x1b[2J")
+            self._screen = []
+            self._screen_size = size
+        changed = 0
+        for row, line in enumerate(lines):
+            if row < len(self._screen) and self._screen[row] == line:
+                continue
+            # Move to the line, write it and clear whatever was left of the old one
+            parts.append(f"\x1b[{row + 1};1H{line}\x1b[K")
+            changed += 1
+        self._screen = lines
+        if parts:
+            self.out.write("".join(parts))
+            self.out.flush()
+        return changed
+
+    def handle_key(self, key):
+        """Applies one key press; returns False when the user asked to quit."""
+        if key == "q":
+            return False
+        if key == "n":
+            self.page += 1  # Clamped to the last page by layout()
+        elif key == "p":
+            self.page = max(0, self.page - 1)
+        elif key == "s":
+            keys = list(SORT_KEYS)
+            self.sort = keys[(keys.index(self.sort) + 1) % len(keys)]
+            self.page = 0
+        elif key == "f":
+            self.filter = FILTERS[(FILTERS.index(self.filter) + 1) % len(FILTERS)]
+            self.page = 0
+        return True
+
+    def close(self):
+        # Leave the cursor below the dashboard
+        self.out.write(f"\x1b[{len(self._screen) + 1};1H\n")
+        self.out.flush()
+
+
+class KeyReader:
+    """Reads single key presses without blocking (and without echo)."""
+
+    def __init__(self):
+        self._saved = None
+        if os.name == "nt" or not sys.stdin.isatty():
+            return
+        import termios
+        import tty
+
+        self._saved = termios.tcgetattr(sys.stdin)
+        tty.setcbreak(sys.stdin.fileno())
+
+    def read(self):
+        """Returns the key pressed since the last call, or None."""
+        if os.name == "nt":
+            import msvcrt
+
+            if msvcrt.kbhit():
+                return msvcrt.getwch()
+            return None
+        if self._saved is None:
+            return None
+        import select
+
+        if select.select([sys.stdin], [], [], 0)[0]:
+            return sys.stdin.read(1)
+        return None
+
+    def close(self):
+        if self._saved is not None:
+            import termios
+
+            termios.tcsetattr(sys.stdin, termios.TCSADRAIN, self._saved)
+
+
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pico Light Orchestra dashboard")
+    parser.add_argument(
+        "--events", action="store_true", help="follow /events streams instead of polling"
+    )
+    parser.add_argument(
+        "--fixed",
+        action="store_true",
+        help="poll every device every second instead of adaptively",
+    )
+    parser.add_argument(
+        "--plain",
+        action="store_true",
+        help="print every refresh instead of updating in place",
+    )
+    parser.add_argument("--sort", choices=list(SORT_KEYS), default="ip")
+    parser.add_argument("--filter", choices=FILTERS, default="all")
+    parser.add_argument(
+        "--history", metavar="DIR", help="keep every reading in a time-series store"
+    )
+    parser.add_argument(
+        "--metrics-port", type=int, help="serve Prometheus metrics on this port"
+    )
+    args = parser.parse_args()
+
+    # Use the devices found by fleet.py, if any
+    PICO_IPS = fleet.load_ips(default=PICO_IPS)
+
+    fleet_metrics = None
+    if args.metrics_port:
+        fleet_metrics = metrics.FleetMetrics()
+        metrics.start_server(fleet_metrics, args.metrics_port)
+
+    if args.events:
+        source = EventSubscriber(PICO_IPS)
+    elif args.fixed:
+        source = Poller(metrics=fleet_metrics)
+    else:
+        source = Poller(
+            deadline_s=SCHEDULE_TICK_S, schedule=PollSchedule(), metrics=fleet_metrics
+        )
+    view = None
+    keys = None
+    if not args.plain and sys.stdout.isatty():
+        view = TerminalView(sort=args.sort, filter=args.filter)
+        keys = KeyReader()
+    store = timeseries.TimeSeriesStore(args.history) if args.history else None
     try:
+        shown = -1
+        last_statuses = []
+        next_refresh = time.monotonic()
         while True:
-            all_statuses = [get_device_status(ip) for ip in PICO_IPS]
-            render_dashboard(all_statuses)
-            time.sleep(1)  # Refresh every second
+            if args.events:
+                # Redraw as soon as something changed, at most 20 times a second
+                tick_s = EVENT_INTERVAL_MS / 1000
+                all_statuses = source.statuses() if source.version != shown else None
+                shown = source.version
+            else:
+                tick_s = REFRESH_INTERVAL_S if args.fixed else SCHEDULE_TICK_S
+                all_statuses = source.refresh(PICO_IPS)
+            if store is not None:
+                # Each poll or event once, at the time it arrived
+                for t, status in source.new_readings():
+                    store.record(status, t)
+
+            if all_statuses is not None:
+                last_statuses = all_statuses
+                if args.events and fleet_metrics is not None:
+                    # Polls report their own results; streams only update the gauges
+                    for status in all_statuses:
+                        fleet_metrics.observe(status)
+                if view is None:
+                    render_dashboard(all_statuses)
+                else:
+                    view.draw(all_statuses)
+
+            # Refresh at a fixed cadence, however long the refresh took, and
+            # handle key presses in between so paging feels immediate
+            next_refresh = max(next_refresh + tick_s, time.monotonic())
+            while (remaining := next_refresh - time.monotonic()) > 0:
+                key = keys.read() if keys is not None else None
+                if key is None:
+                    time.sleep(min(remaining, 0.05))
+                elif not view.handle_key(key):
+                    raise KeyboardInterrupt
+                else:
+                    view.draw(last_statuses)
 
     except KeyboardInterrupt:
         print("\nDashboard stopped.")
     except Exception as e:
         print(f"\nAn error occurred: {e}")
+    finally:
+        if view is not None:
+            keys.close()
+            view.close()
+        if store is not None:
+            store.close()
+        source.close()
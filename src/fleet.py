@@ -0,0 +1,192 @@
+# fleet.py
+# To be run on a student's computer (not the Pico)
+# Finds the Picos on the network and remembers them between runs, so the
+# conductor and dashboard don't need hard-coded IP addresses.
+#
+# Usage:
+#   python fleet.py --scan 192.168.1.0/24   # probe /health on every address
+#   python fleet.py --listen 5              # collect UDP beacons for 5 seconds
+
+import ipaddress
+import json
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# --- Configuration ---
+REGISTRY_FILE = "fleet.json"
+# Devices not seen for this long are dropped from the registry
+DEFAULT_TTL_S = 24 * 3600
+# The firmware broadcasts a small JSON beacon on this UDP port
+BEACON_PORT = 5005
+
+
+class Registry:
+    """Known devices keyed by device_id, persisted as a JSON file.
+
+    Each entry holds the device's last known ip, when it was last seen and
+    whether it answered the last time it was contacted.
+    """
+
+    def __init__(self, path=REGISTRY_FILE, ttl_s=DEFAULT_TTL_S):
+        self.path = path
+        self.ttl_s = ttl_s
+        self.devices = {}
+
+    def load(self):
+        try:
+            with open(self.path, "r") as f:
+                self.devices = json.load(f)
+        except (OSError, ValueError):
+            self.devices = {}
+        self.prune()
+        return self
+
+    def save(self):
+        # Write to a temporary file first so a crash can't leave half a registry
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.devices, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def update(self, device_id, ip, alive=True, **info):
+        """Records a sighting of a device; an ip moving to a new device is reassigned."""
+        for other_id, entry in list(self.devices.items()):
+            if other_id != device_id and entry["ip"] == ip:
+                del self.devices[other_id]
+        entry = self.devices.setdefault(device_id, {})
+        entry.update(info)
+        entry.update(ip=ip, alive=alive, last_seen=time.time())
+
+    def mark_dead(self, ip):
+        for entry in self.devices.values():
+            if entry["ip"] == ip:
+                entry["alive"] = False
+
+    def prune(self, now=None):
+        """Drops devices not seen within the TTL."""
+        now = time.time() if now is None else now
+        self.devices = {
+            device_id: entry
+            for device_id, entry in self.devices.items()
+            if now - entry.get("last_seen", 0) <= self.ttl_s
+        }
+
+    def live_ips(self):
+        return sorted(
+            entry["ip"] for entry in self.devices.values() if entry.get("alive")
+        )
+
+
+# --- Discovery ---
+
+
+def probe(ip, timeout=0.3):
+    """Returns the /health response of a device, or None if nothing answers."""
+    try:
+        res = requests.get(f"http://{ip}/health", timeout=timeout)
+        res.raise_for_status()
+        data = res.json()
+    except (requests.exceptions.RequestException, ValueError):
+        return None
+    return data if isinstance(data, dict) and "device_id" in data else None
+
+
+def scan_subnet(cidr, timeout=0.3, workers=128):
+    """Probes /health on every host of a subnet in parallel: {device_id: info}.
+
+    With 128 workers a /24 takes two rounds of ``timeout`` instead of 254.
+    """
+    hosts = [str(h) for h in ipaddress.ip_network(cidr, strict=False).hosts()]
+    found = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for ip, health in zip(hosts, pool.map(lambda h: probe(h, timeout), hosts)):
+            if health is not None:
+                found[health["device_id"]] = dict(health, ip=ip)
+    return found
+
+
+def listen_for_beacons(duration_s=3.0, port=BEACON_PORT):
+    """Collects the firmware's UDP beacons for a while: {device_id: info}."""
+    found = {}
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("", port))
+    deadline = time.monotonic() + duration_s
+    try:
+        while (remaining := deadline - time.monotonic()) > 0:
+            sock.settimeout(remaining)
+            try:
+                data, (ip, _) = sock.recvfrom(512)
+            except socket.timeout:
+                break
+            try:
+                beacon = json.loads(data)
+                found[beacon["device_id"]] = dict(beacon, ip=beacon.get("ip", ip))
+            except (ValueError, KeyError, TypeError):
+                continue
+    finally:
+        sock.close()
+    return found
+
+
+def refresh(registry, subnet=None, beacon_s=0.0, timeout=0.3):
+    """Updates the registry from a subnet scan and/or beacons, and rechecks liveness.
+
+    Known devices that didn't turn up are probed at their last ip; those
+    that don't answer are marked dead but kept until their TTL runs out.
+    """
+    found = {}
+    if subnet:
+        found.update(scan_subnet(subnet, timeout))
+    if beacon_s:
+        found.update(listen_for_beacons(beacon_s))
+
+    missing = [e["ip"] for d, e in registry.devices.items() if d not in found]
+    with ThreadPoolExecutor(max_workers=64) as pool:
+        for ip, health in zip(missing, pool.map(lambda h: probe(h, timeout), missing)):
+            if health is None:
+                registry.mark_dead(ip)
+            else:
+                found[health["device_id"]] = dict(health, ip=ip)
+
+    for device_id, info in found.items():
+        info = {k: v for k, v in info.items() if k != "device_id"}
+        registry.update(device_id, info.pop("ip"), **info)
+    registry.prune()
+    registry.save()
+    return registry
+
+
+def load_ips(default=(), path=REGISTRY_FILE):
+    """IPs of live devices in the registry, or ``default`` if there are none."""
+    ips = Registry(path).load().live_ips()
+    return ips or list(default)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Discover Picos and update the registry")
+    parser.add_argument(
+        "--scan", metavar="CIDR", help="subnet to probe, e.g. 192.168.1.0/24"
+    )
+    parser.add_argument(
+        "--listen",
+        type=float,
+        default=0.0,
+        metavar="SECONDS",
+        help="listen for UDP beacons",
+    )
+    parser.add_argument("--registry", default=REGISTRY_FILE)
+    args = parser.parse_args()
+
+    start = time.monotonic()
+    registry = refresh(Registry(args.registry).load(), args.scan, args.listen)
+    print(f"Discovery took {time.monotonic() - start:.1f}s")
+    for device_id, entry in sorted(registry.devices.items()):
+        state = "alive" if entry.get("alive") else "dead"
+        print(f"{device_id:<25} {entry['ip']:<16} {state}")
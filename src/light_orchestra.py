@@ -5,17 +5,18 @@ import machine
 import time
 import json
 import asyncio
+import struct
+from array import array
 
 # --- Pin Configuration ---
 photo_sensor_pin = machine.ADC(26)
 buzzer_pin = machine.PWM(machine.Pin(18))
 
 # --- Global Variables for Replay ---
-# This list will store tuples of (timestamp_ms, light_value)
-recorded_data = []
 recording_active = False
 replay_active = False
-replay_index = 0
+replay_file = None  # The recording load_recording() checked, replayed from flash
+replay = None  # The ReplayEngine while replaying
 
 start_time = time.ticks_ms()
 NOTES_C3_C7 = [
@@ -29,69 +30,94 @@ bpm = 120
 BEAT_MS = int(60000 / bpm)
 frequency = 262
 dur_ms   = int(BEAT_MS * 4)
-chord = [7,2,4,2]
 
 
-# --- Core Functions ---
-def Play_Chord(base_frequency : int, time : int, light_00 : int, light_0 : int):
-    global chord
-    
-    
-    if (light_0-light_00) >= 2*light_00:
-        chord[0] = 4
-        if (light_0-light_00) < 3*light_00:
-            chord[1] = 2
-            chord[2] = 0
-            chord[3] = 7
-        elif (light_0-light_00) < 4*light_00:
-            chord[1] = 7
-            chord[2] = 0
-            chord[3] = 4
-        else:
-            chord[1] = 0
-            chord[2] = 7
-            chord[3] = 4
-    else:
-        chord[0] = 0
-        if (light_0-light_00) < 0:
-            if base_frequency >= 262:
-                chord[1] = -3
-                chord[2] = -5
-                chord[3] = -7
+# --- Chord Lookup Tables ---
+# Play_Chord runs every 50 ms, so everything it needs is worked out once,
+# here: the nearest note index for every frequency, the voicing for every
+# light change and register, and the four frequencies of every voicing on
+# every note. A call is then a handful of indexed lookups.
+CHORD_STEP_MS = 500  # Each note of the chord sounds this long, the last one longer
+REGISTER_SPLIT_HZ = 262  # C4: falling light voices chords downward from here up
+# Chord offsets, in white keys, from the note nearest to the frequency
+VOICINGS = (
+    (4, 2, 0, 7),
+    (4, 7, 0, 4),
+    (4, 0, 7, 4),
+    (0, -3, -5, -7),
+    (0, 4, 2, 0),
+    (0, 4, 7, 4),
+    (0, 2, 4, 7),
+)
+# Light change (light_0 - light_00) relative to the previous level light_00,
+# in quarters, floor(4 * delta / light_00), clamped to 16 -> bucket:
+# 0 is a fall, then 1: < 1/4, 2: < 2x, 3: < 3x, 4: < 4x, 5: 4x or more
+DELTA_BUCKETS = array("B", [1] + [2] * 7 + [3] * 4 + [4] * 4 + [5])
+# (bucket, register) -> index into VOICINGS, register 1 being >= REGISTER_SPLIT_HZ
+CHORD_TABLE = array("B", [4, 3, 5, 5, 6, 6, 0, 0, 1, 1, 2, 2])
+
+
+def build_note_index(notes):
+    """The note index nearest to every whole frequency from 0 Hz to the top note.
+
+    Ties go to the lower note, as with nearest_white_note().
+    """
+    table = array("B", bytes(notes[-1] + 1))
+    idx = 0
+    for f in range(len(table)):
+        while idx + 1 < len(notes) and abs(notes[idx + 1] - f) < abs(notes[idx] - f):
+            idx += 1
+        table[f] = idx
+    return table
+
+
+def build_chord_notes(notes):
+    """The four frequencies of every voicing on every note, len(VOICINGS) rows per note.
+
+    A row whose chord runs off the top of the notes is left 0.
+    """
+    table = array("H", bytes(2 * 4 * len(VOICINGS) * len(notes)))
+    pos = 0
+    for idx in range(len(notes)):
+        for voicing in VOICINGS:
+            if idx + max(voicing) < len(notes):
+                for offset in voicing:
+                    # Falling chords under the bottom note wrap around, as they always did
+                    table[pos] = notes[idx + offset]
+                    pos += 1
             else:
-                chord[1] = 4
-                chord[2] = 2
-                chord[3] = 0
-        elif (light_0-light_00) < 0.25*light_00:
-            chord[1] = 4
-            chord[2] = 7
-            chord[3] = 4
-        else:
-            chord[1] = 2
-            chord[2] = 4
-            chord[3] = 7
-        
-    
-    
-    note_0 = NOTES_C3_C7[nearest_white_note(frequency)+chord[0]]
-    note_1 = NOTES_C3_C7[nearest_white_note(frequency)+chord[1]]
-    note_2 = NOTES_C3_C7[nearest_white_note(frequency)+chord[2]]
-    note_3 = NOTES_C3_C7[nearest_white_note(frequency)+chord[3]]
-    
-    #print(chord[0],chord[1],chord[2],chord[3])
-    #print(light_0,light_00)
-    #print(base_frequency)
-    if time < 500:
-        buzzer_pin.freq(note_0)
+                pos += 4
+    return table
+
 
-    elif time < 1000:
-        buzzer_pin.freq(note_1)
+NOTE_INDEX = build_note_index(NOTES_C3_C7)
+CHORD_NOTES = build_chord_notes(NOTES_C3_C7)
 
-    elif time < 1500:
-        buzzer_pin.freq(note_2)
 
+# --- Core Functions ---
+def chord_row(base_frequency: int, light_00: int, light_0: int):
+    """Where the chord for these readings starts in CHORD_NOTES.
+
+    Light levels are never negative, as they come from the ADC.
+    """
+    delta = light_0 - light_00
+    if delta < 0:
+        bucket = 0
+    elif light_00 == 0:
+        bucket = 5
     else:
-        buzzer_pin.freq(note_3)
+        bucket = DELTA_BUCKETS[min(4 * delta // light_00, 16)]
+    register = 1 if base_frequency >= REGISTER_SPLIT_HZ else 0
+    idx = NOTE_INDEX[min(max(base_frequency, 0), len(NOTE_INDEX) - 1)]
+    row = (idx * len(VOICINGS) + CHORD_TABLE[2 * bucket + register]) * 4
+    if not CHORD_NOTES[row]:
+        raise IndexError("chord goes above " + str(NOTES_C3_C7[-1]) + " Hz")
+    return row
+
+
+def Play_Chord(base_frequency: int, time: int, light_00: int, light_0: int):
+    step = min(max(time // CHORD_STEP_MS, 0), 3)
+    buzzer_pin.freq(CHORD_NOTES[chord_row(base_frequency, light_00, light_0) + step])
     buzzer_pin.duty_u16(32768)
 
 
@@ -115,73 +141,415 @@ def map_value(x, in_min, in_max, out_min, out_max):
     """Maps a value from one range to another."""
     return (x - in_min) * (out_max - out_min) // (in_max - in_min) + out_min
 
-def save_recording(filename="recording.json"):
-    """Saves the recorded_data to a JSON file."""
-    global recorded_data
+
+# --- Recording Buffer ---
+# A recording file is an 8-byte header, RECORDING_HEADER: the magic b"PLOR",
+# the format version, the record size and the sample rate in Hz. Then come
+# 4-byte records, (delta_ms, light_value) as two little-endian unsigned
+# 16-bit numbers (the byte order of the Pico and of PCs, so arrays are
+# written and read as they are), delta_ms being the time since the
+# previous sample (0 for the first). Samples go into one of two chunks
+# allocated at startup; when it is full, recording carries on in the other
+# while recording_flusher() appends the full one to RECORDING_FILE. So RAM
+# use is the same however long the take. If both chunks fill up before the
+# flash catches up, samples are dropped (and counted); the next delta_ms
+# then spans the gap, so the timing of what was kept stays right.
+RECORDING_FILE = "recording.bin"
+RECORDING_MAGIC = b"PLOR"
+RECORDING_VERSION = 1
+RECORDING_HEADER = "<4sBBH"
+HEADER_SIZE = struct.calcsize(RECORDING_HEADER)
+RECORD_WORDS = 2  # 16-bit words per record
+RECORD_BYTES = 2 * RECORD_WORDS
+SAMPLE_PERIOD_MS = 50  # main() reads the sensor this often
+SAMPLE_RATE_HZ = 1000 // SAMPLE_PERIOD_MS
+CHUNK_SAMPLES = 256  # About 13 s at one sample per 50 ms
+REPLAY_BLOCK_SAMPLES = 64  # Replay reads this many records from flash at a time
+MAX_DELTA_MS = 65535
+TICKS_PERIOD = 1 << 30  # time.ticks_ms() wraps around here
+
+record_chunks = [array("H", bytes(RECORD_BYTES * CHUNK_SAMPLES)) for _ in range(2)]
+record_active_chunk = 0  # The chunk being filled
+record_fill = 0  # Samples in it
+record_pending = None  # A full chunk waiting to be flushed, or None
+record_last_ticks = 0
+record_samples = 0
+record_dropped = 0
+flush_event = asyncio.Event()
+
+
+def record_sample(ticks, light_value):
+    """Adds one sample to the recording buffer, without allocating."""
+    global record_fill, record_last_ticks, record_samples, record_dropped
+    if record_fill == CHUNK_SAMPLES:
+        record_dropped += 1  # Both chunks are full: the flash can't keep up
+        return
+    delta = time.ticks_diff(ticks, record_last_ticks) if record_samples else 0
+    chunk = record_chunks[record_active_chunk]
+    pos = RECORD_WORDS * record_fill
+    chunk[pos] = min(max(delta, 0), MAX_DELTA_MS)
+    chunk[pos + 1] = light_value
+    record_fill += 1
+    record_samples += 1
+    record_last_ticks = ticks
+    if record_fill == CHUNK_SAMPLES and record_pending is None:
+        hand_over_chunk()
+
+
+def hand_over_chunk():
+    """Queues the full chunk for flushing and carries on in the other one."""
+    global record_active_chunk, record_fill, record_pending
+    record_pending = record_active_chunk
+    record_active_chunk ^= 1
+    record_fill = 0
+    flush_event.set()
+
+
+def write_chunk(chunk, samples):
+    """Appends the first samples of a chunk to the recording file."""
     try:
-        with open(filename, "w") as f:
-            json.dump(recorded_data, f)
-        print(f"Recording saved to {filename}")
+        with open(RECORDING_FILE, "ab") as f:
+            f.write(memoryview(chunk)[: RECORD_WORDS * samples])
     except OSError as e:
         print(f"Error saving recording: {e}")
 
-def load_recording(filename="recording.json"):
-    """Loads recorded_data from a JSON file."""
-    global recorded_data, replay_index
+
+def flush_pending():
+    """Writes the chunk waiting to be flushed, if any."""
+    global record_pending
+    while record_pending is not None:
+        write_chunk(record_chunks[record_pending], CHUNK_SAMPLES)
+        record_pending = None
+        if record_fill == CHUNK_SAMPLES:
+            hand_over_chunk()  # The other one filled up meanwhile
+
+
+async def recording_flusher():
+    """Background task: writes full chunks to flash as they come."""
+    while True:
+        await flush_event.wait()
+        flush_event.clear()
+        flush_pending()
+
+
+def save_recording():
+    """Writes the samples still in RAM to the recording file."""
+    global record_fill
+    flush_pending()
+    write_chunk(record_chunks[record_active_chunk], record_fill)
+    record_fill = 0
+    print(f"Recording saved to {RECORDING_FILE}: {record_samples} samples")
+    if record_dropped:
+        print(f"{record_dropped} samples were dropped: the flash couldn't keep up")
+
+
+def recording_header(sample_rate_hz=SAMPLE_RATE_HZ):
+    return struct.pack(
+        RECORDING_HEADER, RECORDING_MAGIC, RECORDING_VERSION, RECORD_BYTES, sample_rate_hz
+    )
+
+
+def read_header(f):
+    """Checks the header of an open recording file; returns its sample rate in Hz."""
+    header = f.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE:
+        raise ValueError("not a recording")
+    magic, version, record_size, sample_rate_hz = struct.unpack(RECORDING_HEADER, header)
+    if magic != RECORDING_MAGIC:
+        raise ValueError("not a recording")
+    if version != RECORDING_VERSION or record_size != RECORD_BYTES:
+        raise ValueError(f"unsupported recording version {version}")
+    return sample_rate_hz
+
+
+def replay_records(filename, start=0):
+    """Yields the (delta_ms, light_value) records of a recording file, from record start on.
+
+    Reads REPLAY_BLOCK_SAMPLES records at a time into one buffer, so a take
+    of any length replays in the same small amount of RAM.
+    """
+    block = array("H", bytes(RECORD_BYTES * REPLAY_BLOCK_SAMPLES))
+    with open(filename, "rb") as f:
+        read_header(f)
+        if start:
+            f.seek(HEADER_SIZE + start * RECORD_BYTES)
+        while True:
+            # A record cut short by a reset at the end is ignored
+            words = RECORD_WORDS * ((f.readinto(block) or 0) // RECORD_BYTES)
+            if not words:
+                return
+            for i in range(0, words, RECORD_WORDS):
+                yield block[i], block[i + 1]
+
+
+# --- Replay Engine ---
+# Each sample is due at an absolute deadline: replay start plus its time in
+# the recording, divided by the speed. The time the loop spends between
+# samples (Play_Chord, print...) therefore doesn't add up: a sample that
+# comes late makes the wait for the next one shorter. Samples more than
+# MAX_LATE_MS behind are skipped, so a loop that can't keep up (at 4x, say)
+# stays in time rather than falling further and further behind.
+#
+# Every INDEX_EVERY records, the replay notes where it is in a sparse
+# index, as it goes. Seeking back jumps to the nearest entry before the
+# target; seeking forward only reads what hasn't been indexed yet.
+MIN_REPLAY_SPEED = 0.25
+MAX_REPLAY_SPEED = 4
+INDEX_EVERY = 256  # Records: about 13 s at 20 Hz, 8 bytes of index each
+MAX_LATE_MS = 100
+
+
+class ReplayEngine:
+    """Replays a recording file against absolute deadlines, with speed, seek and loop."""
+
+    def __init__(self, filename, speed=1.0, loop=False):
+        with open(filename, "rb") as f:
+            sample_rate_hz = read_header(f)
+        self.filename = filename
+        self.loop = loop
+        self.period_ms = 1000 // max(sample_rate_hz, 1)  # Between the end and a loop
+        self.index = array("I")  # (time_ms before record n, n) pairs, n = k * INDEX_EVERY
+        self.stream = None
+        self.pending = None  # A light value read ahead by seek()
+        self.played = 0
+        self.skipped = 0
+        self.error_sum_ms = 0
+        self.error_max_ms = 0
+        self.speed_pm = 1000  # Speed, per mille
+        self.open(0, 0)
+        self.start_ticks = time.ticks_ms()  # type: ignore[attr-defined]
+        self.start_ms = 0  # The recording time due at start_ticks
+        self.set_speed(speed)
+
+    def open(self, record, time_ms):
+        """Carries on reading from record on, time_ms being the time before it."""
+        if self.stream is not None:
+            self.stream.close()
+        self.stream = replay_records(self.filename, record)
+        self.record = record  # The number of the next record
+        self.time_ms = time_ms  # Recording time of the last record read
+
+    def read(self):
+        """Reads the next record; returns its light value, or None at the end."""
+        if (
+            self.record % INDEX_EVERY == 0
+            and self.record // INDEX_EVERY == len(self.index) // 2
+        ):
+            self.index.append(self.time_ms)
+            self.index.append(self.record)
+        record = next(self.stream, None)
+        if record is None:
+            return None
+        self.time_ms += record[0]
+        self.record += 1
+        return record[1]
+
+    def position_ms(self):
+        """Where in the recording the replay is now."""
+        elapsed = time.ticks_diff(time.ticks_ms(), self.start_ticks)  # type: ignore
+        return self.start_ms + elapsed * self.speed_pm // 1000
+
+    def set_speed(self, speed):
+        """Changes the speed from now on, without jumping."""
+        if not MIN_REPLAY_SPEED <= speed <= MAX_REPLAY_SPEED:
+            raise ValueError(
+                f"speed must be between {MIN_REPLAY_SPEED} and {MAX_REPLAY_SPEED}"
+            )
+        self.start_ms = self.position_ms()
+        self.start_ticks = time.ticks_ms()  # type: ignore[attr-defined]
+        self.speed_pm = int(speed * 1000)
+
+    def seek(self, target_ms):
+        """Carries on from the first sample at or after target_ms in the recording."""
+        self.pending = None
+        # The last index entry before the target (an entry holds the time of
+        # the record before it, so one at the target would skip that record)
+        i = len(self.index) - 2
+        while i > 0 and self.index[i] >= target_ms:
+            i -= 2
+        # Jump there if it's back, or further ahead than what was read so far
+        if i >= 0 and (target_ms <= self.time_ms or self.index[i] > self.time_ms):
+            self.open(self.index[i + 1], self.index[i])
+        while True:
+            light = self.read()
+            if light is None or self.time_ms >= target_ms:
+                break
+        self.pending = light
+        self.start_ms = target_ms
+        self.start_ticks = time.ticks_ms()  # type: ignore[attr-defined]
+
+    async def next_sample(self):
+        """Waits until the next sample is due; returns its light value, or None at the end."""
+        while True:
+            light, self.pending = self.pending, None
+            if light is None:
+                light = self.read()
+            if light is None and self.loop and self.record:
+                # Start over, one sample period after the last sample
+                self.start_ms -= self.time_ms + self.period_ms
+                self.open(0, 0)
+                light = self.read()
+            if light is None:
+                return None
+
+            offset = (self.time_ms - self.start_ms) * 1000 // self.speed_pm
+            deadline = time.ticks_add(self.start_ticks, offset)  # type: ignore
+            wait = time.ticks_diff(deadline, time.ticks_ms())  # type: ignore
+            if wait < -MAX_LATE_MS:
+                self.skipped += 1
+                continue
+            if wait > 0:
+                await asyncio.sleep_ms(wait)  # type: ignore[attr-defined]
+            error = abs(time.ticks_diff(time.ticks_ms(), deadline))  # type: ignore
+            self.played += 1
+            self.error_sum_ms += error
+            self.error_max_ms = max(self.error_max_ms, error)
+            return light
+
+    def report(self):
+        """How closely the samples played so far kept to their deadlines."""
+        return {
+            "samples": self.played,
+            "skipped": self.skipped,
+            "mean_error_ms": round(self.error_sum_ms / max(self.played, 1), 1),
+            "max_error_ms": self.error_max_ms,
+        }
+
+    def close(self):
+        self.stream.close()  # Closes the file
+
+
+def load_recording(filename=None):
+    """Checks a recording file (RECORDING_FILE by default) and makes it the one to replay."""
+    global replay_file
+    filename = filename or RECORDING_FILE
     try:
-        with open(filename, "r") as f:
-            recorded_data = json.load(f)
-        print(f"Recording loaded from {filename}")
-        replay_index = 0 # Reset replay index when loading
+        with open(filename, "rb") as f:
+            sample_rate_hz = read_header(f)
+            samples = (f.seek(0, 2) - HEADER_SIZE) // RECORD_BYTES
+        print(
+            f"Recording loaded from {filename}: {samples} samples at {sample_rate_hz} Hz"
+        )
+        replay_file = filename
         return True
     except OSError as e:
         print(f"Error loading recording: {e}. File might not exist or be corrupt.")
-        recorded_data = [] # Clear data if load fails
-        return False
     except ValueError as e:
-        print(f"Error parsing recording data: {e}. File might be corrupt.")
-        recorded_data = []
-        return False
+        print(f"Error loading recording: {e}. File might be corrupt.")
+    replay_file = None
+    return False
+
+
+def convert_json_recording(src="recording.json", dst=RECORDING_FILE):
+    """Converts a recording saved as JSON [[ticks_ms, light], ...] to the binary format.
+
+    Returns the number of samples written.
+    """
+    with open(src) as f:
+        samples = json.load(f)
+    if len(samples) > 1:
+        span = (samples[-1][0] - samples[0][0]) % TICKS_PERIOD
+        sample_rate_hz = (
+            round(1000 * (len(samples) - 1) / span) if span else SAMPLE_RATE_HZ
+        )
+    else:
+        sample_rate_hz = SAMPLE_RATE_HZ
+    chunk = array("H", bytes(RECORD_BYTES * CHUNK_SAMPLES))
+    with open(dst, "wb") as f:
+        f.write(recording_header(sample_rate_hz))
+        previous = samples[0][0] if samples else 0
+        words = 0
+        for ticks, light_value in samples:
+            chunk[words] = min((ticks - previous) % TICKS_PERIOD, MAX_DELTA_MS)
+            chunk[words + 1] = min(max(int(light_value), 0), 65535)
+            previous = ticks
+            words += RECORD_WORDS
+            if words == len(chunk):
+                f.write(chunk)
+                words = 0
+        f.write(memoryview(chunk)[:words])
+    return len(samples)
+
 
 # --- Control Functions for Recording/Replay ---
 def start_recording():
-    global recording_active, recorded_data, replay_active
+    global recording_active
+    global record_fill, record_pending, record_samples, record_dropped
     if not replay_active:
+        try:
+            with open(RECORDING_FILE, "wb") as f:  # Clear previous recording
+                f.write(recording_header())
+        except OSError as e:
+            print(f"Error starting recording: {e}")
+            return
+        record_fill = 0
+        record_pending = None
+        record_samples = 0
+        record_dropped = 0
         recording_active = True
-        recorded_data = [] # Clear previous recording
         print("Recording started...")
     else:
         print("Cannot start recording while replay is active.")
 
+
 def stop_recording():
     global recording_active
     if recording_active:
         recording_active = False
         print("Recording stopped.")
         save_recording()
+        load_recording()
     else:
         print("No recording active.")
 
-def start_replay():
-    global replay_active, replay_index, recording_active
-    if not recording_active and len(recorded_data) > 0:
+
+def start_replay(speed=1.0, loop=False):
+    global replay_active, replay
+    if not recording_active and replay_file is not None:
+        try:
+            replay = ReplayEngine(replay_file, speed, loop)
+        except (OSError, ValueError) as e:
+            print(f"Cannot start replay: {e}")
+            return
         replay_active = True
-        replay_index = 0
         print("Replay started...")
     elif recording_active:
         print("Cannot start replay while recording is active.")
     else:
         print("No data to replay. Record something first or load a recording.")
 
+
 def stop_replay():
-    global replay_active
+    global replay_active, replay
     if replay_active:
         replay_active = False
+        replay.close()
+        print("Replay stopped.", replay.report())
+        replay = None
         stop_tone()
-        print("Replay stopped.")
     else:
         print("No replay active.")
 
+
+def set_replay_speed(speed):
+    """Changes the replay speed, from MIN_REPLAY_SPEED to MAX_REPLAY_SPEED."""
+    if not replay_active:
+        print("No replay active.")
+        return
+    try:
+        replay.set_speed(speed)
+    except ValueError as e:
+        print(e)
+
+
+def seek_replay(ms):
+    """Carries on replaying from ms into the recording."""
+    if replay_active:
+        replay.seek(ms)
+    else:
+        print("No replay active.")
+
+
 def nearest_white_note(freq_hz: int):
     """Return (name, freq) for nearest white-key note between C3 and B6."""
     idx = min(range(len(NOTES_C3_C7)), key=lambda k: abs(NOTES_C3_C7[k] - freq_hz))
@@ -201,6 +569,7 @@ async def main():
     last_rel_time = 0
     light_0 = 0
     light_00 = 0
+    asyncio.create_task(recording_flusher())
     
     
     
@@ -225,29 +594,17 @@ async def main():
         if recording_active:
             # Read sensor and record
             light_value = photo_sensor_pin.read_u16()
-            recorded_data.append((current_timestamp, light_value))
+            record_sample(current_timestamp, light_value)
             # print(f"Recording: {current_timestamp}, {light_value}") # Uncomment for debugging
 
         elif replay_active:
-            # Replay stored data
-            if replay_index < len(recorded_data):
-                replayed_timestamp, replayed_light_value = recorded_data[replay_index]
-
-                # We'll use the current_timestamp here as a reference,
-                # but for accurate replay, you might want to use the delta
-                # between recorded timestamps to control sleep.
-                # For simplicity, we'll just process the next value.
-                light_value = replayed_light_value
-                replay_index += 1
-                # print(f"Replaying: {replayed_timestamp}, {light_value}") # Uncomment for debugging
-
-                # To make replay duration match recording, calculate sleep based on next data point
-                if replay_index < len(recorded_data):
-                    next_timestamp = recorded_data[replay_index][0]
-                    sleep_duration = time.ticks_diff(next_timestamp, replayed_timestamp)
-                    if sleep_duration > 0:
-                        await asyncio.sleep_ms(sleep_duration) # type: ignore[attr-defined]
-            else:
+            # Replay stored data, each sample at its deadline
+            try:
+                light_value = await replay.next_sample()
+            except (OSError, ValueError) as e:
+                print(f"Error replaying recording: {e}")
+                light_value = None
+            if light_value is None:
                 print("Replay finished.")
                 stop_replay()
                 stop_tone()
@@ -280,15 +637,17 @@ async def main():
         
         
         # Only sleep if not actively in replay managing its own sleep
-        if not replay_active or replay_index >= len(recorded_data):
-            await asyncio.sleep_ms(50) # type: ignore[attr-defined]
+        if not replay_active:
+            await asyncio.sleep_ms(SAMPLE_PERIOD_MS) # type: ignore[attr-defined]
             
 
 ##########################################################################################
 # Run the main event loop
 if __name__ == "__main__":
     print("Pico Light Orchestra Instrument Code")
-    print("Available functions: start_recording(), stop_recording(), start_replay(), stop_replay(), save_recording(), load_recording()")
+    print("Available functions: start_recording(), stop_recording(),")
+    print("  start_replay(speed, loop), stop_replay(), set_replay_speed(speed),")
+    print("  seek_replay(ms), save_recording(), load_recording()")
     print("To start, type 'start_recording()' in the REPL, then 'stop_recording()' to save.")
     print("Then 'start_replay()' to play it back.")
     try:
@@ -6,6 +6,11 @@ import time
 import network
 import json
 import asyncio
+import socket
+import binascii
+import gc
+import struct
+from array import array
 
 # --- Pin Configuration ---
 # The photosensor is connected to an Analog-to-Digital Converter (ADC) pin.
@@ -16,11 +21,30 @@ photo_sensor_pin = machine.ADC(26)
 # PWM allows us to create a square wave at a specific frequency to make a sound.
 buzzer_pin = machine.PWM(machine.Pin(18))
 
+# --- Device Identity ---
+API_VERSION = "1.0.0"
+DEVICE_ID = "pico-w-" + binascii.hexlify(machine.unique_id()).decode().upper()
+
+# Every few seconds the Pico broadcasts who it is on this UDP port, so the
+# conductor and dashboard can find it without knowing its IP (see fleet.py).
+BEACON_PORT = 5005
+BEACON_INTERVAL_S = 5
+
 # --- Global State ---
 # This variable will hold the task that plays a note from an API call.
 # This allows us to cancel it if a /stop request comes in.
 api_note_task = None
 
+# When the device booted, for the uptime in /status
+boot_ticks = time.ticks_ms()  # type: ignore[attr-defined]
+
+# /status numbers its contents: status_seq goes up whenever the state it
+# reports changes, and is sent as the ETag. A client that sends it back in
+# If-None-Match gets a bodiless 304 while nothing has changed.
+status_seq = 0
+last_status_norm = None
+last_status_playing = None
+
 # --- Core Functions ---
 
 
@@ -61,14 +85,11 @@ def connect_to_wifi(wifi_config: str = "wifi_config.json"):
 
 
 def play_tone(frequency: int, duration_ms: int) -> None:
-    """Plays a tone on the buzzer for a given duration."""
-    if frequency > 0:
-        buzzer_pin.freq(int(frequency))
-        buzzer_pin.duty_u16(32768)  # 50% duty cycle
-        time.sleep_ms(duration_ms)  # type: ignore[attr-defined]
-        stop_tone()
-    else:
-        time.sleep_ms(duration_ms)  # type: ignore[attr-defined]
+    """Plays a tone on the buzzer for a given duration, replacing what was playing.
+
+    Returns at once; the note player task (see queue_notes) plays it.
+    """
+    queue_notes([(frequency, duration_ms)])
 
 
 def stop_tone():
@@ -76,18 +97,202 @@ def stop_tone():
     buzzer_pin.duty_u16(0)  # 0% duty cycle means silence
 
 
-async def play_api_note(frequency, duration_s):
-    """Coroutine to play a note from an API call, can be cancelled."""
+async def wait_until(at_ms):
+    """Sleeps until the device clock (time.ticks_ms) reaches at_ms."""
+    delay = time.ticks_diff(at_ms, time.ticks_ms())  # type: ignore[attr-defined]
+    if delay > 0:
+        await asyncio.sleep_ms(delay)  # type: ignore[attr-defined]
+
+
+# --- Note Player ---
+# Everything the API plays goes through one queue of notes and one player
+# task (api_note_task), so the web server keeps answering while a long
+# melody plays. A new /tone or /melody cancels what is playing and replaces
+# it; a melody sent with "append" is added to the end of the queue instead.
+# Notes are timed against the device clock, so gaps don't add up to drift.
+NOTE_QUEUE_MAX = 256
+
+# (freq, ms, duty, gap_ms) of every note still to be played
+note_queue = []
+# Device tick at which the queued notes will have finished
+play_until = 0
+
+
+def is_playing():
+    return api_note_task is not None and not api_note_task.done()
+
+
+async def play_api_note(at_ms=None):
+    """The player task: plays note_queue until it is empty. Can be cancelled.
+
+    If at_ms is given, playback starts when time.ticks_ms() reaches it, so
+    a conductor can line up several devices on the same tick.
+    """
     try:
-        print(f"API playing note: {frequency}Hz for {duration_s}s")
-        buzzer_pin.freq(int(frequency))
-        buzzer_pin.duty_u16(32768)  # 50% duty cycle
-        await asyncio.sleep(duration_s)
+        if at_ms is not None:
+            await wait_until(at_ms)
+        next_at = time.ticks_ms()  # type: ignore[attr-defined]
+        while note_queue:
+            freq, ms, duty, gap_ms = note_queue.pop(0)
+            if freq > 0:
+                buzzer_pin.freq(int(freq))
+                buzzer_pin.duty_u16(int(duty * 65535))
+            next_at = time.ticks_add(next_at, ms)  # type: ignore[attr-defined]
+            await wait_until(next_at)
+            stop_tone()
+            if gap_ms:
+                next_at = time.ticks_add(next_at, gap_ms)  # type: ignore[attr-defined]
+                await wait_until(next_at)
+    finally:
         stop_tone()
-        print("API note finished.")
-    except asyncio.CancelledError:
-        stop_tone()
-        print("API note cancelled.")
+
+
+def stop_playback():
+    """Cancels the player task and forgets the queued notes."""
+    global api_note_task
+    if api_note_task:
+        api_note_task.cancel()
+        api_note_task = None
+    del note_queue[:]
+    stop_tone()
+
+
+def queue_notes(notes, gap_ms=0, duty=0.5, at_ms=None, append=False):
+    """Queues (freq, ms) notes (freq 0 is a rest) for the player task.
+
+    Unless append is set and something is playing, whatever is playing is
+    cancelled first. Notes that don't fit in the queue are dropped.
+    Returns (notes queued, ms until the queue has played out).
+    """
+    global api_note_task, play_until
+
+    now = time.ticks_ms()  # type: ignore[attr-defined]
+    appending = append and is_playing()
+    if not appending:
+        stop_playback()
+    added = notes[: NOTE_QUEUE_MAX - len(note_queue)]
+    total = 0
+    for freq, ms in added:
+        note_queue.append((freq, ms, duty, gap_ms))
+        total += ms + gap_ms
+    if appending:
+        play_until = time.ticks_add(play_until, total)  # type: ignore[attr-defined]
+    else:
+        start = now
+        if at_ms is not None and time.ticks_diff(at_ms, now) > 0:  # type: ignore
+            start = at_ms
+        play_until = time.ticks_add(start, total)  # type: ignore[attr-defined]
+        api_note_task = asyncio.create_task(play_api_note(at_ms))
+    return len(added), max(0, time.ticks_diff(play_until, now))  # type: ignore
+
+
+async def beacon(ip):
+    """Broadcasts a small JSON announcement every BEACON_INTERVAL_S seconds."""
+    message = json.dumps({"device_id": DEVICE_ID, "ip": ip, "api": API_VERSION})
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    while True:
+        try:
+            sock.sendto(message.encode("utf-8"), ("255.255.255.255", BEACON_PORT))
+        except OSError as e:
+            print(f"Beacon failed: {e}")
+        await asyncio.sleep(BEACON_INTERVAL_S)
+
+
+# --- UDP Control Protocol ---
+# A lighter alternative to HTTP for triggering notes: every command is one
+# fixed-size datagram, so there is no TCP handshake and no text to parse.
+#
+# Header (12 bytes, big-endian): magic b"PL", version, op, seq (u32),
+# at_ms (i32, device tick to start at, or -1 for "now").
+# Bodies:  TONE    freq (u16), ms (u16), duty (u8, 0-255), pad
+#          MELODY  count (u8), flags (u8, bit 0 = append), gap_ms (u16),
+#                  then MELODY_MAX_NOTES x (freq u16, ms u16), unused ones zero
+#          STOP    (none)
+#          SYNC    (none); the reply is the header + rx ticks, tx ticks (u32 each)
+# seq increases with every command a sender makes, so repeated or
+# reordered datagrams (senders may send each one twice) are dropped.
+UDP_PORT = 5006
+UDP_MAGIC = b"PL"
+UDP_VERSION = 1
+OP_TONE = 1
+OP_MELODY = 2
+OP_STOP = 3
+OP_SYNC = 4
+UDP_HEADER = ">2sBBIi"
+UDP_HEADER_SIZE = struct.calcsize(UDP_HEADER)
+TONE_BODY = ">HHBx"
+MELODY_BODY = ">BBH"
+MELODY_MAX_NOTES = 32
+SYNC_REPLY = ">II"
+FRAME_SIZES = {
+    OP_TONE: UDP_HEADER_SIZE + struct.calcsize(TONE_BODY),
+    OP_MELODY: UDP_HEADER_SIZE + struct.calcsize(MELODY_BODY) + 4 * MELODY_MAX_NOTES,
+    OP_STOP: UDP_HEADER_SIZE,
+    OP_SYNC: UDP_HEADER_SIZE,
+}
+UDP_POLL_MS = 2
+UDP_MAX_SENDERS = 8
+
+# Last seq seen from each sender, to drop duplicates
+last_seq = {}
+
+
+def is_new_seq(sender, seq):
+    """True if seq is newer than anything seen from sender (with wrap-around)."""
+    last = last_seq.get(sender)
+    if last is not None and (seq == last or (seq - last) & 0xFFFFFFFF >= 0x80000000):
+        return False
+    if last is None and len(last_seq) >= UDP_MAX_SENDERS:
+        last_seq.clear()
+    last_seq[sender] = seq
+    return True
+
+
+def handle_datagram(data, sender, sock):
+    """Decodes and runs one UDP control frame. Invalid frames are ignored."""
+    rx = time.ticks_ms()  # type: ignore[attr-defined]
+    if len(data) < UDP_HEADER_SIZE:
+        return
+    magic, version, op, seq, at_ms = struct.unpack_from(UDP_HEADER, data)
+    if magic != UDP_MAGIC or version != UDP_VERSION or len(data) != FRAME_SIZES.get(op):
+        return
+    if not is_new_seq(sender, seq):
+        return
+    start = None if at_ms < 0 else at_ms
+
+    if op == OP_SYNC:
+        tx = time.ticks_ms()  # type: ignore[attr-defined]
+        sock.sendto(data + struct.pack(SYNC_REPLY, rx, tx), sender)
+        return
+
+    if op == OP_TONE:
+        freq, ms, duty = struct.unpack_from(TONE_BODY, data, UDP_HEADER_SIZE)
+        queue_notes([(freq, ms)], 0, duty / 255, start)
+    elif op == OP_MELODY:
+        count, flags, gap_ms = struct.unpack_from(MELODY_BODY, data, UDP_HEADER_SIZE)
+        offset = UDP_HEADER_SIZE + struct.calcsize(MELODY_BODY)
+        notes = [
+            struct.unpack_from(">HH", data, offset + 4 * i)
+            for i in range(min(count, MELODY_MAX_NOTES))
+        ]
+        queue_notes(notes, gap_ms, 0.5, start, append=bool(flags & 1))
+    elif op == OP_STOP:
+        stop_playback()
+
+
+async def udp_server(port=UDP_PORT):
+    """Polls a non-blocking UDP socket for control frames."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("0.0.0.0", port))
+    sock.setblocking(False)
+    while True:
+        try:
+            data, sender = sock.recvfrom(FRAME_SIZES[OP_MELODY])
+        except OSError:
+            # Nothing waiting
+            await asyncio.sleep_ms(UDP_POLL_MS)  # type: ignore[attr-defined]
+            continue
+        handle_datagram(data, sender, sock)
 
 
 def map_value(x, in_min, in_max, out_min, out_max):
@@ -95,94 +300,767 @@ def map_value(x, in_min, in_max, out_min, out_max):
     return (x - in_min) * (out_max - out_min) // (in_max - in_min) + out_min
 
 
-async def handle_request(reader, writer):
-    """Handles incoming HTTP requests."""
-    global api_note_task
+# Rough conversion from the normalized reading to lux for our photoresistor
+LUX_PER_NORM = 1000
 
-    print("Client connected")
-    request_line = await reader.readline()
-    # Skip headers
-    while await reader.readline() != b"\r\n":
-        pass
 
-    try:
-        request = str(request_line, "utf-8")
-        method, url, _ = request.split()
-        print(f"Request: {method} {url}")
-    except (ValueError, IndexError):
-        writer.write(b"HTTP/1.0 400 Bad Request\r\n\r\n")
+# --- Sensor Sampling ---
+# One task reads the ADC at a fixed rate; everything else (the sound loop,
+# /sensor, /status, /events) uses its latest filtered value, so requests
+# never wait for the ADC. Each reading is the median of the last
+# MEDIAN_WINDOW samples, which removes single-sample spikes, smoothed by
+# an exponential moving average to take out the remaining noise.
+SAMPLE_INTERVAL_MS = 10  # 100 Hz
+MEDIAN_WINDOW = 5
+# Each new median moves the average 1/5 of the way; settles in ~20 samples
+EMA_DIVISOR = 5
+
+# The filter runs 100 times a second, so it works in integers on arrays
+# made up front: a float or a new list per sample would be garbage.
+sample_ring = array("H", [0] * MEDIAN_WINDOW)
+sorted_window = array("H", [0] * MEDIAN_WINDOW)
+sample_index = 0
+filtered_q8 = None  # The filtered reading times 256; set by the first sample
+
+
+def sample_sensor():
+    """Takes one ADC sample and updates the filtered value."""
+    global sample_index, filtered_q8
+
+    raw = photo_sensor_pin.read_u16()
+    if filtered_q8 is None:
+        # First sample: fill the window so the median starts out right
+        for i in range(MEDIAN_WINDOW):
+            sample_ring[i] = raw
+        filtered_q8 = raw << 8
+    sample_ring[sample_index] = raw
+    sample_index = (sample_index + 1) % MEDIAN_WINDOW
+
+    # Median by insertion sort into the spare array
+    for i in range(MEDIAN_WINDOW):
+        value = sample_ring[i]
+        j = i
+        while j > 0 and sorted_window[j - 1] > value:
+            sorted_window[j] = sorted_window[j - 1]
+            j -= 1
+        sorted_window[j] = value
+    median = sorted_window[MEDIAN_WINDOW // 2]
+    filtered_q8 += ((median << 8) - filtered_q8) // EMA_DIVISOR
+
+
+async def sensor_sampler():
+    """Samples the light sensor every SAMPLE_INTERVAL_MS."""
+    next_at = time.ticks_ms()  # type: ignore[attr-defined]
+    while True:
+        sample_sensor()
+        next_at = time.ticks_add(next_at, SAMPLE_INTERVAL_MS)  # type: ignore[attr-defined]
+        await wait_until(next_at)
+
+
+def light_raw():
+    """The filtered raw reading (0-65535)."""
+    if filtered_q8 is None:
+        sample_sensor()  # The sampler hasn't run yet
+    return (filtered_q8 + 128) >> 8
+
+
+def norm_hundredths(raw):
+    """norm (raw / 65535, to two decimals) as a whole number of hundredths."""
+    return (raw * 100 + 32767) // 65535
+
+
+def read_sensor():
+    """The filtered light reading in the /sensor format (raw, norm, lux_est)."""
+    raw = light_raw()
+    norm = norm_hundredths(raw) / 100
+    return {"raw": raw, "norm": norm, "lux_est": round(norm * LUX_PER_NORM, 1)}
+
+
+# --- Server-Sent Events ---
+# GET /events keeps the connection open and pushes the light level as
+# "data: {"norm": ..., "ts": ...}" lines. One broadcaster task samples the
+# sensor for all subscribers; a reading is only sent when it changed (or as
+# a keep-alive), and never more often than the subscriber asked for with
+# ?interval_ms= (no faster than EVENT_MIN_INTERVAL_MS).
+EVENT_INTERVAL_MS = 50  # Sensor sampling interval (20 Hz)
+EVENT_MIN_INTERVAL_MS = 50
+EVENT_KEEPALIVE_MS = 5000
+MAX_EVENT_SUBSCRIBERS = 4
+EVENT_WRITE_TIMEOUT_S = 1
+
+# Each subscriber is [writer, interval_ms, ticks of the last event, last norm sent]
+event_subscribers = []
+
+
+def query_param(url, name, default):
+    """Returns an integer query parameter from a URL like /events?interval_ms=100."""
+    _, _, query = url.partition("?")
+    for pair in query.split("&"):
+        key, _, value = pair.partition("=")
+        if key == name:
+            try:
+                return int(value)
+            except ValueError:
+                break
+    return default
+
+
+async def event_broadcaster():
+    """Samples the sensor and pushes changed readings to every subscriber."""
+    while True:
+        if event_subscribers:
+            norm = read_sensor()["norm"]
+            now = time.ticks_ms()  # type: ignore[attr-defined]
+            line = None
+            for sub in list(event_subscribers):
+                writer, interval_ms, last_sent, last_norm = sub
+                since = time.ticks_diff(now, last_sent)  # type: ignore[attr-defined]
+                if since < interval_ms or (
+                    norm == last_norm and since < EVENT_KEEPALIVE_MS
+                ):
+                    continue
+                if line is None:
+                    event = json.dumps({"norm": norm, "ts": now})
+                    line = b"data: " + event.encode("utf-8") + b"\n\n"
+                try:
+                    writer.write(line)
+                    await asyncio.wait_for(writer.drain(), EVENT_WRITE_TIMEOUT_S)
+                except Exception:
+                    # Gone or too slow to keep up: drop it
+                    if sub in event_subscribers:
+                        event_subscribers.remove(sub)
+                    writer.close()
+                    continue
+                sub[2] = now
+                sub[3] = norm
+        await asyncio.sleep_ms(EVENT_INTERVAL_MS)  # type: ignore[attr-defined]
+
+
+async def serve_events(url, reader, writer):
+    """Registers a /events subscriber and holds the connection until it closes."""
+    if len(event_subscribers) >= MAX_EVENT_SUBSCRIBERS:
+        writer.write(b"HTTP/1.0 503 Service Unavailable\r\nRetry-After: 5\r\n\r\n")
         await writer.drain()
         writer.close()
         await writer.wait_closed()
         return
 
-    # Read current sensor value
-    light_value = photo_sensor_pin.read_u16()
+    interval_ms = max(
+        EVENT_MIN_INTERVAL_MS, query_param(url, "interval_ms", EVENT_INTERVAL_MS)
+    )
+    writer.write(
+        b"HTTP/1.0 200 OK\r\nContent-Type: text/event-stream\r\n"
+        b"Cache-Control: no-cache\r\n\r\n"
+    )
+    await writer.drain()
+    sub = [writer, interval_ms, time.ticks_add(time.ticks_ms(), -interval_ms), None]  # type: ignore
+    event_subscribers.append(sub)
+    try:
+        # The client never sends anything more; an empty read means it left
+        while await reader.read(16):
+            pass
+    except OSError:
+        pass
+    finally:
+        if sub in event_subscribers:
+            event_subscribers.remove(sub)
+        writer.close()
+        await writer.wait_closed()
+    print("Event subscriber disconnected")
 
-    response = ""
-    content_type = "text/html"
 
-    # --- API Endpoint Routing ---
-    if method == "GET" and url == "/":
-        html = f"""
+def update_status_seq(norm, playing):
+    """Returns the /status seq, moving it on if norm or playing changed.
+
+    The uptime doesn't count as a change, so an idle device keeps its seq.
+    """
+    global status_seq, last_status_norm, last_status_playing
+
+    if norm != last_status_norm or playing != last_status_playing:
+        last_status_norm = norm
+        last_status_playing = playing
+        status_seq += 1
+    return status_seq
+
+
+# --- HTTP Server ---
+# Requests are parsed properly: headers are read into a dict, the body is
+# read by Content-Length (up to MAX_BODY_BYTES), and HTTP/1.1 connections
+# stay open for further requests until the client goes quiet for
+# KEEPALIVE_IDLE_S. That saves a TCP handshake per request, which on the
+# Pico's Wi-Fi costs more than handling the request itself.
+MAX_BODY_BYTES = 8192  # A 200-note /melody is about 6 KB
+MAX_HEADERS = 32
+KEEPALIVE_IDLE_S = 5  # Close a kept-alive connection after this long without a request
+MAX_KEEPALIVE_REQUESTS = 100  # Then close it anyway, so one client can't hog a slot
+READ_TIMEOUT_S = 2  # The rest of a request must arrive this soon after its first line
+# Print every connection and request. Off by default: console output
+# allocates, and over USB it is slower than answering the request.
+VERBOSE = False
+
+REASONS = {
+    200: "OK",
+    202: "Accepted",
+    304: "Not Modified",
+    400: "Bad Request",
+    404: "Not Found",
+    408: "Request Timeout",
+    411: "Length Required",
+    413: "Payload Too Large",
+    431: "Request Header Fields Too Large",
+    503: "Service Unavailable",
+}
+
+
+class HttpError(Exception):
+    """A request we can't serve; answered with this status, then the connection closes."""
+
+    def __init__(self, status):
+        super().__init__(status)
+        self.status = status
+
+
+async def read_before(read, deadline, *args):
+    """Awaits read(*args), giving up with asyncio.TimeoutError at the deadline tick."""
+    remaining = time.ticks_diff(deadline, time.ticks_ms())  # type: ignore[attr-defined]
+    if remaining <= 0:
+        raise asyncio.TimeoutError
+    return await asyncio.wait_for(read(*args), remaining / 1000)
+
+
+async def read_request(reader, idle_s=KEEPALIVE_IDLE_S):
+    """Reads one request: (method, url, version, headers, body), or None at EOF.
+
+    Raises HttpError for a malformed or oversized request, and
+    asyncio.TimeoutError if no request starts within idle_s or the rest of
+    it takes longer than READ_TIMEOUT_S. The timeout covers the whole
+    request, so a client trickling in one header line at a time can't hold
+    the connection open for long.
+    """
+    request_line = await asyncio.wait_for(reader.readline(), idle_s)
+    if not request_line:
+        return None
+    deadline = time.ticks_add(time.ticks_ms(), int(READ_TIMEOUT_S * 1000))  # type: ignore
+    try:
+        method, url, version = str(request_line, "utf-8").split()
+    except (ValueError, UnicodeError):
+        raise HttpError(400)
+
+    headers = {}
+    while True:
+        line = await read_before(reader.readline, deadline)
+        if line in (b"\r\n", b"\n", b""):
+            break
+        if len(headers) >= MAX_HEADERS:
+            raise HttpError(431)
+        name, _, value = line.partition(b":")
+        headers[name.strip().lower()] = value.strip()
+
+    if b"chunked" in headers.get(b"transfer-encoding", b""):
+        raise HttpError(411)
+    try:
+        length = int(headers.get(b"content-length", 0))
+    except ValueError:
+        raise HttpError(400)
+    if length > MAX_BODY_BYTES:
+        raise HttpError(413)
+    body = b""
+    if length > 0:
+        body = await read_before(reader.readexactly, deadline, length)
+    return method, url, version, headers, body
+
+
+def wants_keep_alive(version, headers):
+    connection = headers.get(b"connection", b"").lower()
+    if version == "HTTP/1.1":
+        return connection != b"close"
+    return connection == b"keep-alive"
+
+
+# --- Responses ---
+# A response is built in one buffer allocated at startup and sent with a
+# single writer.write. Status lines, headers and fixed bodies are encoded
+# once, here; numbers are written digit by digit. So answering a request
+# leaves almost no garbage behind, and the garbage collector doesn't have
+# to stop the player mid-note to clean up after the web server.
+#
+# Bodies are written from BODY_START on; the head is then written just in
+# front of the body, ending at BODY_START, once the Content-Length is known.
+RESPONSE_BUFFER_SIZE = 2048  # Room for a full /batch of /status results
+BODY_START = 192  # Room for the longest head
+response_buffer = bytearray(RESPONSE_BUFFER_SIZE)
+response_view = memoryview(response_buffer)
+
+STATUS_LINES = {
+    code: ("HTTP/1.1 %d %s\r\n" % (code, reason)).encode()
+    for code, reason in REASONS.items()
+}
+JSON_TYPE = b"Content-Type: application/json\r\n"
+HTML_TYPE = b"Content-Type: text/html\r\n"
+CONTENT_LENGTH = b"Content-Length: "
+ETAG = b'ETag: "'
+KEEP_ALIVE = b"Connection: keep-alive\r\n"
+CLOSE = b"Connection: close\r\n"
+CRLF = b"\r\n"
+
+HEALTH_BODY = json.dumps(
+    {"status": "ok", "device_id": DEVICE_ID, "api": API_VERSION}
+).encode()
+STATUS_PREFIX = HEALTH_BODY[:-1] + b', "raw": '
+NOTE_STARTED_BODY = b'{"status": "ok", "message": "Note playing started."}'
+STOPPED_BODY = b'{"status": "ok", "message": "All sounds stopped."}'
+NOT_FOUND_BODY = b'{"error": "not found"}'
+INVALID_JSON_BODY = b'{"error": "Invalid JSON"}'
+BAD_TONE_BODY = b'{"error": "freq and ms are required"}'
+BAD_MELODY_BODY = b'{"error": "notes must be a list of {freq, ms}"}'
+BAD_BATCH_BODY = b'{"error": "ops must be a list of 1 to 8 valid {method, path, body}"}'
+HTML_HEAD = b"""
         <html>
             <body>
                 <h1>Pico Light Orchestra</h1>
-                <p>Current light sensor reading: {light_value}</p>
+                <p>Current light sensor reading: """
+HTML_TAIL = b"""</p>
             </body>
         </html>
         """
-        response = html
-    elif method == "POST" and url == "/play_note":
-        # This requires reading the request body, which is not trivial.
-        # A simple approach for a known content length:
-        # Note: A robust server would parse Content-Length header.
-        # For this student project, we'll assume a small, simple JSON body.
-        raw_data = await reader.read(1024)
+
+
+def put(pos, data):
+    """Copies bytes into the response buffer at pos; returns the end."""
+    end = pos + len(data)
+    response_buffer[pos:end] = data
+    return end
+
+
+def put_int(pos, n):
+    """Writes a whole number in decimal at pos; returns the end."""
+    if n < 0:
+        response_buffer[pos] = 45  # "-"
+        pos += 1
+        n = -n
+    start = pos
+    while True:
+        response_buffer[pos] = 48 + n % 10  # Digits come out last first...
+        n //= 10
+        pos += 1
+        if not n:
+            break
+    end = pos - 1
+    while start < end:  # ...so turn them around
+        response_buffer[start], response_buffer[end] = (
+            response_buffer[end],
+            response_buffer[start],
+        )
+        start += 1
+        end -= 1
+    return pos
+
+
+def put_hundredths(pos, n):
+    """Writes n / 100 with two decimals (n >= 0); returns the end."""
+    pos = put_int(pos, n // 100)
+    response_buffer[pos] = 46  # "."
+    response_buffer[pos + 1] = 48 + n // 10 % 10
+    response_buffer[pos + 2] = 48 + n % 10
+    return pos + 3
+
+
+def put_sensor(pos):
+    """Writes "raw": ..., "norm": ..., "lux_est": ... (without braces); returns the end."""
+    raw = light_raw()
+    norm = norm_hundredths(raw)
+    pos = put_int(pos, raw)
+    pos = put(pos, b', "norm": ')
+    pos = put_hundredths(pos, norm)
+    pos = put(pos, b', "lux_est": ')
+    pos = put_int(pos, norm * LUX_PER_NORM // 100)
+    return put(pos, b".0")
+
+
+def digit_count(n):
+    count = 1
+    while n >= 10:
+        n //= 10
+        count += 1
+    return count
+
+
+def response_head(status, body_len, content_type, keep_alive, etag):
+    """Writes the head so it ends at BODY_START; returns where it starts."""
+    status_line = STATUS_LINES[status]
+    connection = KEEP_ALIVE if keep_alive else CLOSE
+    size = len(status_line) + len(content_type) + len(CONTENT_LENGTH)
+    size += digit_count(body_len) + 2 + len(connection) + 2
+    if etag is not None:
+        size += len(ETAG) + digit_count(etag) + 3
+    start = BODY_START - size
+    pos = put(start, status_line)
+    pos = put(pos, content_type)
+    pos = put(pos, CONTENT_LENGTH)
+    pos = put_int(pos, body_len)
+    pos = put(pos, CRLF)
+    pos = put(pos, connection)
+    if etag is not None:
+        pos = put(pos, ETAG)
+        pos = put_int(pos, etag)
+        pos = put(pos, b'"\r\n')
+    put(pos, CRLF)
+    return start
+
+
+async def send_response(
+    writer,
+    status,
+    body_end=BODY_START,
+    content_type=JSON_TYPE,
+    keep_alive=False,
+    etag=None,
+):
+    """Sends the head and the body written up to body_end, in one write."""
+    start = response_head(status, body_end - BODY_START, content_type, keep_alive, etag)
+    writer.write(response_view[start:body_end])
+    await writer.drain()
+
+
+# The error body for each request body that doesn't parse
+BAD_BODIES = {
+    "/play_note": INVALID_JSON_BODY,
+    "/tone": BAD_TONE_BODY,
+    "/melody": BAD_MELODY_BODY,
+}
+BODY_ERRORS = (ValueError, KeyError, TypeError, AttributeError)
+
+
+def parse_body(url, body):
+    """The queue_notes() arguments of a /play_note, /tone or /melody body.
+
+    Raises one of BODY_ERRORS if the body is malformed.
+    """
+    data = json.loads(body)
+    at_ms = data.get("at_ms")
+    if url == "/play_note":
+        note = (data.get("frequency", 0), int(data.get("duration", 0) * 1000))
+        return [note], 0, 0.5, at_ms
+    duty = min(1.0, max(0.0, float(data.get("duty", 0.5))))
+    if url == "/tone":
+        return [(int(data["freq"]), int(data["ms"]))], 0, duty, at_ms
+    notes = [(int(n["freq"]), int(n["ms"])) for n in data["notes"]]
+    gap_ms = int(data.get("gap_ms", 0))
+    return notes, gap_ms, duty, at_ms, bool(data.get("append", False))
+
+
+def route(method, url, headers, body, arrival_ticks):
+    """Serves one request: writes its body from BODY_START on.
+
+    Returns (status, body_end, content_type, etag).
+    """
+    # --- API Endpoint Routing ---
+    if method == "GET" and url == "/":
+        # Current (filtered) sensor value
+        pos = put(BODY_START, HTML_HEAD)
+        pos = put_int(pos, light_raw())
+        return 200, put(pos, HTML_TAIL), HTML_TYPE, None
+
+    if method == "POST" and url in BAD_BODIES:
         try:
-            data = json.loads(raw_data)
-            freq = data.get("frequency", 0)
-            duration = data.get("duration", 0)
+            args = parse_body(url, body)
+        except BODY_ERRORS:
+            return 400, put(BODY_START, BAD_BODIES[url]), JSON_TYPE, None
+
+    if method == "POST" and url == "/play_note":
+        # Replaces whatever is playing
+        queue_notes(*args)
+        return 200, put(BODY_START, NOTE_STARTED_BODY), JSON_TYPE, None
+
+    if method == "POST" and url == "/tone":
+        _, until_ms = queue_notes(*args)
+        pos = put(BODY_START, b'{"playing": true, "until_ms_from_now": ')
+        pos = put_int(pos, until_ms)
+        return 202, put(pos, b"}"), JSON_TYPE, None
+
+    if method == "POST" and url == "/melody":
+        queued, until_ms = queue_notes(*args)
+        pos = put(BODY_START, b'{"queued": ')
+        pos = put_int(pos, queued)
+        pos = put(pos, b', "until_ms_from_now": ')
+        pos = put_int(pos, until_ms)
+        return 202, put(pos, b"}"), JSON_TYPE, None
+
+    if method == "GET" and url == "/health":
+        return 200, put(BODY_START, HEALTH_BODY), JSON_TYPE, None
+
+    if method == "POST" and url == "/batch":
+        return run_batch(body, arrival_ticks)
+
+    if method == "GET" and url == "/sensor":
+        pos = put(BODY_START, b'{"raw": ')
+        return 200, put(put_sensor(pos), b"}"), JSON_TYPE, None
+
+    if method == "GET" and url == "/status":
+        # Health, latest sensor reading and playback state in one answer
+        playing = is_playing()
+        seq = update_status_seq(norm_hundredths(light_raw()), playing)
+        if headers.get(b"if-none-match") == b'"%d"' % seq:
+            return 304, BODY_START, JSON_TYPE, seq
+        pos = put_sensor(put(BODY_START, STATUS_PREFIX))
+        pos = put(pos, b', "playing": true' if playing else b', "playing": false')
+        pos = put(pos, b', "seq": ')
+        pos = put_int(pos, seq)
+        pos = put(pos, b', "uptime_ms": ')
+        pos = put_int(pos, time.ticks_diff(time.ticks_ms(), boot_ticks))  # type: ignore
+        return 200, put(pos, b"}"), JSON_TYPE, seq
+
+    if method == "GET" and url == "/time":
+        # The conductor estimates our clock offset from this and the round trip
+        pos = put(BODY_START, b'{"ticks_ms": ')
+        pos = put_int(pos, arrival_ticks)
+        pos = put(pos, b', "now_ms": ')
+        pos = put_int(pos, time.ticks_ms())  # type: ignore[attr-defined]
+        return 200, put(pos, b"}"), JSON_TYPE, None
+
+    if method == "GET" and url == "/mem":
+        return 200, put(BODY_START, json.dumps(memory_report()).encode()), JSON_TYPE, None
+
+    if method == "POST" and url == "/stop":
+        stop_playback()  # Force immediate stop
+        return 200, put(BODY_START, STOPPED_BODY), JSON_TYPE, None
+
+    return 404, put(BODY_START, NOT_FOUND_BODY), JSON_TYPE, None
+
 
-            # If a note is already playing via API, cancel it first
-            if api_note_task:
-                api_note_task.cancel()
+# --- Batched Operations ---
+# POST /batch runs several of the operations above from one request, e.g.
+# {"ops": [{"method": "POST", "path": "/stop"},
+#          {"method": "POST", "path": "/melody", "body": {"notes": [...]}},
+#          {"method": "GET", "path": "/health"}]}
+# and answers {"results": [{"status": 200, "body": {...}}, ...]} in order.
+# The ops run one after the other without yielding to the event loop, so no
+# other request or UDP frame can come in between them. Every op, body
+# included, is checked before any of them runs: if one is not valid, the
+# whole batch is refused with a 400 and nothing happens.
+MAX_BATCH_OPS = 8  # Eight /status results still fit in the response buffer
+BATCH_OPS = (
+    ("POST", "/play_note"),
+    ("POST", "/tone"),
+    ("POST", "/melody"),
+    ("POST", "/stop"),
+    ("GET", "/health"),
+    ("GET", "/sensor"),
+    ("GET", "/status"),
+    ("GET", "/time"),
+)
 
-            # Start the new note as a background task
-            api_note_task = asyncio.create_task(play_api_note(freq, duration))
 
-            response = '{"status": "ok", "message": "Note playing started."}'
-            content_type = "application/json"
-        except (ValueError, json.JSONDecodeError):
-            writer.write(b'HTTP/1.0 400 Bad Request\r\n\r\n{"error": "Invalid JSON"}\r\n')
+def parse_batch(body):
+    """The (method, path, body) ops of a /batch body, every one of them checked.
+
+    Raises one of BODY_ERRORS if any op is unknown or has a malformed body.
+    """
+    ops = json.loads(body)["ops"]
+    if not ops or len(ops) > MAX_BATCH_OPS:
+        raise ValueError("1 to MAX_BATCH_OPS ops")
+    calls = []
+    for op in ops:
+        method, path = op["method"], op["path"]
+        if (method, path) not in BATCH_OPS:
+            raise ValueError(path)
+        op_body = json.dumps(op.get("body", {})).encode()
+        if path in BAD_BODIES:
+            parse_body(path, op_body)
+        calls.append((method, path, op_body))
+    return calls
+
+
+def run_batch(body, arrival_ticks):
+    """Serves POST /batch; the same return value as route()."""
+    # Check every op first, so a bad batch runs none of them
+    try:
+        calls = parse_batch(body)
+    except BODY_ERRORS:
+        return 400, put(BODY_START, BAD_BATCH_BODY), JSON_TYPE, None
+
+    # Each op writes its body at BODY_START, so keep a copy before the next
+    results = []
+    for method, path, op_body in calls:
+        status, end, _, _ = route(method, path, {}, op_body, arrival_ticks)
+        results.append((status, bytes(response_view[BODY_START:end])))
+
+    pos = put(BODY_START, b'{"results": [')
+    for i, (status, result) in enumerate(results):
+        pos = put(pos, b'{"status": ' if i == 0 else b', {"status": ')
+        pos = put_int(pos, status)
+        pos = put(pos, b', "body": ')
+        pos = put(pos, result)
+        pos = put(pos, b"}")
+    return 200, put(pos, b"]}"), JSON_TYPE, None
+
+
+# --- Memory Instrumentation ---
+# On the Pico, gc.mem_free() is read before and after every request. The
+# drop is what the request allocated; a rise means the garbage collector
+# ran while it was being served. GET /mem reports the totals.
+mem_stats = {
+    "requests": 0,
+    "measured": 0,
+    "allocated": 0,
+    "max_request": 0,
+    "collections": 0,
+}
+
+
+def measure_request(free_before):
+    """Records the memory used by one request, given gc.mem_free() from before it."""
+    mem_stats["requests"] += 1
+    if free_before is None:
+        return
+    used = free_before - gc.mem_free()  # type: ignore[attr-defined]
+    if used < 0:
+        mem_stats["collections"] += 1
+        return
+    mem_stats["measured"] += 1
+    mem_stats["allocated"] += used
+    if used > mem_stats["max_request"]:
+        mem_stats["max_request"] = used
+
+
+def mem_free():
+    """gc.mem_free(), or None where there is no such thing (CPython)."""
+    return gc.mem_free() if hasattr(gc, "mem_free") else None  # type: ignore[attr-defined]
+
+
+def memory_report():
+    measured = mem_stats["measured"]
+    return {
+        "requests": mem_stats["requests"],
+        "bytes_per_request": mem_stats["allocated"] // measured if measured else None,
+        "max_request_bytes": mem_stats["max_request"],
+        "gc_during_requests": mem_stats["collections"],
+        "mem_free": mem_free(),
+    }
+
+
+# --- Admission Control ---
+# The Pico has room for only a few sockets, and every connection costs
+# memory and time the sound loop needs. Beyond MAX_CONNECTIONS a new
+# connection gets an immediate 503 without its request even being read.
+# The last RESERVED_FOR_PLAYBACK slots are kept for the conductor: when
+# they are in use, monitoring requests (/status, /sensor, /events, ...)
+# get a 503 too, while PLAYBACK_PATHS (and batches of nothing else) are
+# still served. When the server is busy, idle kept-alive connections are
+# also closed sooner.
+MAX_CONNECTIONS = 8
+RESERVED_FOR_PLAYBACK = 2
+PLAYBACK_PATHS = ("/tone", "/melody", "/play_note", "/stop", "/time")
+BUSY_IDLE_S = 1
+SERVICE_UNAVAILABLE = (
+    b"HTTP/1.1 503 Service Unavailable\r\nRetry-After: 1\r\n"
+    b"Content-Length: 0\r\nConnection: close\r\n\r\n"
+)
+
+LINGER_S = 0.05
+
+open_connections = 0
+
+
+def is_playback(path, body):
+    """Whether a request may use the slots reserved for playback.
+
+    A /batch may, if every op in it is in PLAYBACK_PATHS.
+    """
+    if path == "/batch":
+        try:
+            return all(op_path in PLAYBACK_PATHS for _, op_path, _ in parse_batch(body))
+        except BODY_ERRORS:
+            return False
+    return path in PLAYBACK_PATHS
+
+
+async def discard_input(reader):
+    """Reads what the client already sent, so that closing doesn't reset the
+    connection and throw away the reply it is waiting for."""
+    try:
+        await asyncio.wait_for(reader.read(MAX_BODY_BYTES), LINGER_S)
+    except (asyncio.TimeoutError, OSError):
+        pass
+
+
+async def handle_request(reader, writer):
+    """Handles the HTTP requests of one connection, keeping it open between them."""
+    global open_connections
+
+    if VERBOSE:
+        print("Client connected")
+    open_connections += 1
+    handed_over = False
+    served = 0
+    try:
+        if open_connections > MAX_CONNECTIONS:
+            # Saturated: shed the connection as cheaply as possible
+            writer.write(SERVICE_UNAVAILABLE)
             await writer.drain()
-            writer.close()
-            await writer.wait_closed()
+            await discard_input(reader)
             return
 
-    elif method == "POST" and url == "/stop":
-        if api_note_task:
-            api_note_task.cancel()
-            api_note_task = None
-        stop_tone()  # Force immediate stop
-        response = '{"status": "ok", "message": "All sounds stopped."}'
-        content_type = "application/json"
-    else:
-        writer.write(b"HTTP/1.0 404 Not Found\r\n\r\n")
-        await writer.drain()
-        writer.close()
-        await writer.wait_closed()
-        return
+        while served < MAX_KEEPALIVE_REQUESTS:
+            busy = open_connections >= MAX_CONNECTIONS - RESERVED_FOR_PLAYBACK
+            try:
+                request = await read_request(
+                    reader, BUSY_IDLE_S if busy else KEEPALIVE_IDLE_S
+                )
+            except HttpError as e:
+                await send_response(writer, e.status)
+                await discard_input(reader)
+                break
+            except asyncio.TimeoutError:
+                if served == 0:
+                    # Connected but never sent a full request
+                    await send_response(writer, 408)
+                    await discard_input(reader)
+                break
+            if request is None:
+                break
+            # Device clock at arrival, reported by /time for clock synchronization
+            arrival_ticks = time.ticks_ms()  # type: ignore[attr-defined]
+            free_before = mem_free()
+            method, url, version, headers, body = request
+            if VERBOSE:
+                print(f"Request: {method} {url}")
+            served += 1
 
-    # Send response
-    writer.write(
-        f"HTTP/1.0 200 OK\r\nContent-type: {content_type}\r\n\r\n".encode("utf-8")
-    )
-    writer.write(response.encode("utf-8"))
-    await writer.drain()
-    writer.close()
-    await writer.wait_closed()
-    print("Client disconnected")
+            path = url.split("?")[0]
+            reserved_only = open_connections > MAX_CONNECTIONS - RESERVED_FOR_PLAYBACK
+            if reserved_only and not is_playback(path, body):
+                # Only the reserved slots are left: keep them for playback
+                writer.write(SERVICE_UNAVAILABLE)
+                await writer.drain()
+                await discard_input(reader)
+                break
+
+            if method == "GET" and path == "/events":
+                # The stream takes over the connection
+                handed_over = True
+                await serve_events(url, reader, writer)
+                return
+
+            status, body_end, content_type, etag = route(
+                method, url, headers, body, arrival_ticks
+            )
+            keep_alive = (
+                wants_keep_alive(version, headers) and served < MAX_KEEPALIVE_REQUESTS
+            )
+            await send_response(writer, status, body_end, content_type, keep_alive, etag)
+            measure_request(free_before)
+            if not keep_alive:
+                break
+    except OSError:
+        pass  # The client went away
+    finally:
+        open_connections -= 1
+        if not handed_over:
+            writer.close()
+            await writer.wait_closed()
+    if VERBOSE:
+        print("Client disconnected")
 
 
 async def main():
@@ -190,7 +1068,13 @@ async def main():
     try:
         ip = connect_to_wifi()
         print(f"Starting web server on {ip}...")
-        asyncio.create_task(asyncio.start_server(handle_request, "0.0.0.0", 80))
+        asyncio.create_task(
+            asyncio.start_server(handle_request, "0.0.0.0", 80, backlog=MAX_CONNECTIONS)
+        )
+        asyncio.create_task(beacon(ip))
+        asyncio.create_task(udp_server())
+        asyncio.create_task(sensor_sampler())
+        asyncio.create_task(event_broadcaster())
     except Exception as e:
         print(f"Failed to initialize: {e}")
         return
@@ -199,8 +1083,8 @@ async def main():
     while True:
         # Only run this loop if no API note is currently scheduled to play
         if api_note_task is None or api_note_task.done():
-            # Read the sensor. Values range from ~500 (dark) to ~65535 (bright)
-            light_value = photo_sensor_pin.read_u16()
+            # The filtered sensor value. Values range from ~500 (dark) to ~65535 (bright)
+            light_value = light_raw()
 
             # Map the light value to a frequency range (e.g., C4 to C6)
             # Adjust the input range based on your room's lighting
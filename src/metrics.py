@@ -0,0 +1,160 @@
+# metrics.py
+# To be run on a student's computer (not the Pico)
+# Exposes fleet health in the Prometheus text format, so a monitoring stack
+# can scrape the dashboard. Everything is served from what the dashboard
+# already collected: a scrape never contacts a device.
+#
+# Usage: python dashboard.py --metrics-port 9100
+#        then scrape http://localhost:9100/metrics
+
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- Configuration ---
+# Upper bounds of the poll latency histogram buckets, in seconds
+LATENCY_BUCKETS_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# name, type, help
+FAMILIES = (
+    ("pico_up", "gauge", "Whether the device answered its last poll."),
+    ("pico_light_norm", "gauge", "Last light level reported by the device (0-1)."),
+    ("pico_poll_errors_total", "counter", "Failed polls by exception type."),
+    ("pico_poll_latency_seconds", "histogram", "Time taken to poll the device."),
+)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+
+
+class _Device:
+    """The metrics of one device."""
+
+    def __init__(self, ip):
+        self.ip = ip
+        self.device_id = "N/A"
+        self.up = 0
+        self.norm = 0.0
+        self.errors = {}  # exception name -> count
+        self.buckets = [0] * (len(LATENCY_BUCKETS_S) + 1)  # the last one is +Inf
+        self.latency_sum = 0.0
+
+    def render(self):
+        """Returns this device's lines for every family, in FAMILIES order."""
+        labels = _labels(ip=self.ip, device_id=self.device_id)
+        lines = [
+            f"pico_up{{{labels}}} {self.up}\n",
+            f"pico_light_norm{{{labels}}} {self.norm}\n",
+        ]
+        ip = _labels(ip=self.ip)
+        lines.append(
+            "".join(
+                f'pico_poll_errors_total{{{ip},error="{_escape(error)}"}} {count}\n'
+                for error, count in sorted(self.errors.items())
+            )
+        )
+        histogram = []
+        total = 0
+        for bound, count in zip(LATENCY_BUCKETS_S + ("+Inf",), self.buckets):
+            total += count
+            histogram.append(
+                f'pico_poll_latency_seconds_bucket{{{ip},le="{bound}"}} {total}\n'
+            )
+        histogram.append(f"pico_poll_latency_seconds_sum{{{ip}}} {self.latency_sum}\n")
+        histogram.append(f"pico_poll_latency_seconds_count{{{ip}}} {total}\n")
+        lines.append("".join(histogram))
+        return lines
+
+
+class FleetMetrics:
+    """Per-device gauges, error counters and latency histograms.
+
+    The text of each device is rendered again only after it changed, so a
+    scrape of a large fleet where little changed costs little more than
+    joining strings.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._devices = {}
+        self._text = {}  # ip -> lines from _Device.render()
+        self._dirty = set()
+
+    def observe(self, status):
+        """Records one dashboard status (see dashboard.get_device_status).
+
+        A status with ``latency_ms`` is a completed poll and also counts
+        towards the histogram and, if it failed, the error counters.
+        """
+        ip = status["ip"]
+        with self._lock:
+            device = self._devices.get(ip)
+            if device is None:
+                device = self._devices[ip] = _Device(ip)
+            before = (device.device_id, device.up, device.norm)
+            up = 1 if status["status"] == "ok" else 0
+            device.up = up
+            if up:
+                device.device_id = status.get("device_id", device.device_id)
+                device.norm = status.get("norm", 0.0)
+            changed = before != (device.device_id, device.up, device.norm)
+
+            latency_ms = status.get("latency_ms")
+            if latency_ms is not None:
+                latency_s = latency_ms / 1000
+                device.buckets[bisect_left(LATENCY_BUCKETS_S, latency_s)] += 1
+                device.latency_sum += latency_s
+                if status.get("error"):
+                    device.errors[status["error"]] = (
+                        device.errors.get(status["error"], 0) + 1
+                    )
+                changed = True
+            if changed:
+                self._dirty.add(ip)
+
+    def render(self):
+        """The whole exposition, in the Prometheus text format."""
+        with self._lock:
+            for ip in self._dirty:
+                self._text[ip] = self._devices[ip].render()
+            self._dirty.clear()
+            texts = [self._text[ip] for ip in sorted(self._text)]
+        parts = []
+        for i, (name, kind, help_text) in enumerate(FAMILIES):
+            parts.append(f"# HELP {name} {help_text}\n# TYPE {name} {kind}\n")
+            parts.extend(text[i] for text in texts)
+        return "".join(parts)
+
+
+# --- HTTP Endpoint ---
+
+
+def start_server(metrics, port, host="127.0.0.1"):
+    """Serves GET /metrics from a background thread; returns the server."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass  # Keep the dashboard screen clean
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
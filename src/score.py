@@ -0,0 +1,301 @@
+# score.py
+# To be run on a student's computer (not the Pico)
+# Multi-voice scores for the conductor: Standard MIDI File import, splitting
+# the music into monophonic voices, and assigning voices to devices.
+
+import heapq
+import json
+from array import array
+
+# --- Pitch Quantization ---
+# A piezo buzzer only sounds good in a limited range, so every MIDI key is
+# folded by octaves into that range. The table is built once; looking up a
+# note's frequency is then a single index.
+PIEZO_MIN_FREQ = 131  # C3
+PIEZO_MAX_FREQ = 2093  # C7
+
+# MIDI channel 10 (index 9) is percussion, which a buzzer can't play
+DRUM_CHANNEL = 9
+
+
+def build_pitch_table(min_freq=PIEZO_MIN_FREQ, max_freq=PIEZO_MAX_FREQ):
+    """Returns an array mapping each MIDI key (0-127) to a playable frequency in Hz."""
+    table = array("H")
+    for key in range(128):
+        freq = 440.0 * 2 ** ((key - 69) / 12)
+        while freq < min_freq:
+            freq *= 2
+        while freq > max_freq:
+            freq /= 2
+        table.append(int(round(freq)))
+    return table
+
+
+PITCH_TO_FREQ = build_pitch_table()
+
+
+# --- Voices ---
+
+
+class Voice:
+    """One monophonic line of a score.
+
+    Notes are kept column-wise in arrays (start, duration, frequency) rather
+    than as a list of tuples, so a voice with thousands of notes stays small.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.starts = array("I")  # ms from the start of the song
+        self.durations = array("I")  # ms
+        self.freqs = array("H")  # Hz
+
+    def __len__(self):
+        return len(self.starts)
+
+    def add(self, start_ms, duration_ms, freq):
+        self.starts.append(start_ms)
+        self.durations.append(duration_ms)
+        self.freqs.append(freq)
+
+    def end_ms(self):
+        return self.starts[-1] + self.durations[-1] if self.starts else 0
+
+    def median_freq(self):
+        return sorted(self.freqs)[len(self.freqs) // 2] if self.freqs else 0
+
+    def as_song(self):
+        """Yields (freq, ms) pairs, with silences as freq 0, like conductor.SONG."""
+        now = 0
+        for start, duration, freq in zip(self.starts, self.durations, self.freqs):
+            if start > now:
+                yield (0, start - now)
+            elif start < now:
+                # Overlaps the previous note's tail: shorten it to keep time
+                duration -= now - start
+                if duration <= 0:
+                    continue
+            yield (freq, duration)
+            now = max(now, start) + duration
+
+
+# --- Standard MIDI File Reader ---
+# Tracks are read straight from the file, each through its own small buffer,
+# and merged by time. Only one event per track is held in memory at a time.
+
+
+class _ChunkReader:
+    """Reads bytes from one region of a file through a small buffer."""
+
+    def __init__(self, path, start, length, block_size=4096):
+        self._f = open(path, "rb")
+        self._f.seek(start)
+        self._left = length
+        self._block_size = block_size
+        self._buf = b""
+        self._pos = 0
+
+    def _fill(self):
+        if self._left <= 0:
+            raise EOFError("unexpected end of MIDI track")
+        self._buf = self._f.read(min(self._block_size, self._left))
+        if not self._buf:
+            raise EOFError("unexpected end of MIDI file")
+        self._left -= len(self._buf)
+        self._pos = 0
+
+    def byte(self):
+        if self._pos >= len(self._buf):
+            self._fill()
+        b = self._buf[self._pos]
+        self._pos += 1
+        return b
+
+    def skip(self, n):
+        for _ in range(n):
+            self.byte()
+
+    def read(self, n):
+        return bytes(self.byte() for _ in range(n))
+
+    def varlen(self):
+        value = 0
+        while True:
+            b = self.byte()
+            value = (value << 7) | (b & 0x7F)
+            if not b & 0x80:
+                return value
+
+    def at_end(self):
+        return self._pos >= len(self._buf) and self._left <= 0
+
+    def close(self):
+        self._f.close()
+
+
+def read_header(path):
+    """Returns (format, ticks_per_quarter, [(offset, length) of each track])."""
+    tracks = []
+    with open(path, "rb") as f:
+        if f.read(4) != b"MThd":
+            raise ValueError(f"{path} is not a Standard MIDI File")
+        length = int.from_bytes(f.read(4), "big")
+        header = f.read(length)
+        fmt = int.from_bytes(header[0:2], "big")
+        division = int.from_bytes(header[4:6], "big")
+        if division & 0x8000:
+            raise ValueError("SMPTE time division is not supported")
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                break
+            length = int.from_bytes(chunk[4:8], "big")
+            if chunk[:4] == b"MTrk":
+                tracks.append((f.tell(), length))
+            f.seek(length, 1)
+    return fmt, division, tracks
+
+
+def _track_events(path, track, start, length):
+    """Yields (tick, track, status, data1, data2) for one track.
+
+    Tempo changes come out as status 0xFF51 with the tempo in data1 (us per
+    quarter note). Other meta and SysEx events are skipped.
+    """
+    r = _ChunkReader(path, start, length)
+    tick = 0
+    status = 0
+    try:
+        while not r.at_end():
+            tick += r.varlen()
+            b = r.byte()
+            if b == 0xFF:
+                kind = r.byte()
+                size = r.varlen()
+                if kind == 0x51 and size == 3:
+                    yield (tick, track, 0xFF51, int.from_bytes(r.read(3), "big"), 0)
+                else:
+                    r.skip(size)
+                if kind == 0x2F:  # End of track
+                    return
+                continue
+            if b in (0xF0, 0xF7):
+                r.skip(r.varlen())
+                continue
+            if b & 0x80:
+                status = b
+                data1 = r.byte()
+            else:
+                data1 = b  # Running status
+            kind = status & 0xF0
+            data2 = r.byte() if kind not in (0xC0, 0xD0) else 0
+            yield (tick, track, status, data1, data2)
+    finally:
+        r.close()
+
+
+def iter_events(path):
+    """Yields the events of every track in time order."""
+    _, _, tracks = read_header(path)
+    streams = [
+        _track_events(path, i, start, size) for i, (start, size) in enumerate(tracks)
+    ]
+    return heapq.merge(*streams, key=lambda e: (e[0], e[1]))
+
+
+def iter_notes(path):
+    """Yields (start_ms, duration_ms, track, channel, key) for every note.
+
+    Notes come out when they end. A note-on with velocity 0 is a note-off.
+    """
+    _, division, _ = read_header(path)
+    tempo = 500000  # us per quarter note, the MIDI default (120 BPM)
+    last_tick = 0
+    last_ms = 0.0
+    sounding = {}  # (track, channel, key) -> start_ms
+
+    for tick, track, status, data1, data2 in iter_events(path):
+        now = last_ms + (tick - last_tick) * tempo / division / 1000
+        last_tick, last_ms = tick, now
+        if status == 0xFF51:
+            tempo = data1
+            continue
+        kind, channel = status & 0xF0, status & 0x0F
+        if kind == 0x90 and data2 > 0:
+            sounding.setdefault((track, channel, data1), now)
+        elif kind == 0x80 or kind == 0x90:
+            start = sounding.pop((track, channel, data1), None)
+            if start is not None:
+                yield (int(start), int(now - start), track, channel, data1)
+
+
+def load_midi(path, pitch_table=PITCH_TO_FREQ, skip_drums=True):
+    """Reads a MIDI file into monophonic voices, returned as {name: Voice}.
+
+    Each track and channel becomes a voice. Where a track plays chords, the
+    extra notes spill into additional voices ("t1c0v1", "t1c0v2", ...), so
+    every voice can be played by one buzzer.
+    """
+    voices = {}
+    lanes = {}  # (track, channel) -> [Voice, ...]
+
+    for start, duration, track, channel, key in iter_notes(path):
+        if skip_drums and channel == DRUM_CHANNEL:
+            continue
+        group = lanes.setdefault((track, channel), [])
+        # Notes arrive in the order they end, so a note that starts after
+        # a lane's last note has ended fits after everything in that lane
+        for voice in group:
+            if voice.end_ms() <= start:
+                break
+        else:
+            voice = Voice(f"t{track}c{channel}v{len(group)}")
+            group.append(voice)
+            voices[voice.name] = voice
+        voice.add(start, duration, pitch_table[key])
+
+    return voices
+
+
+# --- Voice Assignment ---
+# A buzzer plays one note at a time, so each device gets exactly one voice.
+# When there are more devices than voices, voices are doubled; when there
+# are fewer, the voices with the fewest notes are left out.
+
+
+def _by_importance(voices):
+    return sorted(voices.values(), key=lambda v: (-len(v), v.name))
+
+
+def assign_round_robin(voices, devices):
+    """Returns {device: voice name}, cycling through voices by importance."""
+    ranked = _by_importance(voices)
+    if not ranked:
+        return {}
+    return {device: ranked[i % len(ranked)].name for i, device in enumerate(devices)}
+
+
+def assign_by_capability(voices, capabilities):
+    """Assigns voices to devices whose (min_freq, max_freq) range suits them.
+
+    Voices are placed in order of importance on the narrowest free device
+    range containing their median pitch. Devices left over double voices
+    round-robin.
+    """
+    free = dict(capabilities)
+    assignment = {}
+    for voice in _by_importance(voices):
+        pitch = voice.median_freq()
+        fits = [d for d, (lo, hi) in free.items() if lo <= pitch <= hi]
+        if fits:
+            device = min(fits, key=lambda d: free[d][1] - free[d][0])
+            assignment[device] = voice.name
+            del free[device]
+    assignment.update(assign_round_robin(voices, list(free)))
+    return assignment
+
+
+def load_mapping(path):
+    """Reads a JSON file keyed by device ip or id, e.g. {"device": "voice name"}."""
+    with open(path, "r") as f:
+        return json.load(f)
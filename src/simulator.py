@@ -0,0 +1,338 @@
+# simulator.py
+# To be run on a student's computer (not the Pico)
+# A fleet of fake Picos for testing the conductor and dashboard without
+# hardware. Each simulated device listens on its own localhost port and
+# implements the Project.md API contract (/health, /sensor, /tone, /melody,
+# /events) plus GET /time, GET /status and the UDP control protocol, with configurable
+# network latency, packet loss and slow devices.
+#
+# Usage: python simulator.py --devices 20 --latency-ms 5
+#        (prints the device addresses, then runs until Ctrl+C)
+
+import asyncio
+import json
+import math
+import random
+import struct
+import threading
+import time
+
+API_VERSION = "1.0.0"
+TICKS_PERIOD = 1 << 30
+
+# Same layout as the firmware's UDP control protocol (see main.py)
+UDP_HEADER = struct.Struct(">2sBBIi")
+OP_TONE = 1
+OP_MELODY = 2
+OP_SYNC = 4
+
+REASONS = {200: b"OK", 202: b"Accepted", 304: b"Not Modified", 404: b"Not Found"}
+
+
+def now_ms():
+    """Host clock shared with the conductor (time.perf_counter, in ms)."""
+    return time.perf_counter() * 1000
+
+
+class SimulatedDevice:
+    """One fake Pico. Records when each note would have started playing."""
+
+    def __init__(self, index, latency_ms=0.0, jitter_ms=0.0, loss=0.0, rng=None):
+        self.index = index
+        self.device_id = f"SIM-{index:04d}"
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.loss = loss
+        self.rng = rng or random.Random(index)
+        # Each device's tick counter starts at a different point, like a
+        # Pico that booted at a different time
+        self.tick_offset = self.rng.randrange(TICKS_PERIOD)
+        self.port = None
+        self.requests = 0
+        self.onsets = []  # (host time in ms, freq) of every note start
+        self.playing_until = 0.0
+        self.writers = set()  # Open connections
+        self.light_speed = 0.2  # How fast the light level moves; 0 keeps it still
+        self.status_seq = 0
+        self._status_key = None
+
+    def ticks_ms(self):
+        return int(now_ms() + self.tick_offset) % TICKS_PERIOD
+
+    def sensor(self):
+        """A slowly drifting light level, different for every device."""
+        norm = 0.5 + 0.4 * math.sin(time.time() * self.light_speed + self.index)
+        raw = int(norm * 65535)
+        return {"raw": raw, "norm": round(norm, 3), "lux_est": round(norm * 1000, 1)}
+
+    def _delay_s(self):
+        return max(0.0, self.latency_ms + self.rng.uniform(-1, 1) * self.jitter_ms) / 1000
+
+    def _lost(self):
+        return self.loss > 0 and self.rng.random() < self.loss
+
+    def _start_note(self, freq, at_ms, total_ms):
+        """Records the onset: now, or when the device clock reaches at_ms."""
+        start = now_ms()
+        if at_ms is not None:
+            ahead = (at_ms - self.ticks_ms() + TICKS_PERIOD // 2) % TICKS_PERIOD
+            start += max(0, ahead - TICKS_PERIOD // 2)
+        self.onsets.append((start, freq))
+        self.playing_until = start + total_ms
+
+    # --- HTTP ---
+
+    def status(self):
+        """The /status body; seq changes only when norm or playback changes."""
+        data = {"status": "ok", "device_id": self.device_id, "api": API_VERSION}
+        data.update(self.sensor())
+        data["playing"] = now_ms() < self.playing_until
+        key = (data["norm"], data["playing"])
+        if key != self._status_key:
+            self._status_key = key
+            self.status_seq += 1
+        data["seq"] = self.status_seq
+        return data
+
+    def _route(self, method, path, body):
+        """Returns (status, JSON-able body) for one request."""
+        if method == "GET" and path == "/status":
+            return 200, self.status()
+        if method == "GET" and path == "/health":
+            return 200, {"status": "ok", "device_id": self.device_id, "api": API_VERSION}
+        if method == "GET" and path == "/sensor":
+            return 200, self.sensor()
+        if method == "GET" and path == "/time":
+            ticks = self.ticks_ms()
+            return 200, {"ticks_ms": ticks, "now_ms": ticks}
+        if method == "POST" and path == "/tone":
+            data = json.loads(body or b"{}")
+            self._start_note(data.get("freq", 0), data.get("at_ms"), data.get("ms", 0))
+            return 202, {"playing": True, "until_ms_from_now": data.get("ms", 0)}
+        if method == "POST" and path == "/melody":
+            data = json.loads(body or b"{}")
+            notes = data.get("notes", [])
+            gap = data.get("gap_ms", 0)
+            if notes and not data.get("append"):
+                total = sum(n.get("ms", 0) + gap for n in notes)
+                self._start_note(notes[0].get("freq", 0), data.get("at_ms"), total)
+            return 202, {"queued": len(notes)}
+        if method == "POST" and path == "/stop":
+            self.playing_until = 0.0
+            return 200, {"status": "ok"}
+        return 404, {"error": "not found"}
+
+    async def handle(self, reader, writer):
+        """Serves HTTP/1.1 requests on one connection until the client closes it."""
+        self.writers.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode().split(" ", 2)
+                length = 0
+                if_none_match = None
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode().partition(":")
+                    name = name.strip().lower()
+                    if name == "content-length":
+                        length = int(value)
+                    elif name == "if-none-match":
+                        if_none_match = value.strip()
+                body = await reader.readexactly(length) if length else b""
+                self.requests += 1
+
+                await asyncio.sleep(self._delay_s())
+                if self._lost():
+                    break  # Drop the connection without answering
+
+                if path.startswith("/events"):
+                    _, _, query = path.partition("interval_ms=")
+                    await self._events(writer, int(query or 200) / 1000)
+                    break
+                status, payload = self._route(method, path, body)
+                headers = b""
+                if path == "/status":
+                    etag = b'"%d"' % payload["seq"]
+                    headers = b"ETag: %s\r\n" % etag
+                    if if_none_match == etag.decode():
+                        status = 304
+                data = json.dumps(payload).encode() if status != 304 else b""
+                writer.write(
+                    b"HTTP/1.1 %d %s\r\nContent-Type: application/json\r\n"
+                    b"%sContent-Length: %d\r\n\r\n"
+                    % (status, REASONS[status], headers, len(data))
+                    + data
+                )
+                await writer.drain()
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    async def _events(self, writer, interval_s=0.2, keepalive_s=5.0):
+        """Streams norm changes like the firmware's /events (HTTP/1.0, no length)."""
+        writer.write(b"HTTP/1.0 200 OK\r\nContent-Type: text/event-stream\r\n\r\n")
+        last_norm = None
+        last_sent = 0.0
+        while True:
+            norm = self.sensor()["norm"]
+            if norm != last_norm or time.monotonic() - last_sent >= keepalive_s:
+                event = {"norm": norm, "ts": self.ticks_ms()}
+                writer.write(b"data: %s\n\n" % json.dumps(event).encode())
+                await writer.drain()
+                last_norm, last_sent = norm, time.monotonic()
+            await asyncio.sleep(interval_s)
+
+    # --- UDP ---
+
+    def datagram(self, data, addr, transport):
+        if len(data) < UDP_HEADER.size:
+            return
+        _, _, op, _, at_ms = UDP_HEADER.unpack_from(data)
+        at = None if at_ms < 0 else at_ms
+        self.requests += 1
+        if op == OP_SYNC:
+            ticks = self.ticks_ms()
+            transport.sendto(data + struct.pack(">II", ticks, ticks), addr)
+        elif op == OP_TONE:
+            freq, ms = struct.unpack_from(">HH", data, UDP_HEADER.size)
+            self._start_note(freq, at, ms)
+        elif op == OP_MELODY and not data[UDP_HEADER.size + 1] & 1:
+            freq = struct.unpack_from(">H", data, UDP_HEADER.size + 4)[0]
+            self._start_note(freq, at, 0)
+
+
+class _UdpProtocol(asyncio.DatagramProtocol):
+    def __init__(self, device):
+        self.device = device
+        self.transport = None
+        self.seen = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if self.device._lost():
+            return
+        seq = UDP_HEADER.unpack_from(data)[3] if len(data) >= UDP_HEADER.size else None
+        if seq is not None and seq == self.seen:
+            return  # Duplicate copy
+        self.seen = seq
+        delay = self.device._delay_s()
+        loop = asyncio.get_running_loop()
+        loop.call_later(delay, self.device.datagram, data, addr, self.transport)
+
+
+class SimulatedFleet:
+    """Runs many SimulatedDevices on localhost in a background event loop.
+
+    ``slow_fraction`` of the devices get ``slow_ms`` of extra latency.
+    """
+
+    def __init__(
+        self,
+        count,
+        latency_ms=0.0,
+        jitter_ms=0.0,
+        loss=0.0,
+        slow_fraction=0.0,
+        slow_ms=0.0,
+        seed=0,
+    ):
+        rng = random.Random(seed)
+        self.devices = []
+        for i in range(count):
+            slow = rng.random() < slow_fraction
+            self.devices.append(
+                SimulatedDevice(
+                    i,
+                    latency_ms + (slow_ms if slow else 0.0),
+                    jitter_ms,
+                    loss,
+                    random.Random(seed * 100003 + i),
+                )
+            )
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._servers = []
+
+    async def _start(self):
+        for device in self.devices:
+            server = await asyncio.start_server(device.handle, "127.0.0.1", 0)
+            device.port = server.sockets[0].getsockname()[1]
+            transport, _ = await self._loop.create_datagram_endpoint(
+                lambda d=device: _UdpProtocol(d), local_addr=("127.0.0.1", device.port)
+            )
+            self._servers.append((server, transport))
+
+    def start(self):
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+        return self
+
+    @property
+    def addresses(self):
+        """Device addresses as the conductor and dashboard expect them ("host:port")."""
+        return [f"127.0.0.1:{d.port}" for d in self.devices]
+
+    def reset(self):
+        for device in self.devices:
+            device.onsets.clear()
+            device.requests = 0
+
+    def stop(self):
+        async def close():
+            for server, transport in self._servers:
+                server.close()
+                transport.close()
+            # Hang up on connections still held open by clients
+            for device in self.devices:
+                for writer in list(device.writers):
+                    writer.close()
+            while any(device.writers for device in self.devices):
+                await asyncio.sleep(0.01)
+
+        asyncio.run_coroutine_threadsafe(close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a simulated Pico fleet")
+    parser.add_argument("--devices", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--loss", type=float, default=0.0, help="drop probability, 0-1")
+    parser.add_argument("--slow-fraction", type=float, default=0.0)
+    parser.add_argument("--slow-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    fleet = SimulatedFleet(
+        args.devices,
+        args.latency_ms,
+        args.jitter_ms,
+        args.loss,
+        args.slow_fraction,
+        args.slow_ms,
+    ).start()
+    print("\n".join(fleet.addresses))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        fleet.stop()
@@ -0,0 +1,390 @@
+# timeseries.py
+# To be run on a student's computer (not the Pico)
+# Keeps the history of every device's light readings so the dashboard can
+# show trends instead of only the latest value.
+#
+# Each device gets one fixed-size file, memory-mapped, holding:
+#   - a ring of the most recent raw samples (time, norm, raw, lux_est)
+#   - a ring of rollup buckets (min/max/mean per field over bucket_s seconds)
+# Every sample is folded into the current bucket as it arrives, so when the
+# raw ring wraps the old samples survive as buckets. The file never grows,
+# so memory and disk per device stay bounded however long the dashboard runs.
+#
+# Usage: python timeseries.py history/ --device PICO-1234 --last 10
+
+import bisect
+import math
+import mmap
+import os
+import re
+import struct
+from collections import namedtuple
+
+# --- Configuration ---
+HISTORY_DIR = "history"
+RAW_CAPACITY = 3600  # 1 hour of samples at one per second
+BUCKET_S = 60  # Older data is kept as one-minute buckets...
+BUCKET_CAPACITY = 1440  # ...for a day
+
+FIELDS = ("norm", "raw", "lux_est")
+
+Sample = namedtuple("Sample", ("t",) + FIELDS)
+# stats holds (min, max, mean) for each field, in FIELDS order
+Bucket = namedtuple("Bucket", ("start", "count", "stats"))
+Aggregate = namedtuple("Aggregate", ("min", "max", "mean", "count"))
+
+# --- File Layout ---
+# Header, then the raw columns, then the bucket columns. Columns are plain
+# arrays inside the mapped file, read and written through typed memoryviews.
+MAGIC = b"PLTS"
+VERSION = 1
+# magic, version, field count, raw capacity, bucket capacity, bucket_s,
+# raw head, raw count, bucket head, bucket count, then the open bucket:
+# start, count, per-field counts, per-field min, max and sum
+_HEADER = struct.Struct("<4sHH7IdI3I9d")
+_DATA_START = (_HEADER.size + 7) // 8 * 8
+
+
+def _aligned(n):
+    return (n + 7) // 8 * 8
+
+
+def _layout(raw_capacity, bucket_capacity):
+    """Returns ([(typecode, offset, length) of every column], file size)."""
+    columns = []
+    offset = _DATA_START
+    for typecode, length, count in (
+        ("d", raw_capacity, 1),  # sample time
+        ("f", raw_capacity, len(FIELDS)),  # one column per field
+        ("d", bucket_capacity, 1),  # bucket start
+        ("I", bucket_capacity, 1),  # samples in bucket
+        ("f", bucket_capacity, 3 * len(FIELDS)),  # min, max, mean per field
+    ):
+        for _ in range(count):
+            columns.append((typecode, offset, length))
+            offset += _aligned(length * struct.calcsize(typecode))
+    return columns, offset
+
+
+class _Chronological:
+    """The times of a ring in oldest-first order, as a sequence bisect can search."""
+
+    def __init__(self, column, first, count):
+        self.column = column
+        self.first = first
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        return self.column[(self.first + i) % len(self.column)]
+
+
+class Series:
+    """The history of one device, stored in one memory-mapped file.
+
+    An existing file keeps the capacities it was created with.
+    """
+
+    def __init__(
+        self,
+        path,
+        raw_capacity=RAW_CAPACITY,
+        bucket_capacity=BUCKET_CAPACITY,
+        bucket_s=BUCKET_S,
+    ):
+        self.path = path
+        header = None
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                data = f.read(_HEADER.size)
+            if len(data) == _HEADER.size and data[:4] == MAGIC:
+                header = _HEADER.unpack(data)
+                if header[1] != VERSION or header[2] != len(FIELDS):
+                    raise ValueError(f"{path} has an unsupported format")
+                raw_capacity, bucket_capacity, bucket_s = header[3:6]
+
+        self.raw_capacity = raw_capacity
+        self.bucket_capacity = bucket_capacity
+        self.bucket_s = bucket_s
+        columns, size = _layout(raw_capacity, bucket_capacity)
+        with open(path, "r+b" if header else "w+b") as f:
+            if not header:
+                f.truncate(size)
+            self._mm = mmap.mmap(f.fileno(), size)
+
+        view = memoryview(self._mm)
+        self._views = []
+        for typecode, offset, length in columns:
+            end = offset + length * struct.calcsize(typecode)
+            self._views.append(view[offset:end].cast(typecode))
+        n = len(FIELDS)
+        self._times = self._views[0]
+        self._values = self._views[1:][:n]
+        stats_from = 3 + n
+        self._starts = self._views[1 + n]
+        self._counts = self._views[2 + n]
+        # min, max, mean of field 0, then field 1...
+        self._stats = self._views[stats_from:]
+        self._views.append(view)
+
+        if header:
+            self._state = list(header[6:])
+        else:
+            self._state = [0, 0, 0, 0, 0.0, 0] + [0] * n + [0.0] * (3 * n)
+            self._save_header()
+
+    # Header state, kept in a list and written back after every change
+    raw_head = property(lambda self: self._state[0])
+    raw_count = property(lambda self: self._state[1])
+    bucket_head = property(lambda self: self._state[2])
+    bucket_count = property(lambda self: self._state[3])
+
+    def _save_header(self):
+        _HEADER.pack_into(
+            self._mm,
+            0,
+            MAGIC,
+            VERSION,
+            len(FIELDS),
+            self.raw_capacity,
+            self.bucket_capacity,
+            self.bucket_s,
+            *self._state,
+        )
+
+    # --- Writing ---
+
+    def append(self, t, values):
+        """Adds one sample; ``values`` holds one number per field (NaN if unknown)."""
+        state = self._state
+        i = state[0]
+        self._times[i] = t
+        for column, value in zip(self._values, values):
+            column[i] = value
+        state[0] = (i + 1) % self.raw_capacity
+        state[1] = min(state[1] + 1, self.raw_capacity)
+
+        start = t - t % self.bucket_s
+        if state[5] and start != state[4]:
+            self._close_bucket()
+        if not state[5]:
+            n = len(FIELDS)
+            state[4:] = (
+                [start, 0] + [0] * n + [math.inf] * n + [-math.inf] * n + [0.0] * n
+            )
+        self._fold(values)
+        self._save_header()
+
+    def _fold(self, values):
+        """Adds one sample to the open bucket."""
+        state = self._state
+        n = len(FIELDS)
+        state[5] += 1
+        for k, value in enumerate(values):
+            if math.isnan(value):
+                continue
+            state[6 + k] += 1
+            state[6 + n + k] = min(state[6 + n + k], value)
+            state[6 + 2 * n + k] = max(state[6 + 2 * n + k], value)
+            state[6 + 3 * n + k] += value
+
+    def _open_stats(self):
+        state = self._state
+        n = len(FIELDS)
+        stats = []
+        for k in range(n):
+            count = state[6 + k]
+            if count:
+                stats.append(
+                    (state[6 + n + k], state[6 + 2 * n + k], state[6 + 3 * n + k] / count)
+                )
+            else:
+                stats.append((math.nan, math.nan, math.nan))
+        return stats
+
+    def _close_bucket(self):
+        state = self._state
+        j = state[2]
+        self._starts[j] = state[4]
+        self._counts[j] = state[5]
+        for k, (lo, hi, mean) in enumerate(self._open_stats()):
+            self._stats[3 * k][j] = lo
+            self._stats[3 * k + 1][j] = hi
+            self._stats[3 * k + 2][j] = mean
+        state[2] = (j + 1) % self.bucket_capacity
+        state[3] = min(state[3] + 1, self.bucket_capacity)
+        state[5] = 0
+
+    # --- Queries ---
+
+    def _raw_times(self):
+        first = (self.raw_head - self.raw_count) % self.raw_capacity
+        return _Chronological(self._times, first, self.raw_count)
+
+    def _sample(self, i):
+        return Sample(self._times[i], *(column[i] for column in self._values))
+
+    def latest(self, n=1):
+        """The newest ``n`` samples, oldest first."""
+        n = min(n, self.raw_count)
+        return [
+            self._sample((self.raw_head - n + k) % self.raw_capacity) for k in range(n)
+        ]
+
+    def range(self, start, end=math.inf):
+        """Raw samples with start <= t < end, oldest first."""
+        times = self._raw_times()
+        lo = bisect.bisect_left(times, start)
+        hi = bisect.bisect_left(times, end)
+        return [
+            self._sample((times.first + k) % self.raw_capacity) for k in range(lo, hi)
+        ]
+
+    def buckets(self, start=-math.inf, end=math.inf):
+        """Rollup buckets starting in [start, end), oldest first.
+
+        The bucket still being filled is included at the end.
+        """
+        first = (self.bucket_head - self.bucket_count) % self.bucket_capacity
+        starts = _Chronological(self._starts, first, self.bucket_count)
+        lo = bisect.bisect_left(starts, start)
+        hi = bisect.bisect_left(starts, end)
+        result = []
+        for k in range(lo, hi):
+            j = (first + k) % self.bucket_capacity
+            stats = [
+                (
+                    self._stats[3 * f][j],
+                    self._stats[3 * f + 1][j],
+                    self._stats[3 * f + 2][j],
+                )
+                for f in range(len(FIELDS))
+            ]
+            result.append(Bucket(self._starts[j], self._counts[j], stats))
+        if self._state[5] and start <= self._state[4] < end:
+            result.append(Bucket(self._state[4], self._state[5], self._open_stats()))
+        return result
+
+    def aggregate(self, field, start=-math.inf, end=math.inf):
+        """Min, max and mean of one field over [start, end).
+
+        Raw samples are used where the raw ring still covers the range;
+        older parts of the range come from the buckets.
+        """
+        k = FIELDS.index(field)
+        samples = self.range(start, end)
+        raw_from = samples[0].t if samples else end
+        lo, hi, total, count = math.inf, -math.inf, 0.0, 0
+        for bucket in self.buckets(start, end):
+            if bucket.start + self.bucket_s > raw_from:
+                break
+            b_lo, b_hi, b_mean = bucket.stats[k]
+            if not math.isnan(b_mean):
+                lo, hi = min(lo, b_lo), max(hi, b_hi)
+                total += b_mean * bucket.count
+                count += bucket.count
+        for sample in samples:
+            value = sample[1 + k]
+            if not math.isnan(value):
+                lo, hi = min(lo, value), max(hi, value)
+                total += value
+                count += 1
+        if not count:
+            return Aggregate(math.nan, math.nan, math.nan, 0)
+        return Aggregate(lo, hi, total / count, count)
+
+    def flush(self):
+        self._mm.flush()
+
+    def close(self):
+        for view in self._views:
+            view.release()
+        self._mm.close()
+
+
+class TimeSeriesStore:
+    """One Series per device, kept as files in a directory."""
+
+    def __init__(
+        self,
+        directory=HISTORY_DIR,
+        raw_capacity=RAW_CAPACITY,
+        bucket_capacity=BUCKET_CAPACITY,
+        bucket_s=BUCKET_S,
+    ):
+        self.directory = directory
+        self.options = (raw_capacity, bucket_capacity, bucket_s)
+        self._series = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        # Device ids and "host:port" addresses become safe file names
+        return os.path.join(self.directory, re.sub(r"[^\w.-]", "_", key) + ".ts")
+
+    def keys(self):
+        """Names of the devices that have a history file."""
+        return sorted(
+            name[:-3] for name in os.listdir(self.directory) if name.endswith(".ts")
+        )
+
+    def series(self, key):
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = Series(self._path(key), *self.options)
+        return series
+
+    def record(self, status, t):
+        """Stores one dashboard status (see dashboard.get_device_status)."""
+        if status.get("status") != "ok" or status.get("stale"):
+            return
+        key = (
+            status["device_id"]
+            if status.get("device_id", "N/A") != "N/A"
+            else status["ip"]
+        )
+        values = [float(status.get(field, math.nan)) for field in FIELDS]
+        self.series(key).append(t, values)
+
+    def record_all(self, statuses, t):
+        for status in statuses:
+            self.record(status, t)
+
+    def flush(self):
+        for series in self._series.values():
+            series.flush()
+
+    def close(self):
+        for series in self._series.values():
+            series.close()
+        self._series.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Show the stored light history")
+    parser.add_argument("directory", nargs="?", default=HISTORY_DIR)
+    parser.add_argument("--device", help="device id (default: all devices)")
+    parser.add_argument("--last", type=int, default=5, help="samples to show per device")
+    args = parser.parse_args()
+
+    with TimeSeriesStore(args.directory) as store:
+        for key in [args.device] if args.device else store.keys():
+            series = store.series(key)
+            hour = series.aggregate("norm", time.time() - 3600)
+            print(
+                f"{key}: last hour norm min {hour.min:.2f} max {hour.max:.2f} "
+                f"mean {hour.mean:.2f} ({hour.count} samples)"
+            )
+            for sample in series.latest(args.last):
+                stamp = time.strftime("%H:%M:%S", time.localtime(sample.t))
+                print(f"  {stamp} norm {sample.norm:.3f} raw {sample.raw:.0f}")
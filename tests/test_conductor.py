@@ -1,11 +1,15 @@
+import json
 import pathlib
 import sys
+import time
 
 # Ensure src/ is on the path
 ROOT = pathlib.Path(__file__).resolve().parents[1]
 sys.path.append(str(ROOT / "src"))
 
+import requests
 import conductor  # type: ignore
+import score  # type: ignore
 
 
 def test_play_note_posts_to_all_devices(requests_mock, monkeypatch):
@@ -36,4 +40,203 @@ def test_play_note_handles_errors_gracefully(requests_mock, monkeypatch):
     requests_mock.post("http://192.0.2.99/tone", exc=Exception("boom"))
 
     # Should not raise
-    conductor.play_note_on_all_picos(262, 100) 
\ No newline at end of file
+    conductor.play_note_on_all_picos(262, 100)
+
+
+def test_play_note_reports_per_device_results(requests_mock, monkeypatch):
+    test_ips = ["127.0.0.1", "192.0.2.10", "192.0.2.99"]
+    monkeypatch.setattr(conductor, "PICO_IPS", test_ips, raising=True)
+
+    requests_mock.post("http://127.0.0.1/tone", status_code=202)
+    requests_mock.post("http://192.0.2.10/tone", status_code=202)
+    requests_mock.post("http://192.0.2.99/tone", exc=requests.exceptions.ConnectionError)
+
+    report = conductor.play_note_on_all_picos(440, 100)
+
+    assert sorted(r.ip for r in report.results) == sorted(test_ips)
+    assert [r.ip for r in report.failed] == ["192.0.2.99"]
+    assert report.failed[0].error == "ConnectionError"
+    assert report.skew_ms >= 0.0
+
+
+def test_compile_melody_chunks_song():
+    song = [(262, 100)] * 5
+    chunks = conductor.compile_melody(song, gap_ms=10, chunk_notes=2)
+
+    assert [c.notes for c in chunks] == [2, 2, 1]
+    assert [c.start_ms for c in chunks] == [0, 220, 440]
+    first, second = (json.loads(c.body) for c in chunks[:2])
+    assert first == {"notes": [{"freq": 262, "ms": 100}] * 2, "gap_ms": 10}
+    assert second["append"] is True
+
+
+def test_play_score_uploads_each_chunk_once(requests_mock, monkeypatch):
+    test_ips = ["127.0.0.1", "192.0.2.10"]
+    for ip in test_ips:
+        requests_mock.post(f"http://{ip}/melody", status_code=202)
+
+    song = [(262, 1), (294, 1), (330, 1)]
+    parts = {ip: song for ip in test_ips}
+    score = conductor.compile_score(parts, gap_ms=0, chunk_notes=2)
+    conductor.play_score(score)
+
+    # 2 devices x 2 chunks, regardless of the number of notes
+    assert requests_mock.call_count == 4
+    to_first = [h.json() for h in requests_mock.request_history if h.netloc == "127.0.0.1"]
+    assert [n["freq"] for c in to_first for n in c["notes"]] == [262, 294, 330]
+
+
+def test_clock_sync_estimates_device_offset(requests_mock, monkeypatch):
+    ip = "127.0.0.1"
+    offset = conductor.TICKS_PERIOD - 5000  # device clock close to wrapping around
+
+    def device_time(request, context):
+        ticks = int(conductor.local_ms() + offset) % conductor.TICKS_PERIOD
+        return {"ticks_ms": ticks, "now_ms": ticks}
+
+    requests_mock.get(f"http://{ip}/time", json=device_time)
+    requests_mock.post(f"http://{ip}/tone", status_code=202)
+    monkeypatch.setattr(conductor, "PICO_IPS", [ip], raising=True)
+    monkeypatch.setattr(conductor, "clock", conductor.ClockSync(samples=4), raising=True)
+
+    conductor.clock.sync([ip])
+    now = conductor.local_ms()
+    expected = (now + offset) % conductor.TICKS_PERIOD
+    assert abs(conductor.ticks_diff(conductor.clock.device_ticks(ip, now), expected)) <= 5
+
+    conductor.play_note_on_all_picos(440, 100, start_in_ms=200)
+    at_ms = requests_mock.request_history[-1].json()["at_ms"]
+    assert abs(conductor.ticks_diff(at_ms, expected) - 200) <= 50
+
+
+def test_deadline_scheduler_does_not_accumulate_dispatch_time():
+    played = []
+
+    def slow_play(freq, ms):
+        played.append((time.perf_counter(), freq, ms))
+        time.sleep(0.005)  # dispatch takes a while
+
+    notes = [(262, 20)] * 5
+    scheduler = conductor.DeadlineScheduler(bpm=150, base_bpm=150)
+    start = time.perf_counter()
+    scheduler.run(notes, slow_play, articulation=1.0, start=start)
+
+    onsets = [t - start for t, _, _ in played]
+    for i, onset in enumerate(onsets):
+        assert abs(onset - i * 0.020) < 0.010
+    assert len(scheduler.jitter_ms) == 5
+
+
+def test_deadline_scheduler_tempo_change():
+    played = []
+    notes = [(262, 40)] * 4
+    scheduler = conductor.DeadlineScheduler(bpm=150, base_bpm=150)
+    start = time.perf_counter()
+    # Double speed from the third note on
+    scheduler.run(
+        notes,
+        lambda f, ms: played.append((time.perf_counter() - start, ms)),
+        tempo_changes={2: 300},
+        articulation=1.0,
+        start=start,
+    )
+
+    assert [ms for _, ms in played] == [40, 40, 20, 20]
+    assert abs(played[3][0] - 0.100) < 0.010
+
+
+def test_command_batch_groups_ops_per_device(requests_mock):
+    def answer(request, context):
+        return {"results": [{"status": 200, "body": {}} for _ in request.json()["ops"]]}
+
+    requests_mock.post("http://192.0.2.10/batch", json=answer)
+    requests_mock.post("http://192.0.2.11/batch", json=answer)
+    requests_mock.post("http://192.0.2.99/batch", exc=requests.exceptions.ConnectionError)
+
+    batch = conductor.CommandBatch()
+    ips = ["192.0.2.10", "192.0.2.11", "192.0.2.99"]
+    batch.add_all(ips, "POST", "/stop")
+    batch.add_all(ips, "POST", "/melody", {"notes": [{"freq": 440, "ms": 100}]})
+    for _ in range(conductor.BATCH_MAX_OPS):
+        batch.add("192.0.2.11", "GET", "/health")
+    assert batch.pending() == {"192.0.2.10": 2, "192.0.2.11": 10, "192.0.2.99": 2}
+
+    results = batch.send()
+
+    assert batch.pending() == {}
+    assert results["192.0.2.10"].ok and len(results["192.0.2.10"].results) == 2
+    assert len(results["192.0.2.11"].results) == 10
+    assert not results["192.0.2.99"].ok
+    assert results["192.0.2.99"].error == "ConnectionError"
+    sent = [h.json()["ops"] for h in requests_mock.request_history if "2.10" in h.url]
+    assert sent == [
+        [
+            {"method": "POST", "path": "/stop"},
+            {
+                "method": "POST",
+                "path": "/melody",
+                "body": {"notes": [{"freq": 440, "ms": 100}]},
+            },
+        ]
+    ]
+    batches = [h for h in requests_mock.request_history if "2.11" in h.url]
+    assert [len(h.json()["ops"]) for h in batches] == [conductor.BATCH_MAX_OPS, 2]
+    assert results["192.0.2.11"].split and not results["192.0.2.10"].split
+
+
+def test_command_batch_reports_a_split_batch_that_failed_part_way(requests_mock):
+    answers = [
+        {"json": {"results": [{"status": 200, "body": {}}] * conductor.BATCH_MAX_OPS}},
+        {"exc": requests.exceptions.ConnectTimeout},
+    ]
+    requests_mock.post("http://192.0.2.10/batch", answers)
+
+    batch = conductor.CommandBatch()
+    for _ in range(conductor.BATCH_MAX_OPS + 1):
+        batch.add("192.0.2.10", "POST", "/stop")
+    result = batch.send()["192.0.2.10"]
+
+    # The first batch ran, so its results are kept
+    assert not result.ok and result.split and result.error == "ConnectTimeout"
+    assert len(result.results) == conductor.BATCH_MAX_OPS
+
+
+def test_command_line_options():
+    args = conductor.build_parser().parse_args([])
+    assert not args.per_note and not args.udp and args.bpm == conductor.SONG_BPM
+    assert args.midi is None and args.mapping is None and args.ranges is None
+
+    args = conductor.build_parser().parse_args(
+        ["--midi", "song.mid", "--mapping", "m.json", "--ranges", "r.json"]
+    )
+    assert args.midi == "song.mid" and args.mapping == "m.json"
+    assert args.ranges == "r.json"
+
+    assert conductor.build_parser().parse_args(["--per-note", "--udp"]).udp
+
+
+def test_parts_from_midi_assigns_by_range_and_device_id(monkeypatch):
+    low, high = score.Voice("low"), score.Voice("high")
+    low.add(0, 100, 200)
+    high.add(0, 100, 1500)
+    high.add(100, 100, 1500)
+    monkeypatch.setattr(score, "load_midi", lambda path: {"low": low, "high": high})
+    ips = ["10.0.0.1", "10.0.0.2", "10.0.0.3"]
+    devices = {"pico-a": {"ip": "10.0.0.1"}, "pico-gone": {"ip": "10.0.0.9"}}
+
+    parts = conductor.parts_from_midi(
+        "song.mid",
+        ips,
+        ranges={"pico-a": [1000, 2000], "10.0.0.2": [100, 400], "pico-gone": [1, 2]},
+        devices=devices,
+    )
+    assert {ip: v.name for ip, v in parts.items()} == {
+        "10.0.0.1": "high",
+        "10.0.0.2": "low",
+        "10.0.0.3": "high",
+    }
+
+    parts = conductor.parts_from_midi(
+        "song.mid", ips, mapping={"pico-a": "low", "pico-gone": "high"}, devices=devices
+    )
+    assert parts["10.0.0.1"].name == "low" and "10.0.0.9" not in parts
@@ -1,5 +1,6 @@
 import pathlib
 import sys
+import time
 
 # Ensure src/ is on the path
 ROOT = pathlib.Path(__file__).resolve().parents[1]
@@ -11,6 +12,8 @@ import dashboard  # type: ignore
 
 def test_get_device_status_success(requests_mock):
     ip = "127.0.0.1"
+    # Older firmware without /status
+    requests_mock.get(f"http://{ip}/status", status_code=404)
     requests_mock.get(f"http://{ip}/health", json={"ip": ip, "device_id": "SIM-1", "status": "ok"})
     requests_mock.get(f"http://{ip}/sensor", json={"norm": 0.75})
 
@@ -24,6 +27,7 @@ def test_get_device_status_success(requests_mock):
 
 def test_get_device_status_offline(requests_mock):
     ip = "192.0.2.5"  # TEST-NET-1
+    requests_mock.get(f"http://{ip}/status", exc=requests.exceptions.ConnectTimeout)
     requests_mock.get(f"http://{ip}/health", exc=requests.exceptions.ConnectTimeout)
 
     status = dashboard.get_device_status(ip)
@@ -31,4 +35,160 @@ def test_get_device_status_offline(requests_mock):
     assert status["ip"] == ip
     assert status["status"].startswith("Offline")
     # norm remains default when offline
-    assert status["norm"] == 0.0 
\ No newline at end of file
+    assert status["norm"] == 0.0
+
+
+def test_get_device_status_uses_conditional_status(requests_mock):
+    ip = "192.0.2.7"
+    body = {"status": "ok", "device_id": "SIM-7", "api": "1.0.0", "norm": 0.4, "seq": 3}
+    requests_mock.get(f"http://{ip}/status", json=body, headers={"ETag": '"3"'})
+
+    first = dashboard.get_device_status(ip)
+    requests_mock.get(f"http://{ip}/status", status_code=304, headers={"ETag": '"3"'})
+    second = dashboard.get_device_status(ip)
+
+    assert first["norm"] == second["norm"] == 0.4
+    assert second["device_id"] == "SIM-7"
+    assert requests_mock.request_history[-1].headers["If-None-Match"] == '"3"'
+    assert not any(h.path == "/health" for h in requests_mock.request_history)
+
+
+def test_poller_marks_late_devices_stale():
+    from simulator import SimulatedFleet  # type: ignore
+
+    with SimulatedFleet(2) as fleet:
+        fast, slow = fleet.addresses
+        fleet.devices[1].latency_ms = 600
+        poller = dashboard.Poller(deadline_s=0.3)
+
+        first = poller.refresh([fast, slow])
+        assert first[0]["status"] == "ok" and not first[0]["stale"]
+        assert first[1]["stale"] and first[1]["status"] == "Waiting"
+
+        # Once the slow poll has landed, its values are shown (and kept if it lags again)
+        time.sleep(1.0)
+        second = poller.refresh([fast, slow])
+        assert second[1]["device_id"] == fleet.devices[1].device_id
+        assert not second[1]["stale"]
+        poller.close()
+
+
+def test_poller_returns_each_reading_once():
+    from simulator import SimulatedFleet  # type: ignore
+
+    with SimulatedFleet(2) as fleet:
+        schedule = dashboard.PollSchedule(min_s=10, max_s=10)
+        poller = dashboard.Poller(deadline_s=0.5, schedule=schedule)
+        before = time.time()
+        shown = poller.refresh(fleet.addresses)
+        readings = poller.new_readings()
+
+        # Not due again: the last readings are shown but not returned twice
+        assert poller.refresh(fleet.addresses) == shown
+        assert poller.new_readings() == []
+        poller.close()
+
+    assert [status["ip"] for _, status in readings] == fleet.addresses
+    assert all(before <= polled_at <= time.time() for polled_at, _ in readings)
+
+
+def test_event_subscriber_follows_device_streams():
+    from simulator import SimulatedFleet  # type: ignore
+
+    with SimulatedFleet(2) as fleet:
+        subscriber = dashboard.EventSubscriber(fleet.addresses, interval_ms=20)
+        deadline = time.monotonic() + 3
+        while time.monotonic() < deadline:
+            statuses = subscriber.statuses()
+            if all(not s["stale"] for s in statuses):
+                break
+            time.sleep(0.05)
+        subscriber.close()
+
+    assert [s["device_id"] for s in statuses] == [d.device_id for d in fleet.devices]
+    assert all(s["status"] == "ok" and not s["stale"] for s in statuses)
+    assert all(0.0 < s["norm"] < 1.0 for s in statuses)
+
+
+def test_event_subscriber_returns_each_event_once():
+    subscriber = dashboard.EventSubscriber([])
+    for ip in ("10.0.0.1", "10.0.0.2"):
+        subscriber._states[ip] = {
+            "ip": ip,
+            "device_id": "N/A",
+            "status": "ok",
+            "norm": 0.0,
+            "received": None,
+        }
+    received = time.monotonic() - 2
+    subscriber._set("10.0.0.1", norm=0.5, received=received)
+
+    [(t, status)] = subscriber.new_readings()
+    assert status["ip"] == "10.0.0.1" and status["norm"] == 0.5
+    assert abs(t - (time.time() - 2)) < 0.1
+    # Another device's event doesn't record the first one again
+    subscriber._set("10.0.0.2", norm=0.7, received=time.monotonic())
+    assert [s["ip"] for _, s in subscriber.new_readings()] == ["10.0.0.2"]
+    assert subscriber.new_readings() == []
+
+
+def test_terminal_view_redraws_only_changed_rows():
+    import io
+
+    statuses = [
+        {"ip": f"10.0.{i // 250}.{i % 250}", "device_id": f"SIM-{i:04d}", "status": "ok"}
+        for i in range(1000)
+    ]
+    for status in statuses:
+        status["norm"] = 0.5
+    out = io.StringIO()
+    view = dashboard.TerminalView(out=out, size=(100, 30))
+
+    assert view.draw(statuses) == 30
+    assert out.getvalue().startswith("\x1b[2J")
+
+    # One visible device changes: only its row is rewritten
+    statuses[3] = dict(statuses[3], norm=0.9)
+    out.truncate(0)
+    out.seek(0)
+    assert view.draw(statuses) == 1
+    assert "SIM-0003" in out.getvalue() and "SIM-0004" not in out.getvalue()
+
+    # Paging and filtering
+    assert view.handle_key("n")
+    view.draw(statuses)
+    assert "page 2/42" in view._screen[1]
+    statuses[999] = dict(statuses[999], status="Offline (ConnectTimeout)")
+    view.handle_key("f")  # offline only
+    view.draw(statuses)
+    rows = [line for line in view._screen if line.startswith("10.")]
+    assert len(rows) == 1 and "SIM-0999" in rows[0]
+    assert not view.handle_key("q")
+
+
+def test_poll_schedule_adapts_intervals_and_budget():
+    import random
+
+    schedule = dashboard.PollSchedule(budget_per_s=3, rng=random.Random(1))
+    ips = ["a", "b", "c", "d"]
+
+    # Only 3 polls fit in the budget; the rest wait for the next tick
+    assert schedule.due(ips, 0.0) == ["a", "b", "c"]
+    assert schedule.due(ips, 0.0) == []
+    assert schedule.due(ips, 1.0) == ["a", "b", "c"]
+
+    ok = {"status": "ok", "norm": 0.5}
+    offline = {"status": "Offline (ConnectTimeout)", "norm": 0.0}
+    schedule.record("a", ok, 0.0)
+    # A steady device slows down, up to the maximum interval
+    intervals = [schedule.record("a", ok, 0.0) for _ in range(20)]
+    assert intervals[0] > dashboard.POLL_MIN_S and intervals[-1] == dashboard.POLL_MAX_S
+    # A moving one goes straight back to the fastest rate
+    assert schedule.record("a", dict(ok, norm=0.6), 0.0) == dashboard.POLL_MIN_S
+
+    # An offline device backs off exponentially, with jitter, up to a cap
+    delays = [schedule.record("b", offline, 0.0) for _ in range(10)]
+    for failures, delay in enumerate(delays):
+        backoff = min(dashboard.BACKOFF_BASE_S * 2**failures, dashboard.BACKOFF_MAX_S)
+        assert backoff / 2 <= delay <= backoff
+    assert schedule.record("b", ok, 0.0) == dashboard.POLL_MIN_S
@@ -0,0 +1,43 @@
+import pathlib
+import sys
+
+# Ensure src/ is on the path
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT / "src"))
+
+import requests
+import requests_mock as requests_mock_lib
+import fleet  # type: ignore
+
+
+def test_scan_subnet_finds_devices(requests_mock):
+    # Every other address doesn't answer
+    requests_mock.get(requests_mock_lib.ANY, exc=requests.exceptions.ConnectTimeout)
+    requests_mock.get(
+        "http://192.0.2.2/health", json={"status": "ok", "device_id": "SIM-2", "api": "1.0.0"}
+    )
+
+    found = fleet.scan_subnet("192.0.2.0/29")
+
+    assert list(found) == ["SIM-2"]
+    assert found["SIM-2"]["ip"] == "192.0.2.2"
+
+
+def test_registry_persists_and_tracks_liveness(tmp_path, requests_mock):
+    path = str(tmp_path / "fleet.json")
+    requests_mock.get("http://192.0.2.2/health", json={"device_id": "SIM-2"})
+    requests_mock.get("http://192.0.2.3/health", status_code=500)
+
+    registry = fleet.Registry(path)
+    registry.update("SIM-2", "192.0.2.2")
+    registry.update("SIM-3", "192.0.2.3")
+    fleet.refresh(registry)
+
+    reloaded = fleet.Registry(path).load()
+    assert sorted(reloaded.devices) == ["SIM-2", "SIM-3"]
+    assert reloaded.live_ips() == ["192.0.2.2"]
+    assert fleet.load_ips(default=["10.0.0.1"], path=path) == ["192.0.2.2"]
+
+    # Entries past their TTL are forgotten
+    reloaded.prune(now=reloaded.devices["SIM-3"]["last_seen"] + fleet.DEFAULT_TTL_S + 1)
+    assert reloaded.devices == {}
@@ -4,6 +4,8 @@ import types
 import time as _time
 import asyncio as _asyncio
 
+import pytest
+
 # Ensure src/ is on the path
 ROOT = pathlib.Path(__file__).resolve().parents[1]
 sys.path.append(str(ROOT / "src"))
@@ -19,6 +21,8 @@ if not hasattr(_time, "ticks_ms"):
     _time.ticks_ms = _ticks_ms  # type: ignore[attr-defined]
     _time.ticks_diff = _ticks_diff  # type: ignore[attr-defined]
     _time.sleep_ms = _sleep_ms  # type: ignore[attr-defined]
+if not hasattr(_time, "ticks_add"):
+    _time.ticks_add = lambda a, b: a + b  # type: ignore[attr-defined]
 
 if not hasattr(_asyncio, "sleep_ms"):
     async def _sleep_ms_async(ms):
@@ -71,4 +75,286 @@ def test_nearest_white_note_indices():
     nearest_val = light_orchestra.NOTES_C3_C7[idx2]
     assert abs(nearest_val - 300) <= min(
         abs(262 - 300), abs(294 - 300)
-    ) 
\ No newline at end of file
+    ) 
+
+
+# Play_Chord before the lookup tables, kept verbatim to check the tables against
+NOTES_C3_C7 = light_orchestra.NOTES_C3_C7
+nearest_white_note = light_orchestra.nearest_white_note
+buzzer_pin = _DummyPWM(18)
+frequency = 262
+chord = [7, 2, 4, 2]
+
+
+def Play_Chord(base_frequency: int, time: int, light_00: int, light_0: int):
+    global chord
+
+    if (light_0 - light_00) >= 2 * light_00:
+        chord[0] = 4
+        if (light_0 - light_00) < 3 * light_00:
+            chord[1] = 2
+            chord[2] = 0
+            chord[3] = 7
+        elif (light_0 - light_00) < 4 * light_00:
+            chord[1] = 7
+            chord[2] = 0
+            chord[3] = 4
+        else:
+            chord[1] = 0
+            chord[2] = 7
+            chord[3] = 4
+    else:
+        chord[0] = 0
+        if (light_0 - light_00) < 0:
+            if base_frequency >= 262:
+                chord[1] = -3
+                chord[2] = -5
+                chord[3] = -7
+            else:
+                chord[1] = 4
+                chord[2] = 2
+                chord[3] = 0
+        elif (light_0 - light_00) < 0.25 * light_00:
+            chord[1] = 4
+            chord[2] = 7
+            chord[3] = 4
+        else:
+            chord[1] = 2
+            chord[2] = 4
+            chord[3] = 7
+
+    note_0 = NOTES_C3_C7[nearest_white_note(frequency) + chord[0]]
+    note_1 = NOTES_C3_C7[nearest_white_note(frequency) + chord[1]]
+    note_2 = NOTES_C3_C7[nearest_white_note(frequency) + chord[2]]
+    note_3 = NOTES_C3_C7[nearest_white_note(frequency) + chord[3]]
+
+    if time < 500:
+        buzzer_pin.freq(note_0)
+
+    elif time < 1000:
+        buzzer_pin.freq(note_1)
+
+    elif time < 1500:
+        buzzer_pin.freq(note_2)
+
+    else:
+        buzzer_pin.freq(note_3)
+    buzzer_pin.duty_u16(32768)
+
+
+def _played(play, base_frequency, time, light_00, light_0):
+    global frequency
+    frequency = base_frequency  # main() always passes the global frequency
+    pwm = light_orchestra.buzzer_pin if play is light_orchestra.Play_Chord else buzzer_pin
+    pwm._freq = None
+    try:
+        play(base_frequency, time, light_00, light_0)
+    except IndexError:
+        return "IndexError"
+    return pwm._freq, pwm._duty
+
+
+def test_play_chord_tables_match_the_original():
+    import random
+
+    rng = random.Random(22)
+    times = (-1, 0, 499, 500, 999, 1000, 1499, 1500, 1999)
+    # Every frequency, with a light change from each chord bucket
+    cases = [
+        (f, t, 1000, l0)
+        for f in range(-5, 2200)
+        for t in (0, 1999)
+        for l0 in (0, 1100, 2500, 3500, 4500, 6000)
+    ]
+    # Every edge between buckets, below and above the register split
+    cases += [
+        (f, t, l00, edge + d)
+        for f in (200, 261, 262, 300)
+        for t in times
+        for l00 in (0, 1, 3, 4, 5, 1000, 30000, 65535)
+        for edge in (l00, l00 + l00 // 4, 3 * l00, 4 * l00, 5 * l00)
+        for d in (-1, 0, 1)
+        if edge + d >= 0
+    ]
+    cases += [
+        (
+            rng.randrange(-100, 2300),
+            rng.randrange(-100, 2500),
+            rng.randrange(0, 65536),
+            rng.randrange(0, 65536),
+        )
+        for _ in range(20000)
+    ]
+    for case in cases:
+        assert _played(light_orchestra.Play_Chord, *case) == _played(Play_Chord, *case), case
+
+
+def test_recording_streams_fixed_chunks_to_flash(tmp_path, monkeypatch):
+    path = str(tmp_path / "recording.bin")
+    monkeypatch.setattr(light_orchestra, "RECORDING_FILE", path)
+    lo = light_orchestra
+    chunks = [id(c) for c in lo.record_chunks]
+    lo.start_recording()
+
+    async def record():
+        flusher = _asyncio.ensure_future(lo.recording_flusher())
+        for i in range(3 * lo.CHUNK_SAMPLES + 10):
+            lo.record_sample(1000 + 50 * i + i % 3, i)
+            await _asyncio.sleep(0)
+        # The full chunks are already on flash, only the last few are in RAM
+        flushed = pathlib.Path(path).stat().st_size
+        flusher.cancel()
+        return flushed
+
+    flushed = _asyncio.run(record())
+    assert flushed == lo.HEADER_SIZE + 3 * lo.CHUNK_SAMPLES * 4
+    assert [id(c) for c in lo.record_chunks] == chunks and lo.record_dropped == 0
+
+    lo.stop_recording()
+    assert not lo.recording_active and lo.replay_file == path
+    records = list(lo.replay_records(path))
+    assert len(records) == 3 * lo.CHUNK_SAMPLES + 10
+    assert records[:4] == [(0, 0), (51, 1), (51, 2), (48, 3)]
+    assert records[-1][1] == 3 * lo.CHUNK_SAMPLES + 9
+
+
+def test_recording_drops_samples_when_flash_falls_behind(tmp_path, monkeypatch):
+    path = str(tmp_path / "recording.bin")
+    monkeypatch.setattr(light_orchestra, "RECORDING_FILE", path)
+    lo = light_orchestra
+    lo.start_recording()
+    for i in range(2 * lo.CHUNK_SAMPLES + 5):  # The flusher never runs
+        lo.record_sample(50 * i, 1)
+    assert lo.record_dropped == 5
+
+    lo.flush_pending()  # Frees a chunk, so the next sample is kept
+    lo.record_sample(50 * (2 * lo.CHUNK_SAMPLES + 6), 2)
+    assert lo.record_dropped == 5
+    lo.stop_recording()
+    records = list(lo.replay_records(path))
+    assert len(records) == 2 * lo.CHUNK_SAMPLES + 1
+    assert records[-1] == (50 * 7, 2)  # Its delta spans the dropped samples
+
+
+def test_json_recordings_convert_to_the_binary_format(tmp_path):
+    import json
+
+    lo = light_orchestra
+    # Ticks wrap around at 2**30 in the middle of this take
+    start = (1 << 30) - 500
+    samples = [[(start + 50 * i) % (1 << 30), 1000 + i] for i in range(1000)]
+    (tmp_path / "recording.json").write_text(json.dumps(samples))
+    dst = str(tmp_path / "recording.bin")
+
+    assert lo.convert_json_recording(str(tmp_path / "recording.json"), dst) == 1000
+    with open(dst, "rb") as f:
+        assert lo.read_header(f) == 20
+    records = list(lo.replay_records(dst))
+    assert records[0] == (0, 1000)
+    assert records[1:] == [(50, 1000 + i) for i in range(1, 1000)]
+    assert lo.load_recording(dst) and lo.replay_file == dst
+
+    # Anything else is refused
+    (tmp_path / "other.bin").write_bytes(b"PLOR\x02\x04\x14\x00" + bytes(8))
+    assert not lo.load_recording(str(tmp_path / "other.bin"))
+    assert not lo.load_recording(str(tmp_path / "recording.json"))
+    assert lo.replay_file is None
+
+
+def _write_take(path, deltas):
+    """A recording file whose record i has the light value i."""
+    records = light_orchestra.array("H")
+    for i, delta in enumerate(deltas):
+        records.extend((delta, i))
+    with open(path, "wb") as f:
+        f.write(light_orchestra.recording_header() + bytes(records))
+
+
+def test_replay_keeps_to_deadlines_despite_slow_iterations(tmp_path, monkeypatch):
+    path = str(tmp_path / "recording.bin")
+    _write_take(path, [0] + [20] * 29)  # 580 ms
+    # The rest of the replay loop takes 8 ms, most of the 10 ms between samples
+    # at double speed, and one iteration runs 25 ms late
+    work = [8] * 30
+    work[10] = 35
+    clock = {"now": 1000}
+    sleeps = []
+
+    async def sleep_ms(ms):
+        sleeps.append(ms)
+        clock["now"] += ms
+
+    monkeypatch.setattr(light_orchestra.time, "ticks_ms", lambda: clock["now"])
+    monkeypatch.setattr(light_orchestra.asyncio, "sleep_ms", sleep_ms)
+
+    async def replay():
+        engine = light_orchestra.ReplayEngine(path, speed=2)
+        lights, played_at = [], []
+        while True:
+            light = await engine.next_sample()
+            if light is None:
+                break
+            lights.append(light)
+            played_at.append(clock["now"])
+            clock["now"] += work[light]
+        engine.close()
+        return lights, played_at, engine.report()
+
+    lights, played_at, report = _asyncio.run(replay())
+    assert lights == list(range(30))
+    # Sample i is due 10 * i ms after the start, however long the loop took;
+    # a late sample plays at once and the ones after it catch up
+    expected, now = [], 1000
+    for i in range(30):
+        now = max(now, 1000 + 10 * i)
+        expected.append(now)
+        now += work[i]
+    assert played_at == expected
+    assert sleeps[:10] == [2] * 10  # Not a fixed 10 ms after each iteration
+    assert played_at[11] == 1135 and played_at[-1] == 1290
+    assert report["samples"] == 30 and report["skipped"] == 0
+    assert report["max_error_ms"] == 25
+
+
+def _recording(opened):
+    """replay_records, noting which record each replay starts from."""
+    records = light_orchestra.replay_records
+
+    def replay_records(filename, start=0):
+        opened.append(start)
+        return records(filename, start)
+
+    return replay_records
+
+
+def test_replay_seeks_through_a_sparse_index_and_loops(tmp_path, monkeypatch):
+    monkeypatch.setattr(light_orchestra, "INDEX_EVERY", 4)
+    path = str(tmp_path / "recording.bin")
+    _write_take(path, [0] + [50] * 19)  # Record i is at 50 * i ms
+
+    async def replay():
+        engine = light_orchestra.ReplayEngine(path, speed=4, loop=True)
+        engine.seek(520)
+        assert await engine.next_sample() == 11
+        assert list(engine.index) == [0, 0, 150, 4, 350, 8]
+
+        # Back: from the index entry before the target, not the start
+        opened = []
+        monkeypatch.setattr(light_orchestra, "replay_records", _recording(opened))
+        engine.seek(360)
+        assert opened == [8] and await engine.next_sample() == 8
+
+        # Exactly on an index time: that entry starts after the target sample
+        engine.seek(350)
+        assert opened == [8, 4] and await engine.next_sample() == 7
+
+        # Past the end, the loop starts over
+        engine.seek(900)
+        lights = [await engine.next_sample() for _ in range(4)]
+        engine.close()
+        return lights
+
+    assert _asyncio.run(replay()) == [18, 19, 0, 1]
+
+    with pytest.raises(ValueError):
+        light_orchestra.ReplayEngine(path, speed=8)
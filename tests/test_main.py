@@ -0,0 +1,366 @@
+import asyncio
+import json
+import pathlib
+import sys
+import time as _time
+import types
+
+# Ensure src/ is on the path
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT / "src"))
+
+# Provide MicroPython-like time helpers when running on CPython
+if not hasattr(_time, "ticks_ms"):
+    _time.ticks_ms = lambda: int(_time.time() * 1000)  # type: ignore[attr-defined]
+    _time.ticks_diff = lambda a, b: a - b  # type: ignore[attr-defined]
+    _time.sleep_ms = lambda ms: _time.sleep(ms / 1000.0)  # type: ignore[attr-defined]
+if not hasattr(_time, "ticks_add"):
+    _time.ticks_add = lambda a, b: a + b  # type: ignore[attr-defined]
+
+if not hasattr(asyncio, "sleep_ms"):
+
+    async def _sleep_ms_async(ms):
+        await asyncio.sleep(ms / 1000.0)
+
+    asyncio.sleep_ms = _sleep_ms_async  # type: ignore[attr-defined]
+
+
+# Stub the hardware modules so we can import main on CPython
+class _DummyADC:
+    def __init__(self, pin):
+        self._pin = pin
+
+    def read_u16(self):
+        return 12345
+
+
+class _DummyPWM:
+    def __init__(self, pin):
+        self._pin = pin
+        self._freq = None
+        self._duty = 0
+
+    def freq(self, f):
+        self._freq = f
+
+    def duty_u16(self, v):
+        self._duty = v
+
+    def deinit(self):
+        pass
+
+
+class _DummyPin:
+    def __init__(self, n):
+        self._n = n
+
+
+machine_stub = types.SimpleNamespace(ADC=_DummyADC, PWM=_DummyPWM, Pin=_DummyPin)
+machine = sys.modules.setdefault("machine", machine_stub)
+if not hasattr(machine, "unique_id"):
+    machine.unique_id = lambda: b"\xe6\x61\x41\x04\x03\x2b\x8a\x2f"
+sys.modules.setdefault("network", types.SimpleNamespace())
+
+import conductor  # type: ignore
+import main  # type: ignore
+
+
+class _FakeSocket:
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, data, addr):
+        self.sent.append((data, addr))
+
+
+def test_udp_frame_layout_matches_conductor():
+    assert main.UDP_HEADER_SIZE == conductor.UDP_HEADER.size
+    assert main.UDP_PORT == conductor.UDP_PORT
+    assert main.MELODY_MAX_NOTES == conductor.MELODY_MAX_NOTES
+
+
+def test_udp_tone_frame_plays_once():
+    transport = conductor.UdpTransport()
+    frames = transport._frames(
+        ["127.0.0.1"], conductor.OP_TONE, conductor.TONE_BODY.pack(440, 50, 255), None
+    )
+    frame = frames["127.0.0.1"]
+    assert len(frame) == main.FRAME_SIZES[main.OP_TONE]
+
+    async def run():
+        sender = ("10.0.0.2", 40000)
+        main.handle_datagram(frame, sender, _FakeSocket())
+        first = main.api_note_task
+        main.handle_datagram(frame, sender, _FakeSocket())  # the duplicate copy
+        assert main.api_note_task is first
+        await first
+        assert main.buzzer_pin._freq == 440
+
+    asyncio.run(run())
+    transport.close()
+
+
+def test_udp_sync_reply_carries_device_ticks(monkeypatch):
+    # Device ticks wrap at 2**30, unlike the CPython stand-in
+    ticks = _time.ticks_ms
+    monkeypatch.setattr(_time, "ticks_ms", lambda: ticks() % (1 << 30))
+    transport = conductor.UdpTransport()
+    frame = transport._header(conductor.OP_SYNC)
+    sock = _FakeSocket()
+
+    main.handle_datagram(frame, ("10.0.0.3", 40000), sock)
+
+    reply, addr = sock.sent[0]
+    assert addr == ("10.0.0.3", 40000)
+    assert reply[: conductor.UDP_HEADER.size] == frame
+    rx, tx = conductor.SYNC_REPLY.unpack_from(reply, conductor.UDP_HEADER.size)
+    assert 0 <= tx - rx < 100
+    transport.close()
+
+
+def _http_exchange(raw, read_until_close=True):
+    """Sends raw bytes to main.handle_request on a local server; returns the reply."""
+
+    async def run():
+        server = await asyncio.start_server(main.handle_request, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(raw)
+        await writer.drain()
+        reply = await asyncio.wait_for(reader.read(), 5)
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return reply
+
+    return asyncio.run(run())
+
+
+def test_http_keep_alive_serves_several_requests():
+    body = b'{"frequency": 440, "duration": 0.01, "pad": "' + b"x" * 3000 + b'"}'
+    reply = _http_exchange(
+        b"GET /health HTTP/1.1\r\nHost: pico\r\n\r\n"
+        b"POST /play_note HTTP/1.1\r\nContent-Length: %d\r\n\r\n%s"
+        b"GET /sensor HTTP/1.1\r\nConnection: close\r\n\r\n" % (len(body), body)
+    )
+    responses = reply.split(b"HTTP/1.1 ")[1:]
+    assert [r[:3] for r in responses] == [b"200", b"200", b"200"]
+    assert b"Connection: keep-alive" in responses[0]
+    assert b"Note playing started" in responses[1]
+    assert b"Connection: close" in responses[2] and b'"norm"' in responses[2]
+    head, _, payload = responses[0].partition(b"\r\n\r\n")
+    assert b"Content-Length: %d" % len(payload) in head
+
+
+def test_http_rejects_oversized_body():
+    reply = _http_exchange(
+        b"POST /play_note HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % (main.MAX_BODY_BYTES + 1)
+    )
+    assert reply.startswith(b"HTTP/1.1 413 Payload Too Large")
+    assert b"Connection: close" in reply
+
+
+def test_melody_plays_in_background_while_server_answers():
+    notes = [{"freq": 440 + i, "ms": 20} for i in range(200)]
+    body = json.dumps({"notes": notes, "gap_ms": 5}).encode()
+
+    async def run():
+        server = await asyncio.start_server(main.handle_request, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"POST /melody HTTP/1.1\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body))
+        await writer.drain()
+        accepted = await reader.readuntil(b"}")
+
+        # The melody takes 5 s; the server keeps answering meanwhile
+        start = _time.perf_counter()
+        writer.write(b"GET /health HTTP/1.1\r\n\r\n")
+        await writer.drain()
+        health = await reader.readuntil(b"}")
+        answered_s = _time.perf_counter() - start
+        await asyncio.sleep(0.1)
+        assert main.is_playing() and 180 < len(main.note_queue) < 200
+
+        # Appending extends the queue; a new tone replaces everything
+        queued, until_ms = main.queue_notes([(880, 100)], append=True)
+        assert queued == 1 and until_ms > 4000
+        queued, until_ms = main.queue_notes([(660, 50)])
+        assert main.note_queue == [(660, 50, 0.5, 0)] and until_ms == 50
+        await main.api_note_task
+        assert main.buzzer_pin._freq == 660 and main.buzzer_pin._duty == 0
+
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return accepted, health, answered_s
+
+    accepted, health, answered_s = asyncio.run(run())
+    assert accepted.startswith(b"HTTP/1.1 202 Accepted")
+    assert b'"queued": 200' in accepted
+    assert health.startswith(b"HTTP/1.1 200 OK")
+    assert answered_s < 0.5
+
+
+def test_sensor_readings_are_filtered_and_cached(monkeypatch):
+    class NoisyADC:
+        def __init__(self):
+            self.reads = 0
+
+        def read_u16(self):
+            self.reads += 1
+            # A steady 30000 with a single-sample spike every 10 reads
+            return 65535 if self.reads % 10 == 5 else 30000
+
+    adc = NoisyADC()
+    monkeypatch.setattr(main, "photo_sensor_pin", adc)
+    monkeypatch.setattr(main, "filtered_q8", None)
+
+    for _ in range(50):
+        main.sample_sensor()
+        assert main.light_raw() == 30000  # The median drops every spike
+
+    # Consumers read the cached value, not the ADC
+    reads = adc.reads
+    assert main.read_sensor()["raw"] == 30000
+    main.route("GET", "/sensor", {}, b"", 0)
+    assert adc.reads == reads
+
+
+def test_responses_are_built_in_one_buffer_and_sent_in_one_write():
+    class Writer:
+        def __init__(self):
+            self.writes = []
+
+        def write(self, data):
+            self.writes.append(bytes(data))
+
+        async def drain(self):
+            pass
+
+    def respond(url, headers=None):
+        writer = Writer()
+        status, end, content_type, etag = main.route("GET", url, headers or {}, b"", 7)
+        asyncio.run(main.send_response(writer, status, end, content_type, True, etag))
+        assert len(writer.writes) == 1
+        head, _, body = writer.writes[0].partition(b"\r\n\r\n")
+        assert b"Content-Length: %d\r\n" % len(body) in head
+        return head, body
+
+    raw = main.light_raw()
+    head, body = respond("/sensor")
+    assert head.startswith(b"HTTP/1.1 200 OK\r\n")
+    assert json.loads(body) == {
+        "raw": raw,
+        "norm": round(raw / 65535, 2),
+        "lux_est": round(round(raw / 65535, 2) * 1000, 1),
+    }
+
+    head, body = respond("/status")
+    status = json.loads(body)
+    assert status["device_id"] == main.DEVICE_ID and status["raw"] == raw
+    assert b'ETag: "%d"' % status["seq"] in head
+    head, body = respond("/status", {b"if-none-match": b'"%d"' % status["seq"]})
+    assert head.startswith(b"HTTP/1.1 304 Not Modified") and body == b""
+
+    assert json.loads(respond("/time")[1])["ticks_ms"] == 7
+    assert json.loads(respond("/health")[1])["status"] == "ok"
+    assert respond("/nope")[0].startswith(b"HTTP/1.1 404 Not Found")
+
+
+def test_admission_control_sheds_monitoring_first(monkeypatch):
+    tone = b'{"freq": 440, "ms": 10}'
+    tone_request = b"POST /tone HTTP/1.1\r\nContent-Length: %d\r\n\r\n%s" % (len(tone), tone)
+
+    # With this connection, only the slots reserved for playback are left
+    reserved = main.MAX_CONNECTIONS - main.RESERVED_FOR_PLAYBACK
+    monkeypatch.setattr(main, "open_connections", reserved)
+    reply = _http_exchange(b"GET /status HTTP/1.1\r\n\r\n")
+    assert reply.startswith(b"HTTP/1.1 503 Service Unavailable") and b"Retry-After" in reply
+    assert _http_exchange(tone_request).startswith(b"HTTP/1.1 202 Accepted")
+
+    # Over the limit, even playback is refused without reading the request
+    monkeypatch.setattr(main, "open_connections", main.MAX_CONNECTIONS)
+    assert _http_exchange(tone_request).startswith(b"HTTP/1.1 503")
+    assert main.open_connections == main.MAX_CONNECTIONS
+
+
+def test_slow_clients_are_dropped(monkeypatch):
+    monkeypatch.setattr(main, "READ_TIMEOUT_S", 0.3)
+
+    async def run():
+        server = await asyncio.start_server(main.handle_request, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        start = _time.perf_counter()
+        writer.write(b"GET /health HTTP/1.1\r\n")
+
+        async def trickle():
+            # Header lines, each well within the old per-line timeout
+            for i in range(20):
+                writer.write(b"X-Slow-%d: 1\r\n" % i)
+                await writer.drain()
+                await asyncio.sleep(0.05)
+
+        trickling = asyncio.ensure_future(trickle())
+        reply = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 5)
+        elapsed = _time.perf_counter() - start
+        trickling.cancel()
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return reply, elapsed
+
+    reply, elapsed = asyncio.run(run())
+    assert reply.startswith(b"HTTP/1.1 408 Request Timeout")
+    assert elapsed < 1.5
+
+
+def test_batch_runs_ops_in_order_in_one_request():
+    assert main.MAX_BATCH_OPS == conductor.BATCH_MAX_OPS
+    ops = [
+        {"method": "POST", "path": "/stop"},
+        {"method": "POST", "path": "/tone", "body": {"freq": 440, "ms": 50}},
+        {"method": "GET", "path": "/health"},
+    ]
+    body = json.dumps({"ops": ops}).encode()
+    reply = _http_exchange(
+        b"POST /batch HTTP/1.1\r\nConnection: close\r\nContent-Length: %d\r\n\r\n%s"
+        % (len(body), body)
+    )
+    assert reply.startswith(b"HTTP/1.1 200 OK")
+    results = json.loads(reply.partition(b"\r\n\r\n")[2])["results"]
+    assert [r["status"] for r in results] == [200, 202, 200]
+    assert results[1]["body"] == {"playing": True, "until_ms_from_now": 50}
+    assert results[2]["body"]["device_id"] == main.DEVICE_ID
+
+    # A batch with an op it can't run, or a bad body, runs none of them
+    main.stop_playback()
+    for bad in (
+        {"method": "GET", "path": "/events"},
+        {"method": "POST", "path": "/tone", "body": {"freq": 440}},
+        {"method": "POST", "path": "/melody", "body": {"notes": [{"ms": 10}]}},
+    ):
+        batch = json.dumps({"ops": [ops[1], bad]})
+        status, end, _, _ = main.route("POST", "/batch", {}, batch, 0)
+        assert status == 400 and not main.is_playing()
+
+    # Eight /status results fit in the response buffer
+    ops = [{"method": "GET", "path": "/status"}] * main.MAX_BATCH_OPS
+    status, end, _, _ = main.route("POST", "/batch", {}, json.dumps({"ops": ops}), 0)
+    start = main.BODY_START
+    results = json.loads(bytes(main.response_view[start:end]))["results"]
+    assert status == 200 and len(results) == main.MAX_BATCH_OPS
+
+
+def test_only_playback_batches_use_the_reserved_slots(monkeypatch):
+    def batch(*ops):
+        body = json.dumps({"ops": [{"method": m, "path": p} for m, p in ops]}).encode()
+        return _http_exchange(
+            b"POST /batch HTTP/1.1\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body)
+        )
+
+    reserved = main.MAX_CONNECTIONS - main.RESERVED_FOR_PLAYBACK
+    monkeypatch.setattr(main, "open_connections", reserved)
+    assert batch(("POST", "/stop"), ("GET", "/time")).startswith(b"HTTP/1.1 200 OK")
+    reply = batch(("POST", "/stop"), ("GET", "/status"))
+    assert reply.startswith(b"HTTP/1.1 503 Service Unavailable")
@@ -0,0 +1,50 @@
+import pathlib
+import sys
+
+# Ensure src/ is on the path
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT / "src"))
+
+import requests
+import metrics  # type: ignore
+
+
+def test_metrics_exposition():
+    fleet_metrics = metrics.FleetMetrics()
+    ok = {"ip": "10.0.0.1", "device_id": "PICO-1", "status": "ok", "norm": 0.5}
+    fleet_metrics.observe(dict(ok, latency_ms=3.0))
+    fleet_metrics.observe(dict(ok, latency_ms=40.0))
+    offline = {"ip": "10.0.0.2", "device_id": "N/A", "status": "Offline (ConnectTimeout)"}
+    fleet_metrics.observe(dict(offline, norm=0.0, error="ConnectTimeout", latency_ms=1000.0))
+    text = fleet_metrics.render()
+
+    assert 'pico_up{ip="10.0.0.1",device_id="PICO-1"} 1' in text
+    assert 'pico_up{ip="10.0.0.2",device_id="N/A"} 0' in text
+    assert 'pico_light_norm{ip="10.0.0.1",device_id="PICO-1"} 0.5' in text
+    assert 'pico_poll_errors_total{ip="10.0.0.2",error="ConnectTimeout"} 1' in text
+    assert 'pico_poll_latency_seconds_bucket{ip="10.0.0.1",le="0.005"} 1' in text
+    assert 'pico_poll_latency_seconds_bucket{ip="10.0.0.1",le="0.05"} 2' in text
+    assert 'pico_poll_latency_seconds_count{ip="10.0.0.1"} 2' in text
+    # Each family's header appears once, followed by all of its samples
+    assert text.count("# TYPE pico_up gauge") == 1
+    assert text.index("# TYPE pico_light_norm") > text.index('pico_up{ip="10.0.0.2"')
+
+    # A gauge-only update of an unchanged device leaves the text as it was
+    fleet_metrics.observe(ok)
+    assert fleet_metrics.render() == text
+
+
+def test_metrics_endpoint():
+    fleet_metrics = metrics.FleetMetrics()
+    fleet_metrics.observe({"ip": "10.0.0.1", "device_id": "PICO-1", "status": "ok", "norm": 1})
+    server = metrics.start_server(fleet_metrics, 0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        res = requests.get(f"{url}/metrics", timeout=2)
+        assert res.status_code == 200
+        assert res.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+        assert 'pico_light_norm{ip="10.0.0.1",device_id="PICO-1"} 1' in res.text
+        assert requests.get(f"{url}/other", timeout=2).status_code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
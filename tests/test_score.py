@@ -0,0 +1,76 @@
+import pathlib
+import sys
+
+# Ensure src/ is on the path
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT / "src"))
+
+import score  # type: ignore
+
+
+def _varlen(n):
+    out = [n & 0x7F]
+    n >>= 7
+    while n:
+        out.insert(0, (n & 0x7F) | 0x80)
+        n >>= 7
+    return bytes(out)
+
+
+def _track(events):
+    body = b"".join(_varlen(delta) + data for delta, data in events)
+    body += b"\x00\xff\x2f\x00"
+    return b"MTrk" + len(body).to_bytes(4, "big") + body
+
+
+def _write_midi(path, tracks, division=480):
+    header = b"MThd" + (6).to_bytes(4, "big")
+    header += (1).to_bytes(2, "big") + len(tracks).to_bytes(2, "big")
+    header += division.to_bytes(2, "big")
+    path.write_bytes(header + b"".join(_track(t) for t in tracks))
+
+
+def test_pitch_table_folds_into_piezo_range():
+    assert score.PITCH_TO_FREQ[69] == 440
+    assert score.PITCH_TO_FREQ[69 - 36] == 220  # A1 is folded up to A3
+    assert all(score.PIEZO_MIN_FREQ <= f <= score.PIEZO_MAX_FREQ for f in score.PITCH_TO_FREQ)
+
+
+def test_load_midi_splits_chords_into_voices(tmp_path):
+    path = tmp_path / "song.mid"
+    tempo = [(0, b"\xff\x51\x03" + (250000).to_bytes(3, "big"))]  # 240 BPM
+    melody = [
+        # C4 + E4 chord for one beat, then A4 (running status, note-off by velocity 0)
+        (0, b"\x90\x3c\x40"),
+        (0, b"\x40\x40"),
+        (480, b"\x3c\x00"),
+        (0, b"\x40\x00"),
+        (0, b"\x45\x40"),
+        (480, b"\x80\x45\x00"),
+    ]
+    drums = [(0, b"\x99\x24\x40"), (480, b"\x89\x24\x00")]
+    _write_midi(path, [tempo, melody, drums])
+
+    voices = score.load_midi(path)
+
+    assert sorted(voices) == ["t1c0v0", "t1c0v1"]
+    main, harmony = voices["t1c0v0"], voices["t1c0v1"]
+    assert list(main.starts) == [0, 250]
+    assert list(main.durations) == [250, 250]
+    assert list(main.freqs) == [262, 440]
+    assert list(harmony.freqs) == [330]
+    assert list(harmony.as_song()) == [(330, 250)]
+
+
+def test_assign_by_capability_prefers_matching_range():
+    low, high = score.Voice("low"), score.Voice("high")
+    low.add(0, 100, 200)
+    high.add(0, 100, 1500)
+    high.add(100, 100, 1500)
+
+    assignment = score.assign_by_capability(
+        {"low": low, "high": high},
+        {"a": (100, 400), "b": (1000, 2000), "c": (100, 2000)},
+    )
+
+    assert assignment == {"b": "high", "a": "low", "c": "high"}
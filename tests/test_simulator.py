@@ -0,0 +1,32 @@
+import pathlib
+import sys
+
+# Ensure src/ is on the path
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT / "src"))
+
+import conductor  # type: ignore
+import dashboard  # type: ignore
+from simulator import SimulatedFleet  # type: ignore
+
+
+def test_simulated_fleet_serves_the_contract():
+    with SimulatedFleet(3) as fleet:
+        for ip, device in zip(fleet.addresses, fleet.devices):
+            status = dashboard.get_device_status(ip)
+            assert status["device_id"] == device.device_id
+            assert status["status"] == "ok"
+            assert 0.0 <= status["norm"] <= 1.0
+
+        dispatcher = conductor.Dispatcher(timeout=2.0)
+        report = dispatcher.post_all(fleet.addresses, "/tone", {"freq": 440, "ms": 100})
+        dispatcher.close()
+
+        assert not report.failed
+        assert all(d.onsets and d.onsets[0][1] == 440 for d in fleet.devices)
+
+
+def test_simulated_device_loses_requests():
+    with SimulatedFleet(1, loss=1.0) as fleet:
+        status = dashboard.get_device_status(fleet.addresses[0])
+        assert status["status"].startswith("Offline")
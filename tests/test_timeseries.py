@@ -0,0 +1,53 @@
+import math
+import pathlib
+import sys
+
+# Ensure src/ is on the path
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT / "src"))
+
+import timeseries  # type: ignore
+
+
+def test_ring_wraps_and_rolls_up(tmp_path):
+    series = timeseries.Series(
+        str(tmp_path / "dev.ts"), raw_capacity=10, bucket_capacity=4, bucket_s=10
+    )
+    # 60 samples, one per second: the raw ring keeps the last 10
+    for t in range(60):
+        series.append(float(t), [t / 100, float(t), math.nan])
+
+    assert [s.t for s in series.latest(3)] == [57.0, 58.0, 59.0]
+    assert [s.t for s in series.range(52, 55)] == [52.0, 53.0, 54.0]
+    assert series.range(0, 40) == []
+
+    # Closed buckets 20..49 remain (capacity 4, so 10..19 too), 50..59 is still open
+    buckets = series.buckets()
+    assert [b.start for b in buckets] == [10.0, 20.0, 30.0, 40.0, 50.0]
+    lo, hi, mean = buckets[1].stats[1]
+    assert (lo, hi, mean, buckets[1].count) == (20.0, 29.0, 24.5, 10)
+    assert all(math.isnan(v) for v in buckets[1].stats[2])
+
+    # Old part of the range from buckets, recent part from raw samples
+    agg = series.aggregate("raw", 30)
+    assert (agg.min, agg.max, agg.count) == (30.0, 59.0, 30)
+    assert agg.mean == sum(range(30, 60)) / 30
+    series.close()
+
+
+def test_history_survives_restart(tmp_path):
+    with timeseries.TimeSeriesStore(str(tmp_path)) as store:
+        status = {"ip": "127.0.0.1:8080", "device_id": "N/A", "status": "ok", "norm": 0.25}
+        store.record(status, 1000.0)
+        store.record(dict(status, stale=True, norm=0.5), 1001.0)
+        store.record(dict(status, status="Offline (ReadTimeout)"), 1002.0)
+
+    size = (tmp_path / "127.0.0.1_8080.ts").stat().st_size
+    with timeseries.TimeSeriesStore(str(tmp_path)) as store:
+        assert store.keys() == ["127.0.0.1_8080"]
+        series = store.series("127.0.0.1:8080")
+        assert [(s.t, s.norm) for s in series.latest(5)] == [(1000.0, 0.25)]
+        for t in range(2000):
+            series.append(2000.0 + t, [0.5, 100.0, 50.0])
+    # The file never grows
+    assert (tmp_path / "127.0.0.1_8080.ts").stat().st_size == size